@@ -0,0 +1,21 @@
+"""
+Access control for operator-only endpoints (`/admin/...`).
+
+They are disabled (404) unless ADMIN_TOKEN is set, and then require
+`Authorization: Bearer <ADMIN_TOKEN>`.
+"""
+
+import hmac
+import os
+from typing import Optional
+
+from fastapi import Header, HTTPException
+
+
+def require_admin(authorization: Optional[str] = Header(None)):
+    """FastAPI dependency guarding admin endpoints."""
+    token = os.getenv("ADMIN_TOKEN")
+    if not token:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not authorization or not hmac.compare_digest(authorization.encode(), f"Bearer {token}".encode()):
+        raise HTTPException(status_code=401, detail="Admin token required", headers={"WWW-Authenticate": "Bearer"})
@@ -0,0 +1,223 @@
+"""
+Supervised background jobs.
+
+Writes that don't need to block a reply (memory inserts, fact persistence,
+request updates) are submitted to a bounded `JobQueue` and executed by a
+small pool of worker tasks. Failed jobs are retried with exponential
+backoff, every job type keeps its own counters, and on shutdown the queue
+is drained for a bounded time; whatever is still pending is written to a
+JSONL spool file and re-queued on the next start.
+
+Handlers are registered by name so pending jobs can be serialized; payloads
+must therefore be JSON-serializable keyword arguments.
+"""
+
+import asyncio
+import json
+import os
+import time
+from collections import defaultdict
+from typing import Awaitable, Callable, Dict, Optional
+
+from ReplyChallenge.logs import get_logger, request_id_var
+
+log = get_logger("background")
+
+Handler = Callable[..., Awaitable[object]]
+
+
+class Job:
+    __slots__ = ("job_type", "payload", "attempts", "enqueued_at", "request_id")
+
+    def __init__(self, job_type: str, payload: dict, attempts: int = 0):
+        self.job_type = job_type
+        self.payload = payload
+        self.attempts = attempts
+        self.enqueued_at = time.monotonic()
+        # logs from the job are correlated with the request that submitted it
+        self.request_id = request_id_var.get()
+
+    def to_dict(self) -> dict:
+        return {"type": self.job_type, "payload": self.payload, "attempts": self.attempts}
+
+
+class JobQueue:
+    def __init__(
+        self,
+        maxsize: int = 1000,
+        workers: int = 4,
+        max_retries: int = 3,
+        retry_backoff: float = 0.5,
+        spool_path: Optional[str] = None,
+    ):
+        self.maxsize = maxsize
+        self.workers = workers
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.spool_path = spool_path
+        self.handlers: Dict[str, Handler] = {}
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers: list = []
+        self._interrupted: list = []
+        self._waiting_retry: Dict[asyncio.Task, Job] = {}
+        self._accepting = False
+        self._stats: Dict[str, Dict[str, float]] = defaultdict(lambda: {
+            "enqueued": 0, "succeeded": 0, "failed": 0, "retried": 0, "dropped": 0, "total_ms": 0.0,
+        })
+
+    def register(self, job_type: str, handler: Handler):
+        self.handlers[job_type] = handler
+
+    def submit(self, job_type: str, **payload) -> bool:
+        """Queue a job without waiting. Returns False (and counts a drop) when
+        the queue is full or shutting down, so callers never block on it."""
+        if job_type not in self.handlers:
+            raise KeyError(f"No handler registered for job type '{job_type}'")
+        return self._put(Job(job_type, payload))
+
+    async def submit_wait(self, job_type: str, timeout: Optional[float] = None, **payload) -> bool:
+        """Queue a job, waiting up to `timeout` seconds for space (backpressure)."""
+        if job_type not in self.handlers:
+            raise KeyError(f"No handler registered for job type '{job_type}'")
+        if not self._accepting or self._queue is None:
+            self._stats[job_type]["dropped"] += 1
+            return False
+        try:
+            await asyncio.wait_for(self._queue.put(Job(job_type, payload)), timeout=timeout)
+        except asyncio.TimeoutError:
+            self._stats[job_type]["dropped"] += 1
+            return False
+        self._stats[job_type]["enqueued"] += 1
+        return True
+
+    def _put(self, job: Job) -> bool:
+        if not self._accepting or self._queue is None:
+            self._stats[job.job_type]["dropped"] += 1
+            return False
+        try:
+            self._queue.put_nowait(job)
+        except asyncio.QueueFull:
+            self._stats[job.job_type]["dropped"] += 1
+            log.warning("background queue full, dropping %s job", job.job_type)
+            return False
+        if job.attempts == 0:
+            self._stats[job.job_type]["enqueued"] += 1
+        return True
+
+    async def start(self):
+        self._queue = asyncio.Queue(maxsize=self.maxsize)
+        self._accepting = True
+        self._load_spool()
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def _worker(self):
+        while True:
+            job = await self._queue.get()
+            request_id_var.set(job.request_id)
+            started = time.monotonic()
+            try:
+                await self.handlers[job.job_type](**job.payload)
+                stats = self._stats[job.job_type]
+                stats["succeeded"] += 1
+                stats["total_ms"] += (time.monotonic() - started) * 1000
+            except asyncio.CancelledError:
+                # remember it so shutdown can spool it
+                self._interrupted.append(job)
+                raise
+            except Exception as e:
+                self._retry_or_fail(job, e)
+            finally:
+                self._queue.task_done()
+
+    def _retry_or_fail(self, job: Job, error: Exception):
+        job.attempts += 1
+        if job.attempts > self.max_retries:
+            self._stats[job.job_type]["failed"] += 1
+            log.error("background %s job failed after %s attempts: %s", job.job_type, job.attempts, error)
+            return
+        self._stats[job.job_type]["retried"] += 1
+        if not self._accepting:
+            # shutting down: keep it for the spool instead of waiting to retry
+            self._interrupted.append(job)
+            return
+        delay = self.retry_backoff * (2 ** (job.attempts - 1))
+        task = asyncio.create_task(self._requeue_after(job, delay))
+        self._waiting_retry[task] = job
+        task.add_done_callback(lambda t: self._waiting_retry.pop(t, None))
+
+    async def _requeue_after(self, job: Job, delay: float):
+        await asyncio.sleep(delay)
+        if not self._accepting:
+            self._interrupted.append(job)
+        elif not self._put(job):
+            self._stats[job.job_type]["failed"] += 1
+
+    async def shutdown(self, timeout: float = 10.0):
+        """Stop accepting jobs, drain for up to `timeout` seconds, then spool
+        anything still pending."""
+        if self._queue is None:
+            return
+        self._accepting = False
+        # Retries waiting on their backoff go straight back into the queue
+        for task, job in list(self._waiting_retry.items()):
+            task.cancel()
+            try:
+                self._queue.put_nowait(job)
+            except asyncio.QueueFull:
+                self._interrupted.append(job)
+        self._waiting_retry.clear()
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout=timeout)
+        except asyncio.TimeoutError:
+            log.warning("background queue not drained after %ss", timeout)
+        for w in self._workers:
+            w.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        pending, self._interrupted = self._interrupted, []
+        while not self._queue.empty():
+            pending.append(self._queue.get_nowait())
+        self._write_spool(pending)
+
+    def _write_spool(self, jobs: list):
+        if not jobs:
+            return
+        if not self.spool_path:
+            log.warning("discarding %s pending background jobs (no spool path configured)", len(jobs))
+            return
+        with open(self.spool_path, "a", encoding="utf-8") as fh:
+            for job in jobs:
+                fh.write(json.dumps(job.to_dict()) + "\n")
+        log.info("spooled %s pending background jobs to %s", len(jobs), self.spool_path)
+
+    def _load_spool(self):
+        if not self.spool_path or not os.path.exists(self.spool_path):
+            return
+        with open(self.spool_path, encoding="utf-8") as fh:
+            lines = fh.readlines()
+        os.remove(self.spool_path)
+        restored = []
+        for line in lines:
+            try:
+                item = json.loads(line)
+            except ValueError:
+                continue
+            if item.get("type") in self.handlers:
+                restored.append(Job(item["type"], item.get("payload") or {}, item.get("attempts", 0)))
+        overflow = [job for job in restored if not self._put(job)]
+        self._write_spool(overflow)
+        if restored:
+            log.info("restored %s spooled background jobs", len(restored) - len(overflow))
+
+    def depth(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    def metrics(self) -> dict:
+        per_type = {}
+        for job_type, stats in self._stats.items():
+            done = stats["succeeded"]
+            per_type[job_type] = {
+                **{k: int(v) for k, v in stats.items() if k != "total_ms"},
+                "avg_ms": round(stats["total_ms"] / done, 2) if done else None,
+            }
+        return {"queued": self.depth(), "retry_waiting": len(self._waiting_retry), "types": per_type}
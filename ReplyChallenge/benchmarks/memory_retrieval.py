@@ -0,0 +1,155 @@
+"""
+Relevance/latency benchmark for hybrid (vector + BM25) memory retrieval
+and for partitioning the store by (room, user).
+
+Builds a synthetic memory corpus where every memory mentions a unique
+identifier (ticket number, function name, product code) and belongs to
+one of a few topics. Embeddings are simulated: a memory's vector is its
+topic centroid plus noise, so - like real embeddings - it says a lot about
+what a memory is about and nothing about which identifier it contains.
+
+Two query sets are scored:
+  * identifier queries ("what's the status of ENG-4821?")
+  * paraphrase queries that share no keywords with their target memory
+
+The partitioning section spreads the same memories over `--users`
+partitions and compares query latency against one global partition.
+
+Usage:
+    python -m ReplyChallenge.benchmarks.memory_retrieval [--memories 20000] [--queries 200] [--users 50]
+"""
+
+import argparse
+import random
+import time
+
+import numpy as np
+
+from ReplyChallenge.memory_index import MemoryStore
+
+TOPICS = {
+    "billing": ("invoice", "refund", "charge", "payment", "subscription"),
+    "deploy": ("release", "rollout", "pipeline", "staging", "rollback"),
+    "auth": ("login", "password", "token", "session", "sso"),
+    "search": ("query", "ranking", "results", "index", "relevance"),
+    "mobile": ("android", "ios", "crash", "screen", "notification"),
+}
+PARAPHRASES = {
+    "billing": "money taken from a customer account twice",
+    "deploy": "shipping the new build to production servers",
+    "auth": "people unable to get into their accounts",
+    "search": "finding the right documents for what users type",
+    "mobile": "the phone app closing unexpectedly",
+}
+DIM = 256
+
+
+def unit(v):
+    return v / (np.linalg.norm(v) or 1.0)
+
+
+def noisy(center, rng, sigma):
+    return unit(center + rng.normal(0, sigma / np.sqrt(DIM / 32), DIM)).astype(np.float32)
+
+
+def identifier(rng, i):
+    kind = i % 3
+    if kind == 0:
+        return f"ENG-{1000 + i}"
+    if kind == 1:
+        return f"{rng.choice(['parse', 'load', 'sync', 'render'])}_{rng.choice(['config', 'cache', 'user', 'feed'])}_{i}"
+    return f"SKU{i:05d}"
+
+
+def build_corpus(n, users, rng, nprng):
+    centroids = {t: unit(nprng.normal(0, 1, DIM)) for t in TOPICS}
+    memories = []
+    for i in range(n):
+        topic = rng.choice(list(TOPICS))
+        ident = identifier(rng, i)
+        words = rng.sample(TOPICS[topic], 3)
+        memories.append({
+            "id": i,
+            "user": f"user{i % users}",
+            "topic": topic,
+            "ident": ident,
+            "content": f"Note about {ident}: {' '.join(words)} follow-up from the {topic} team",
+            "embedding": noisy(centroids[topic], nprng, 0.35),
+        })
+    return centroids, memories
+
+
+def score(rankings, targets, k=5):
+    hits, rr = 0, 0.0
+    for ranking, target in zip(rankings, targets):
+        ids = ranking[:k]
+        if target in ids:
+            hits += 1
+            rr += 1.0 / (ids.index(target) + 1)
+    return hits / len(targets), rr / len(targets)
+
+
+def percentile(samples, p):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))]
+
+
+def timed(fn, samples):
+    t0 = time.perf_counter()
+    result = fn()
+    samples.append((time.perf_counter() - t0) * 1000)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--memories", type=int, default=20000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    nprng = np.random.default_rng(args.seed)
+    centroids, memories = build_corpus(args.memories, args.users, rng, nprng)
+
+    # one global partition (the pre-partitioning baseline) and one per user
+    global_store = MemoryStore(partition_cap=args.memories)
+    partitioned = MemoryStore(partition_cap=args.memories, max_partitions=args.users)
+    started = time.perf_counter()
+    for m in memories:
+        global_store.add(m["id"], m["content"], m["embedding"], "room", None)
+    build_ms = (time.perf_counter() - started) * 1000
+    for m in memories:
+        partitioned.add(m["id"], m["content"], m["embedding"], "room", m["user"])
+    part = global_store.partition("room", None)
+
+    targets = rng.sample(memories, args.queries)
+    query_sets = {
+        "identifier": [(f"what's the status of {t['ident']}?", noisy(centroids[t["topic"]], nprng, 0.35)) for t in targets],
+        "paraphrase": [(PARAPHRASES[t["topic"]], noisy(t["embedding"], nprng, 0.05)) for t in targets],
+    }
+
+    print(f"{len(memories)} memories, {args.queries} queries per set, recall@5 / MRR@5 (single partition)")
+    print(f"{'query set':<12} {'vector':>16} {'bm25':>16} {'hybrid (rrf)':>16}")
+    ids = [t["id"] for t in targets]
+    latency = {"vector": [], "bm25": [], "hybrid": [], "hybrid, partitioned": []}
+    for name, queries in query_sets.items():
+        vector_runs, keyword_runs, hybrid_runs = [], [], []
+        for (text, vec), target in zip(queries, targets):
+            vector_runs.append([i for i, _ in timed(lambda: part.vector_search(vec, 10), latency["vector"])])
+            keyword_runs.append([i for i, _ in timed(lambda: part.keywords.search(text, k=10), latency["bm25"])])
+            hybrid_runs.append([r["id"] for r in timed(lambda: global_store.search(text, vec, "room", None), latency["hybrid"])])
+            timed(lambda: partitioned.search(text, vec, "room", target["user"]), latency["hybrid, partitioned"])
+        cells = [score(runs, ids) for runs in (vector_runs, keyword_runs, hybrid_runs)]
+        print(f"{name:<12} " + " ".join(f"{r:>8.2f} / {m:<5.2f}" for r, m in cells))
+
+    print(f"\nindex build: {build_ms:.1f} ms ({build_ms * 1000 / len(memories):.1f} us/memory)")
+    for name, samples in latency.items():
+        print(f"{name + ' search:':<28} p50 {percentile(samples, 50):.3f} ms, p95 {percentile(samples, 95):.3f} ms")
+    sizes = [len(p) for p in partitioned.partitions.values()]
+    print(f"partitioned: {len(sizes)} partitions, ~{sum(sizes) // len(sizes)} memories each")
+
+
+if __name__ == "__main__":
+    main()
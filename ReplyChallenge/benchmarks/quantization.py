@@ -0,0 +1,84 @@
+"""
+Footprint / recall / latency benchmark for quantized memory embeddings.
+
+Generates clustered unit vectors with a low intrinsic dimension (like
+sentence embeddings, they are far from uniformly spread over the sphere),
+then for each codec measures:
+
+  * bytes per vector and total footprint of the resident arrays
+  * recall@10 against exact float32 search
+  * single-query scan latency
+
+Lossy codecs are also run with a re-rank of `--rerank-factor * 10`
+candidates on full-precision vectors.
+
+Usage:
+    python -m ReplyChallenge.benchmarks.quantization [--memories 20000] [--dim 1536] [--pq-m 96]
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from ReplyChallenge.quantization import Codec, Float16Codec, Int8Codec, ProductQuantizer
+
+
+def clustered(n, dim, clusters, rng, latent=64):
+    centers = rng.normal(size=(clusters, latent))
+    z = centers[rng.integers(clusters, size=n)] + rng.normal(scale=0.6, size=(n, latent))
+    x = (z @ rng.normal(size=(latent, dim)) + rng.normal(scale=0.5, size=(n, dim))).astype(np.float32)
+    return x / np.linalg.norm(x, axis=1, keepdims=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--memories", type=int, default=20000)
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--pq-m", type=int, default=96)
+    parser.add_argument("--pq-train", type=int, default=5000)
+    parser.add_argument("--rerank-factor", type=int, default=4)
+    parser.add_argument("--seed", type=int, default=3)
+    args = parser.parse_args()
+
+    k = 10
+    rng = np.random.default_rng(args.seed)
+    data = clustered(args.memories, args.dim, 50, rng)
+    queries = data[rng.choice(args.memories, args.queries, replace=False)] + rng.normal(scale=0.02, size=(args.queries, args.dim)).astype(np.float32)
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+    truth = [set(np.argsort(-(data @ q))[:k]) for q in queries]
+
+    started = time.perf_counter()
+    pq = ProductQuantizer(m=args.pq_m, iterations=8).train(data[rng.choice(args.memories, min(args.pq_train, args.memories), replace=False)])
+    pq_train_s = time.perf_counter() - started
+
+    print(f"{args.memories} vectors x {args.dim} dims, {args.queries} queries, recall@{k} vs exact float32")
+    print(f"(python list of floats baseline: ~{args.dim * 32 // 1024} KB/vector)\n")
+    print(f"{'codec':<18} {'bytes/vec':>10} {'footprint':>11} {'recall@10':>10} {'p50 ms':>8} {'p95 ms':>8}")
+    for codec, rerank in ((Codec(), False), (Float16Codec(), False), (Int8Codec(), False), (Int8Codec(), True), (pq, False), (pq, True)):
+        codes, scales = codec.encode(data)
+        footprint = codes.nbytes + (scales.nbytes if scales is not None else 0)
+        if rerank:
+            footprint += data.nbytes  # the full-precision copy it re-ranks on
+        hits, latencies = 0, []
+        for q, expected in zip(queries, truth):
+            t0 = time.perf_counter()
+            scores = codec.scores(codes, scales, q)
+            if rerank:
+                candidates = np.argpartition(-scores, k * args.rerank_factor)[:k * args.rerank_factor]
+                top = candidates[np.argsort(-(data[candidates] @ q))[:k]]
+            else:
+                top = np.argpartition(-scores, k)[:k]
+            latencies.append((time.perf_counter() - t0) * 1000)
+            hits += len(expected & set(top.tolist()))
+        name = codec.name + (" + rerank" if rerank else "")
+        per_vec = footprint / args.memories
+        print(f"{name:<18} {per_vec:>10.0f} {footprint / 2**20:>9.1f}MB {hits / (k * args.queries):>10.3f} "
+              f"{np.percentile(latencies, 50):>8.2f} {np.percentile(latencies, 95):>8.2f}")
+    print(f"\npq training ({args.pq_m} sub-spaces x 256 centroids): {pq_train_s:.1f}s")
+    print("rerank footprints include the float32 copy; keep it on disk to get the code-only resident size.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+"""
+Circuit breakers for external dependencies (Supabase, OpenAI).
+
+A breaker watches the outcome of the last `window` calls. Once at least
+`min_calls` have been seen and the failure rate reaches
+`failure_rate_threshold` it opens: calls fail immediately with
+`CircuitOpenError` instead of waiting on a dependency that is down. After
+`open_seconds` it goes half-open and lets `half_open_max_calls` probes
+through; a successful probe closes it again, a failed one re-opens it.
+Slow calls count as failures when `call_timeout` is set.
+"""
+
+import asyncio
+import os
+import time
+from collections import deque
+from typing import Awaitable, Callable, Dict, Optional, TypeVar
+
+from ReplyChallenge.logs import get_logger
+
+log = get_logger("circuit_breaker")
+
+T = TypeVar("T")
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+# Every breaker registers itself here so /health can report them all
+BREAKERS: Dict[str, "CircuitBreaker"] = {}
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a dependency whose circuit is open."""
+
+    def __init__(self, name: str, retry_in: float):
+        super().__init__(f"Circuit '{name}' is open (retry in {retry_in:.1f}s)")
+        self.name = name
+        self.retry_in = retry_in
+
+
+class CircuitBreaker:
+    def __init__(
+        self,
+        name: str,
+        failure_rate_threshold: float = 0.5,
+        min_calls: int = 5,
+        window: int = 20,
+        open_seconds: float = 30.0,
+        half_open_max_calls: int = 1,
+        call_timeout: Optional[float] = None,
+        counts_as_failure: Callable[[BaseException], bool] = lambda e: True,
+    ):
+        self.name = name
+        self.failure_rate_threshold = failure_rate_threshold
+        self.min_calls = min_calls
+        self.open_seconds = open_seconds
+        self.half_open_max_calls = half_open_max_calls
+        self.call_timeout = call_timeout
+        self.counts_as_failure = counts_as_failure
+        self._outcomes: deque = deque(maxlen=window)
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._half_open_in_flight = 0
+        self.rejected = 0
+        BREAKERS[name] = self
+
+    @classmethod
+    def from_env(cls, name: str, prefix: str, **defaults) -> "CircuitBreaker":
+        """Build a breaker whose settings can be overridden with
+        `<PREFIX>_BREAKER_FAILURE_RATE`, `_MIN_CALLS`, `_WINDOW`,
+        `_OPEN_SECONDS` and `_CALL_TIMEOUT` environment variables."""
+        def env(key, cast, default):
+            raw = os.getenv(f"{prefix}_BREAKER_{key}")
+            return cast(raw) if raw else default
+
+        return cls(
+            name,
+            failure_rate_threshold=env("FAILURE_RATE", float, defaults.pop("failure_rate_threshold", 0.5)),
+            min_calls=env("MIN_CALLS", int, defaults.pop("min_calls", 5)),
+            window=env("WINDOW", int, defaults.pop("window", 20)),
+            open_seconds=env("OPEN_SECONDS", float, defaults.pop("open_seconds", 30.0)),
+            call_timeout=env("CALL_TIMEOUT", float, defaults.pop("call_timeout", None)),
+            **defaults,
+        )
+
+    @property
+    def state(self) -> str:
+        if self._state == OPEN and time.monotonic() - self._opened_at >= self.open_seconds:
+            self._state = HALF_OPEN
+            self._half_open_in_flight = 0
+        return self._state
+
+    def allows_request(self) -> bool:
+        state = self.state
+        if state == CLOSED:
+            return True
+        if state == HALF_OPEN:
+            return self._half_open_in_flight < self.half_open_max_calls
+        return False
+
+    def failure_rate(self) -> float:
+        if not self._outcomes:
+            return 0.0
+        return self._outcomes.count(False) / len(self._outcomes)
+
+    def _trip(self):
+        self._state = OPEN
+        self._opened_at = time.monotonic()
+        log.warning("circuit '%s' opened (failure rate %.0f%%)", self.name, self.failure_rate() * 100)
+
+    def record_success(self):
+        if self._state == HALF_OPEN:
+            log.info("circuit '%s' closed after successful probe", self.name)
+            self._state = CLOSED
+            self._outcomes.clear()
+        self._outcomes.append(True)
+
+    def record_failure(self):
+        if self._state == HALF_OPEN:
+            self._trip()
+            return
+        self._outcomes.append(False)
+        if len(self._outcomes) >= self.min_calls and self.failure_rate() >= self.failure_rate_threshold:
+            self._trip()
+
+    async def call(self, fn: Callable[..., Awaitable[T]], *args, **kwargs) -> T:
+        """Await `fn(*args, **kwargs)` through the breaker."""
+        if not self.allows_request():
+            self.rejected += 1
+            retry_in = max(0.0, self.open_seconds - (time.monotonic() - self._opened_at))
+            raise CircuitOpenError(self.name, retry_in)
+
+        probing = self._state == HALF_OPEN
+        if probing:
+            self._half_open_in_flight += 1
+        try:
+            if self.call_timeout:
+                result = await asyncio.wait_for(fn(*args, **kwargs), timeout=self.call_timeout)
+            else:
+                result = await fn(*args, **kwargs)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            if isinstance(e, asyncio.TimeoutError) or self.counts_as_failure(e):
+                self.record_failure()
+            else:
+                self.record_success()
+            raise
+        finally:
+            if probing:
+                self._half_open_in_flight -= 1
+        self.record_success()
+        return result
+
+    def snapshot(self) -> dict:
+        return {
+            "state": self.state,
+            "failure_rate": round(self.failure_rate(), 3),
+            "calls_in_window": len(self._outcomes),
+            "rejected": self.rejected,
+        }
+
+
+def snapshot_all() -> Dict[str, dict]:
+    return {name: breaker.snapshot() for name, breaker in BREAKERS.items()}
@@ -0,0 +1,17 @@
+import pytest
+from postgrest import AsyncPostgrestClient
+
+from ReplyChallenge.database import async_service
+
+
+@pytest.fixture
+def fake_db(monkeypatch):
+    """Give the async database service an offline PostgREST client, so
+    queries are built but never sent. Call the returned function with an
+    `execute(query)` coroutine to answer them."""
+    monkeypatch.setattr(async_service, "get_async_client", lambda: AsyncPostgrestClient("http://db.invalid/rest/v1"))
+
+    def answer(execute):
+        monkeypatch.setattr(async_service, "_execute", execute)
+
+    return answer
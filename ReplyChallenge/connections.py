@@ -0,0 +1,276 @@
+"""
+Realtime connection tracking for the multiplayer chat room.
+
+Each WebSocket gets one compact `Connection` record holding everything the
+server needs to know about it. Outbound frames go through a small per-socket
+queue drained by a writer task, so one slow or dead client never stalls a
+broadcast to everybody else.
+
+Room events carry a monotonically increasing `seq` and are kept in a bounded
+per-room `RoomLog`, so a client that reconnects with `/ws?since=N` receives
+only what it missed, ahead of any newer event. (`{"type": "resume",
+"since": N}` on an open socket does the same for older clients.)
+"""
+
+import asyncio
+import json
+import time
+from collections import deque
+from typing import Deque, Dict, List, Optional, Tuple
+
+from fastapi import WebSocket
+
+from ReplyChallenge.logs import get_logger
+
+log = get_logger("connections")
+
+
+class Connection:
+    """State for a single connected WebSocket."""
+
+    __slots__ = ("websocket", "username", "room", "last_seen", "outbox", "writer")
+
+    def __init__(self, websocket: WebSocket, room: str, outbox_size: int):
+        self.websocket = websocket
+        self.username: Optional[str] = None
+        self.room = room
+        self.last_seen = time.monotonic()
+        self.outbox: asyncio.Queue = asyncio.Queue(maxsize=outbox_size)
+        self.writer: Optional[asyncio.Task] = None
+
+    def touch(self):
+        self.last_seen = time.monotonic()
+
+
+class RoomLog:
+    """Sequence counter plus a bounded replay window for one room."""
+
+    __slots__ = ("seq", "events")
+
+    def __init__(self, max_events: int):
+        self.seq = 0
+        self.events: Deque[Tuple[int, str]] = deque(maxlen=max_events)
+
+    def append(self, obj: dict) -> str:
+        self.seq += 1
+        payload = json.dumps({**obj, "seq": self.seq})
+        self.events.append((self.seq, payload))
+        return payload
+
+    def since(self, seq: int) -> Optional[List[str]]:
+        """Return the payloads after `seq`, or None when the client is too far
+        behind (or ahead, e.g. after a server restart) to be caught up."""
+        if seq > self.seq:
+            return None
+        if seq == self.seq:
+            return []
+        oldest = self.events[0][0] if self.events else self.seq + 1
+        if seq < oldest - 1:
+            return None
+        return [payload for s, payload in self.events if s > seq]
+
+
+class ConnectionManager:
+    def __init__(
+        self,
+        heartbeat_interval: float = 20.0,
+        idle_timeout: float = 60.0,
+        outbox_size: int = 256,
+        send_timeout: float = 10.0,
+        replay_size: int = 500,
+    ):
+        self.connections: Dict[WebSocket, Connection] = {}
+        self.rooms: Dict[str, RoomLog] = {}
+        self.replay_size = replay_size
+        self.heartbeat_interval = heartbeat_interval
+        self.idle_timeout = idle_timeout
+        self.outbox_size = outbox_size
+        self.send_timeout = send_timeout
+        self._heartbeat_task: Optional[asyncio.Task] = None
+
+    @property
+    def active_connections(self) -> List[WebSocket]:
+        return list(self.connections.keys())
+
+    async def connect(self, websocket: WebSocket, room: str, since: Optional[int] = None):
+        """Accept a socket into `room`. A reconnecting client passes the last
+        `seq` it saw as `since`; the events it missed are queued before the
+        socket joins the room, so no live broadcast can overtake them."""
+        await websocket.accept()
+        conn = Connection(websocket, room, self.outbox_size)
+        conn.writer = asyncio.create_task(self._writer(conn))
+        # Tell the client where the room currently is so it has a baseline
+        # to resume from even if it never receives a sequenced event.
+        frames = [json.dumps({"type": "session", "room": room, "seq": self.room_log(room).seq})]
+        if since is not None:
+            frames += self._replay(room, since)
+        queued = all(self._enqueue(conn, payload) for payload in frames)
+        self.connections[websocket] = conn
+        if not queued:
+            await self.drop(websocket, reason="outbox full")
+        return conn
+
+    def room_log(self, room: str) -> RoomLog:
+        log = self.rooms.get(room)
+        if log is None:
+            log = self.rooms[room] = RoomLog(self.replay_size)
+        return log
+
+    def disconnect(self, websocket: WebSocket) -> Optional[Connection]:
+        """Forget a websocket and stop its writer. Returns the removed state."""
+        conn = self.connections.pop(websocket, None)
+        if conn is None:
+            return None
+        if conn.writer is not None and conn.writer is not asyncio.current_task():
+            conn.writer.cancel()
+        return conn
+
+    async def drop(self, websocket: WebSocket, reason: str = "disconnected"):
+        """Remove a connection, close its socket and tell the room it left.
+
+        Safe to call more than once for the same websocket; only the first
+        call broadcasts `user.left`.
+        """
+        conn = self.disconnect(websocket)
+        if conn is None:
+            return
+        log.info("dropping connection (%s), %s remaining", reason, len(self.connections))
+        try:
+            await websocket.close()
+        except Exception:
+            pass
+        if conn.username:
+            await self.broadcast_json({"type": "user.left", "username": conn.username}, room=conn.room)
+
+    def touch(self, websocket: WebSocket):
+        conn = self.connections.get(websocket)
+        if conn is not None:
+            conn.touch()
+
+    def set_username(self, websocket: WebSocket, username: str):
+        conn = self.connections.get(websocket)
+        if conn is not None:
+            conn.username = username
+
+    def get_username(self, websocket: WebSocket) -> Optional[str]:
+        conn = self.connections.get(websocket)
+        return conn.username if conn is not None else None
+
+    def _enqueue(self, conn: Connection, payload: str) -> bool:
+        try:
+            conn.outbox.put_nowait(payload)
+            return True
+        except asyncio.QueueFull:
+            return False
+
+    async def send_json(self, websocket: WebSocket, obj: dict):
+        """Queue a JSON object for a single websocket."""
+        conn = self.connections.get(websocket)
+        if conn is None:
+            return
+        if not self._enqueue(conn, json.dumps(obj)):
+            await self.drop(websocket, reason="outbox full")
+
+    async def send_to_user(self, username: str, obj: dict):
+        """Queue a JSON object for every socket open as `username`."""
+        for websocket, conn in list(self.connections.items()):
+            if conn.username == username:
+                await self.send_json(websocket, obj)
+
+    async def broadcast_json(
+        self,
+        obj: dict,
+        exclude: Optional[WebSocket] = None,
+        room: Optional[str] = None,
+        ephemeral: bool = False,
+    ):
+        """Send a JSON-serializable object to all active connections as a JSON string.
+        Optionally exclude a websocket (e.g., do not send typing presence back to origin).
+
+        Events sent to a `room` are stamped with the room's next `seq` and kept
+        for replay. `ephemeral` events (typing presence) are neither numbered
+        nor replayed.
+        """
+        if room is not None and not ephemeral:
+            payload = self.room_log(room).append(obj)
+        else:
+            payload = json.dumps(obj)
+        await self.broadcast(payload, exclude=exclude, room=room)
+
+    async def broadcast(self, message: str, exclude: Optional[WebSocket] = None, room: Optional[str] = None):
+        # Queue the message for every open tab; clients that cannot keep up
+        # are evicted instead of buffering without bound.
+        stalled = []
+        for websocket, conn in list(self.connections.items()):
+            if exclude is not None and websocket is exclude:
+                continue
+            if room is not None and conn.room != room:
+                continue
+            if not self._enqueue(conn, message):
+                stalled.append(websocket)
+        for websocket in stalled:
+            await self.drop(websocket, reason="outbox full")
+
+    async def resume(self, websocket: WebSocket, since: int):
+        """Replay the room events a reconnecting client missed after `since`.
+
+        When the gap is older than the replay window the client gets a
+        `resync` frame followed by everything still retained, and should
+        reload history for anything older.
+        """
+        conn = self.connections.get(websocket)
+        if conn is None:
+            return
+        for payload in self._replay(conn.room, since):
+            if not self._enqueue(conn, payload):
+                await self.drop(websocket, reason="outbox full")
+                return
+
+    def _replay(self, room: str, since: int) -> List[str]:
+        log = self.room_log(room)
+        missed = log.since(since)
+        if missed is not None:
+            return missed
+        oldest = log.events[0][0] if log.events else log.seq
+        return [json.dumps({"type": "resync", "seq": log.seq, "oldest": oldest})] + [payload for _, payload in log.events]
+
+    async def _writer(self, conn: Connection):
+        while True:
+            payload = await conn.outbox.get()
+            try:
+                await asyncio.wait_for(conn.websocket.send_text(payload), timeout=self.send_timeout)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                log.warning("error sending to a client, evicting: %s", e)
+                await self.drop(conn.websocket, reason="send failed")
+                return
+
+    async def reap_idle(self):
+        """Evict connections that have been silent for longer than idle_timeout
+        and ping everybody else."""
+        now = time.monotonic()
+        for websocket, conn in list(self.connections.items()):
+            if now - conn.last_seen > self.idle_timeout:
+                await self.drop(websocket, reason="idle timeout")
+            elif not self._enqueue(conn, json.dumps({"type": "ping", "ts": time.time()})):
+                await self.drop(websocket, reason="outbox full")
+
+    async def _heartbeat(self):
+        while True:
+            await asyncio.sleep(self.heartbeat_interval)
+            try:
+                await self.reap_idle()
+            except Exception as e:
+                log.warning("heartbeat sweep failed: %s", e)
+
+    def start(self):
+        if self._heartbeat_task is None:
+            self._heartbeat_task = asyncio.create_task(self._heartbeat())
+
+    async def stop(self):
+        if self._heartbeat_task is not None:
+            self._heartbeat_task.cancel()
+            self._heartbeat_task = None
+        for websocket in list(self.connections.keys()):
+            self.disconnect(websocket)
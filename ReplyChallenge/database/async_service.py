@@ -0,0 +1,565 @@
+"""
+Async variants of the functions in `service.py`.
+
+These run on the pooled, keep-alive HTTP client from `client.get_async_client`
+so the FastAPI event loop can await database calls directly instead of
+blocking on the synchronous supabase client or queueing behind a fixed-size
+thread pool. Signatures and return values match the synchronous versions.
+"""
+
+from datetime import datetime
+
+from postgrest.exceptions import APIError
+from postgrest.types import ReturnMethod
+
+from ReplyChallenge.circuit_breaker import CircuitBreaker
+from ReplyChallenge.logs import get_logger
+from .client import get_async_client
+
+# Every query goes through this breaker. Slow calls (SUPABASE_BREAKER_CALL_TIMEOUT)
+# count as failures; PostgREST error responses (bad filters, missing tables) do
+# not, since they say nothing about whether Supabase is reachable.
+breaker = CircuitBreaker.from_env(
+    "supabase",
+    "SUPABASE",
+    call_timeout=5.0,
+    counts_as_failure=lambda e: not isinstance(e, APIError),
+)
+
+log = get_logger("database")
+
+
+async def _execute(query):
+    return await breaker.call(query.execute)
+
+
+async def log_chat_to_db(user_prompt: str, ai_response: str, tokens: int, session_id: str, metadata: dict, username: str = "WebUser", user_id: str | None = None):
+    """Saves the chat interaction to the `requests` table."""
+    db = get_async_client()
+    if db is None:
+        log.debug("Database not connected. Skipping log: %s...", user_prompt[:50])
+        return None
+
+    try:
+        data_payload = {
+            "prompt": user_prompt,
+            "response": ai_response,
+            "tokens_used": tokens,
+            "session_id": session_id,
+            "metadata": metadata,
+            "username": username,
+            "user_id": user_id,
+            "created_at": datetime.utcnow().isoformat()
+        }
+        result = await _execute(db.table("requests").insert(data_payload))
+        log.debug("Logged to Supabase (Session: %s)", session_id)
+        return result
+    except Exception as e:
+        log.error("Database Error: %s", e)
+        raise
+
+
+async def get_session_history(session_id: str, limit: int | None = None, after: str | None = None):
+    """Retrieve chat messages for a session in chronological order.
+
+    When `limit` is given only the most recent `limit` rows are returned.
+    With `after` (an ISO timestamp) only rows created later are returned,
+    oldest first, so `limit` then caps how far forward the read goes.
+    """
+    db = get_async_client()
+    if db is None:
+        log.debug("Database not connected. Skipping history lookup")
+        return []
+
+    try:
+        q = db.table("requests").select("*").eq("session_id", session_id)
+        if after:
+            q = q.gt("created_at", after).order("created_at")
+            result = await _execute(q.limit(limit) if limit else q)
+            rows = result.data
+        elif limit:
+            q = q.order("created_at", desc=True).limit(limit)
+            result = await _execute(q)
+            rows = list(reversed(result.data))
+        else:
+            result = await _execute(q.order("created_at"))
+            rows = result.data
+        log.debug("Retrieved %s messages from session %s", len(rows), session_id)
+        return rows
+    except Exception as e:
+        log.error("Database Error retrieving history: %s", e)
+        raise
+
+
+async def get_session_summary(session_id: str):
+    """Return the `session_summaries` row for a session, or None."""
+    db = get_async_client()
+    if db is None:
+        return None
+
+    try:
+        result = await _execute(db.table("session_summaries").select("*").eq("session_id", session_id).limit(1))
+        return result.data[0] if result.data else None
+    except Exception as e:
+        log.error("Database Error retrieving summary for %s: %s", session_id, e)
+        raise
+
+
+async def save_session_summary(session_id: str, summary: str, covered_until: str, message_count: int):
+    """Insert or replace the rolling summary of a session."""
+    db = get_async_client()
+    if db is None:
+        log.debug("Database not connected. Skipping summary save for %s", session_id)
+        return None
+
+    try:
+        payload = {
+            "session_id": session_id,
+            "summary": summary,
+            "covered_until": covered_until,
+            "message_count": message_count,
+            "updated_at": datetime.utcnow().isoformat(),
+        }
+        return await _execute(db.table("session_summaries").upsert(payload, on_conflict="session_id"))
+    except Exception as e:
+        log.error("Database Error saving summary for %s: %s", session_id, e)
+        raise
+
+
+async def create_request_entry(prompt: str, session_id: str, username: str | None = None, user_id: str | None = None, metadata: dict | None = None):
+    """Insert a new row into the requests table for an incoming user message.
+    Returns the inserted row (or None if DB unavailable).
+    """
+    db = get_async_client()
+    if db is None:
+        log.debug("Database not connected. Skipping insert: %s...", prompt[:50])
+        return None
+
+    try:
+        payload = {
+            "prompt": prompt,
+            "response": None,
+            "tokens_used": None,
+            "session_id": session_id,
+            "metadata": metadata or {},
+            "username": username or "WebUser",
+            "user_id": user_id,
+            "created_at": datetime.utcnow().isoformat()
+        }
+        result = await _execute(db.table("requests").insert(payload))
+        if hasattr(result, 'data') and result.data:
+            return result.data[0]
+        return None
+    except Exception as e:
+        log.error("Database Error inserting request: %s", e)
+        raise
+
+
+async def update_request_response(request_id: str, ai_response: str | None, tokens: int | None = None, metadata: dict | None = None):
+    """Update an existing request row with AI response, tokens used and metadata."""
+    db = get_async_client()
+    if db is None:
+        log.debug("Database not connected. Skipping update for id=%s", request_id)
+        return None
+
+    try:
+        payload = {
+            "response": ai_response,
+            "tokens_used": tokens,
+            "metadata": metadata or {},
+            "updated_at": datetime.utcnow().isoformat()
+        }
+        return await _execute(db.table("requests").update(payload).eq("id", request_id))
+    except Exception as e:
+        log.error("Database Error updating request %s: %s", request_id, e)
+        raise
+
+
+async def verify_database_connection():
+    """Test if Supabase connection is working."""
+    db = get_async_client()
+    if db is None:
+        log.warning("Database not connected. Set SUPABASE_URL and SUPABASE_KEY in .env file")
+        return False
+
+    try:
+        await _execute(db.table("requests").select("id").limit(1))
+        log.info("Database connection verified")
+        return True
+    except Exception as e:
+        log.error("Database connection check failed: %s", e)
+        return False
+
+
+async def add_memory(content: str, embedding: list, user_id: str | None = None, session_id: str | None = None, username: str | None = None):
+    """Insert a memory row with a vector embedding. Returns the inserted row or None."""
+    db = get_async_client()
+    if db is None:
+        log.debug("Database not connected. Skipping memory insert: %s...", content[:50])
+        return None
+
+    try:
+        payload = {
+            "user_id": user_id,
+            "session_id": session_id,
+            "username": username,
+            "content": content,
+            "embedding": embedding,
+        }
+        result = await _execute(db.table("memory").insert(payload))
+        if hasattr(result, "data") and result.data:
+            return result.data[0]
+        return None
+    except Exception as e:
+        log.error("Database Error inserting memory: %s", e)
+        raise
+
+
+async def add_memories(rows: list):
+    """Insert many memory rows (dicts with id, content, embedding, session_id,
+    username, ...) in one INSERT. Rows are not echoed back (the embeddings
+    would make the response as large as the request); returns how many
+    were written."""
+    db = get_async_client()
+    if db is None:
+        log.debug("Database not connected. Skipping insert of %s memories", len(rows))
+        return 0
+    if not rows:
+        return 0
+
+    try:
+        await _execute(db.table("memory").insert(rows, returning=ReturnMethod.minimal))
+        return len(rows)
+    except Exception as e:
+        log.error("Database Error inserting %s memories: %s", len(rows), e)
+        raise
+
+
+async def touch_memories(memory_ids: list):
+    """Count a recall of many memories (hit_count + 1, last_seen_at = now)
+    with one call to the `touch_memories` RPC."""
+    db = get_async_client()
+    if db is None or not memory_ids:
+        return None
+
+    try:
+        return await _execute(db.rpc("touch_memories", {"memory_ids": memory_ids}))
+    except Exception as e:
+        log.error("Database Error touching %s memories: %s", len(memory_ids), e)
+        raise
+
+
+async def list_memories(session_id: str | None = None, username: str | None = None, limit: int = 1000, after: str | None = None, newest_first: bool = False, columns: str = "id, session_id, username, content, embedding, hit_count, created_at, last_seen_at", offset: int = 0):
+    """Return up to `limit` memory rows (skipping the first `offset`),
+    optionally restricted to one (session, user) partition and to rows
+    created at or after `after` (an ISO timestamp; callers skip ids they
+    already have)."""
+    db = get_async_client()
+    if db is None:
+        return []
+
+    try:
+        q = db.table("memory").select(columns)
+        if session_id is not None:
+            q = q.eq("session_id", session_id)
+        if username is not None:
+            q = q.eq("username", username)
+        if after:
+            q = q.gte("created_at", after)
+        direction = ".desc" if newest_first else ""
+        q = q.order(f"created_at{direction},id{direction}")
+        q = q.limit(limit)
+        if offset:
+            q = q.offset(offset)
+        result = await _execute(q)
+        return result.data or []
+    except Exception as e:
+        log.error("Database Error listing memories: %s", e)
+        raise
+
+
+async def update_memory(memory_id, updates: dict):
+    """Apply `updates` (e.g. hit_count, last_seen_at) to one memory row."""
+    db = get_async_client()
+    if db is None:
+        return None
+
+    try:
+        return await _execute(db.table("memory").update(updates).eq("id", memory_id))
+    except Exception as e:
+        log.error("Database Error updating memory %s: %s", memory_id, e)
+        raise
+
+
+async def delete_memories(memory_ids: list):
+    """Delete many memory rows in a single DELETE ... WHERE id IN (...)."""
+    db = get_async_client()
+    if db is None or not memory_ids:
+        return None
+
+    try:
+        return await _execute(db.table("memory").delete().in_("id", memory_ids))
+    except Exception as e:
+        log.error("Database Error deleting %s memories: %s", len(memory_ids), e)
+        raise
+
+
+async def list_memory_partitions(page_size: int = 5000):
+    """Return the distinct (session_id, username) pairs in the memory table,
+    read from the `memory_partitions` view."""
+    db = get_async_client()
+    if db is None:
+        return []
+
+    try:
+        partitions, offset = [], 0
+        while True:
+            q = db.table("memory_partitions").select("session_id, username").order("session_id,username")
+            result = await _execute(q.limit(page_size).offset(offset))
+            rows = result.data or []
+            partitions.extend((r.get("session_id"), r.get("username")) for r in rows)
+            if len(rows) < page_size:
+                return partitions
+            offset += page_size
+    except Exception as e:
+        log.error("Database Error listing memory partitions: %s", e)
+        raise
+
+
+async def find_similar_memories(query_embedding: list, match_count: int = 5, threshold: float = 0.0, session_id: str | None = None, username: str | None = None):
+    """Call the database RPC `match_memory` function to find similar memory rows.
+    Only rows with cosine similarity >= `threshold` are returned; `session_id`
+    and `username` restrict the search to one room and/or user.
+    Returns a list of rows with fields (id, user_id, session_id, username,
+    content, hit_count, created_at, similarity), most similar first.
+    """
+    db = get_async_client()
+    if db is None:
+        log.debug("Database not connected. Skipping memory search")
+        return []
+
+    try:
+        params = {
+            "query_embedding": query_embedding,
+            "match_count": match_count,
+            "match_threshold": threshold,
+            "filter_session_id": session_id,
+            "filter_username": username,
+        }
+        result = await _execute(db.rpc("match_memory", params))
+        return result.data or []
+    except Exception as e:
+        log.error("Database Error searching memory: %s", e)
+        raise
+
+
+async def export_pages(table: str, session_id: str | None = None, username: str | None = None, user_id: str | None = None, since: str | None = None, until: str | None = None, page_size: int = 250):
+    """Yield every row of `requests` or `facts` matching the filters, one
+    page (list) at a time, in (created_at, id) order.
+
+    Pages are read with keyset pagination: each query continues after the
+    last (created_at, id) seen instead of using an OFFSET, so every page
+    costs the same and rows inserted meanwhile don't shift the window. Only
+    one page is held at a time. `since` is inclusive and `until` exclusive
+    (ISO timestamps). Facts have no session of their own; `session_id`
+    matches the session of the request they were extracted from.
+    """
+    db = get_async_client()
+    if db is None:
+        log.debug("Database not connected. Skipping export of %s", table)
+        return
+
+    last = None
+    while True:
+        try:
+            joined = table == "facts" and session_id is not None
+            q = db.table(table).select("*, requests!inner(session_id)" if joined else "*")
+            if session_id is not None:
+                q = q.eq("requests.session_id" if joined else "session_id", session_id)
+            if username is not None:
+                q = q.eq("username", username)
+            if user_id is not None:
+                q = q.eq("user_id", user_id)
+            if since:
+                q = q.gte("created_at", since)
+            if until:
+                q = q.lt("created_at", until)
+            if last is not None:
+                created_at, row_id = last
+                q.params = q.params.add("or", f'(created_at.gt."{created_at}",and(created_at.eq."{created_at}",id.gt.{row_id}))')
+            # one combined order param; PostgREST doesn't merge repeated ones
+            result = await _execute(q.order("created_at,id").limit(page_size))
+        except Exception as e:
+            log.error("Database Error exporting %s: %s", table, e)
+            raise
+        rows = result.data or []
+        if joined:
+            for row in rows:
+                row.pop("requests", None)
+        if rows:
+            yield rows
+        if len(rows) < page_size:
+            return
+        last = (rows[-1]["created_at"], rows[-1]["id"])
+
+
+async def add_fact(user_id: str | None, username: str | None, request_id: str | None, fact_type: str, value: str, normalized_value: str | None = None, confidence: float | None = None, metadata: dict | None = None):
+    """Insert a structured fact (e.g. birthday) into `facts` table.
+    Returns inserted row or None.
+    """
+    db = get_async_client()
+    if db is None:
+        log.debug("Database not connected. Skipping fact insert: %s=%s", fact_type, value)
+        return None
+
+    try:
+        payload = {
+            "user_id": user_id,
+            "username": username,
+            "request_id": request_id,
+            "fact_type": fact_type,
+            "value": value,
+            "normalized_value": normalized_value,
+            "confidence": confidence,
+            "metadata": metadata or {},
+            "created_at": datetime.utcnow().isoformat(),
+            "updated_at": datetime.utcnow().isoformat(),
+        }
+        result = await _execute(db.table("facts").insert(payload))
+        if hasattr(result, "data") and result.data:
+            return result.data[0]
+        return None
+    except Exception as e:
+        log.error("Database Error inserting fact: %s", e)
+        raise
+
+
+async def get_facts_for_user(user_id: str | None = None, username: str | None = None, limit: int | None = None, offset: int = 0):
+    """Retrieve active facts for a user either by user_id or username (or both).
+
+    Rows are ordered by created_at, id. With `limit` set, returns one page
+    starting at `offset`; without it, everything from `offset` on.
+    """
+    db = get_async_client()
+    if db is None:
+        log.debug("Database not connected. Skipping facts lookup")
+        return []
+
+    try:
+        q = db.table("facts").select("*")
+        if user_id:
+            q = q.eq("user_id", user_id)
+        if username:
+            q = q.eq("username", username)
+        # one combined order param; PostgREST doesn't merge repeated ones
+        q = q.eq("active", True).order("created_at,id")
+        # limit/offset params: this client's range() takes an exclusive end
+        if limit:
+            q = q.limit(limit)
+        if offset:
+            q = q.offset(offset)
+        result = await _execute(q)
+        if hasattr(result, "data") and result.data:
+            return result.data
+        return []
+    except Exception as e:
+        err_text = str(e)
+        log.error("Database Error fetching facts: %s", err_text)
+        # Missing table / schema issues degrade to "no facts" like the sync version
+        if "Could not find the table" in err_text or "PGRST205" in err_text:
+            return []
+        raise
+
+
+async def upsert_fact(user_id: str | None, username: str | None, request_id: str | None, fact_type: str, value: str, normalized_value: str | None = None, confidence: float | None = None, metadata: dict | None = None):
+    """Insert or update a fact for a user. For MVP we dedupe by (user_id or username) + fact_type."""
+    db = get_async_client()
+    if db is None:
+        log.debug("Database not connected. Skipping upsert for fact")
+        return None
+
+    try:
+        if user_id:
+            existing = await _execute(db.table("facts").select("*").eq("user_id", user_id).eq("fact_type", fact_type))
+        elif username:
+            existing = await _execute(db.table("facts").select("*").eq("username", username).eq("fact_type", fact_type))
+        else:
+            existing = None
+
+        if existing and hasattr(existing, "data") and existing.data:
+            row_id = existing.data[0].get("id")
+            payload = {
+                "value": value,
+                "normalized_value": normalized_value,
+                "confidence": confidence,
+                "metadata": (metadata or {}),
+                "updated_at": datetime.utcnow().isoformat(),
+                "request_id": request_id,
+                "active": True,
+            }
+            return await _execute(db.table("facts").update(payload).eq("id", row_id))
+
+        return await add_fact(user_id, username, request_id, fact_type, value, normalized_value, confidence, metadata)
+    except Exception as e:
+        log.error("Database Error upserting fact: %s", e)
+        raise
+
+
+async def delete_fact(fact_id: str):
+    """Soft-delete a fact (set active=false)."""
+    db = get_async_client()
+    if db is None:
+        log.debug("Database not connected. Skipping delete for fact %s", fact_id)
+        return None
+
+    try:
+        payload = {"active": False, "updated_at": datetime.utcnow().isoformat()}
+        return await _execute(db.table("facts").update(payload).eq("id", fact_id))
+    except Exception as e:
+        log.error("Database Error deleting fact %s: %s", fact_id, e)
+        raise
+
+
+async def update_fact(fact_id: str, updates: dict):
+    """Update arbitrary fields on a fact row (safe for metadata/values)."""
+    db = get_async_client()
+    if db is None:
+        log.debug("Database not connected. Skipping update for fact %s", fact_id)
+        return None
+
+    try:
+        updates["updated_at"] = datetime.utcnow().isoformat()
+        return await _execute(db.table("facts").update(updates).eq("id", fact_id))
+    except Exception as e:
+        log.error("Database Error updating fact %s: %s", fact_id, e)
+        raise
+
+
+async def delete_facts(fact_ids: list[str]):
+    """Soft-delete many facts in a single UPDATE ... WHERE id IN (...)."""
+    db = get_async_client()
+    if db is None:
+        log.debug("Database not connected. Skipping delete for %s facts", len(fact_ids))
+        return None
+
+    try:
+        payload = {"active": False, "updated_at": datetime.utcnow().isoformat()}
+        return await _execute(db.table("facts").update(payload).in_("id", fact_ids))
+    except Exception as e:
+        log.error("Database Error deleting %s facts: %s", len(fact_ids), e)
+        raise
+
+
+async def update_facts(fact_ids: list[str], updates: dict):
+    """Apply the same field updates to many facts in a single statement."""
+    db = get_async_client()
+    if db is None:
+        log.debug("Database not connected. Skipping update for %s facts", len(fact_ids))
+        return None
+
+    try:
+        updates = {**updates, "updated_at": datetime.utcnow().isoformat()}
+        return await _execute(db.table("facts").update(updates).in_("id", fact_ids))
+    except Exception as e:
+        log.error("Database Error updating %s facts: %s", len(fact_ids), e)
+        raise
@@ -1,23 +1,119 @@
+"""
+Supabase clients, built lazily on first use.
+
+Nothing here connects at import time: `get_client()` returns the synchronous
+supabase client used by scripts and `service.py`, `get_async_client()` the
+pooled async PostgREST client used by the API server. Both return None when
+SUPABASE_URL / SUPABASE_KEY are not configured.
+"""
+
+import logging
 import os
-from supabase import create_client, Client
+from pathlib import Path
+
+import httpx
 from dotenv import load_dotenv
+from postgrest import AsyncPostgrestClient
+from supabase import create_client, Client
+
+log = logging.getLogger("replychallenge.database")
+
+_env_loaded = False
+
+
+def load_env():
+    """Load ReplyChallenge/.env (then a .env in the working directory) once.
+
+    Values already present in the process environment are never overridden.
+    """
+    global _env_loaded
+    if _env_loaded:
+        return
+    load_dotenv(Path(__file__).resolve().parent.parent / ".env")
+    load_dotenv()
+    _env_loaded = True
+
+
+def _credentials() -> tuple[str | None, str | None]:
+    load_env()
+    return os.getenv("SUPABASE_URL"), os.getenv("SUPABASE_KEY")
+
+
+_client: Client | None = None
 
-# 1. Load environment variables
-load_dotenv()
 
-# 2. Fetch the secrets
-url = os.getenv("SUPABASE_URL")
-key = os.getenv("SUPABASE_KEY")
+def get_client() -> Client | None:
+    """Return the shared synchronous supabase client (created on first use)."""
+    global _client
+    if _client is not None:
+        return _client
 
-# 3. Check if they exist (Good for debugging)
-if not url or not key:
-    print("⚠️  Warning: Supabase credentials not found in .env file")
-    print("   Set SUPABASE_URL and SUPABASE_KEY to enable database features")
-    supabase = None
-else:
+    url, key = _credentials()
+    if not url or not key:
+        log.warning("Supabase credentials not found in .env file (Set SUPABASE_URL and SUPABASE_KEY to enable database features)")
+        return None
     try:
-        # 4. Create the connection "object"
-        supabase: Client = create_client(url, key)
+        _client = create_client(url, key)
     except Exception as e:
-        print(f"⚠️  Warning: Failed to connect to Supabase: {e}")
-        supabase = None
\ No newline at end of file
+        log.warning("Failed to connect to Supabase: %s", e)
+        return None
+    return _client
+
+
+class PooledPostgrestClient(AsyncPostgrestClient):
+    """Async PostgREST client whose HTTP session keeps a bounded pool of
+    keep-alive connections instead of httpx's defaults."""
+
+    def __init__(self, base_url: str, *, headers: dict, timeout: float, limits: httpx.Limits):
+        self._limits = limits
+        super().__init__(base_url, headers=headers, timeout=timeout)
+
+    def create_session(self, base_url, headers, timeout):
+        return httpx.AsyncClient(
+            base_url=base_url,
+            headers=headers,
+            timeout=timeout,
+            limits=self._limits,
+        )
+
+
+_async_client: PooledPostgrestClient | None = None
+
+
+def get_async_client() -> PooledPostgrestClient | None:
+    """Return the shared async PostgREST client (created on first use).
+
+    Pool sizing is configurable through the environment:
+    - SUPABASE_POOL_MAX_CONNECTIONS (default 20)
+    - SUPABASE_POOL_MAX_KEEPALIVE (default 10)
+    - SUPABASE_POOL_KEEPALIVE_EXPIRY seconds (default 30)
+    - SUPABASE_HTTP_TIMEOUT seconds (default 10)
+    """
+    global _async_client
+    if _async_client is not None:
+        return _async_client
+
+    url, key = _credentials()
+    if not url or not key:
+        return None
+
+    limits = httpx.Limits(
+        max_connections=int(os.getenv("SUPABASE_POOL_MAX_CONNECTIONS", "20")),
+        max_keepalive_connections=int(os.getenv("SUPABASE_POOL_MAX_KEEPALIVE", "10")),
+        keepalive_expiry=float(os.getenv("SUPABASE_POOL_KEEPALIVE_EXPIRY", "30")),
+    )
+    _async_client = PooledPostgrestClient(
+        f"{url.rstrip('/')}/rest/v1",
+        headers={"apiKey": key, "Authorization": f"Bearer {key}"},
+        timeout=float(os.getenv("SUPABASE_HTTP_TIMEOUT", "10")),
+        limits=limits,
+    )
+    return _async_client
+
+
+async def close_async_client():
+    """Close pooled connections (call on application shutdown)."""
+    global _async_client
+    if _async_client is not None:
+        await _async_client.aclose()
+        _async_client = None
@@ -1,6 +1,11 @@
 import json
+import logging
 from datetime import datetime
-from .client import supabase
+from .client import get_client
+
+# plain `logging` so scripts that import this module without the package
+# (test_db_quick.py) still work; the server routes it through ReplyChallenge.logs
+log = logging.getLogger("replychallenge.database")
 
 def log_chat_to_db(user_prompt: str, ai_response: str, tokens: int, session_id: str, metadata: dict, username: str = "WebUser", user_id: str | None = None):
     """
@@ -17,9 +22,9 @@ def log_chat_to_db(user_prompt: str, ai_response: str, tokens: int, session_id:
     - user_id (text, nullable)
     - created_at (timestamp)
     """
+    supabase = get_client()
     if supabase is None:
-        print(f"⚠️  Database not connected. Set SUPABASE_URL and SUPABASE_KEY in .env file")
-        print(f"   Message would have been saved: {user_prompt[:50]}...")
+        log.debug("Database not connected. Skipping log: %s...", user_prompt[:50])
         return None
     
     try:
@@ -36,11 +41,11 @@ def log_chat_to_db(user_prompt: str, ai_response: str, tokens: int, session_id:
 
         # Execute the insert
         result = supabase.table("requests").insert(data_payload).execute()
-        print(f"✓ Logged to Supabase (Session: {session_id})")
+        log.debug("Logged to Supabase (Session: %s)", session_id)
         return result
         
     except Exception as e:
-        print(f"✗ Database Error: {e}")
+        log.error("Database Error: %s", e)
         raise
 
 
@@ -48,16 +53,17 @@ def get_session_history(session_id: str):
     """
     Retrieves all chat messages for a specific session.
     """
+    supabase = get_client()
     if supabase is None:
-        print(f"⚠️  Database not connected. Set SUPABASE_URL and SUPABASE_KEY in .env file")
+        log.debug("Database not connected. Skipping history lookup")
         return []
     
     try:
         result = supabase.table("requests").select("*").eq("session_id", session_id).execute()
-        print(f"✓ Retrieved {len(result.data)} messages from session {session_id}")
+        log.debug("Retrieved %s messages from session %s", len(result.data), session_id)
         return result.data
     except Exception as e:
-        print(f"✗ Database Error retrieving history: {e}")
+        log.error("Database Error retrieving history: %s", e)
         raise
 
 
@@ -65,8 +71,9 @@ def create_request_entry(prompt: str, session_id: str, username: str | None = No
     """Insert a new row into the requests table for an incoming user message.
     Returns the inserted row (or None if DB unavailable).
     """
+    supabase = get_client()
     if supabase is None:
-        print(f"⚠️  Database not connected. Skipping insert: {prompt[:50]}...")
+        log.debug("Database not connected. Skipping insert: %s...", prompt[:50])
         return None
 
     try:
@@ -86,14 +93,15 @@ def create_request_entry(prompt: str, session_id: str, username: str | None = No
             return result.data[0]
         return None
     except Exception as e:
-        print(f"✗ Database Error inserting request: {e}")
+        log.error("Database Error inserting request: %s", e)
         raise
 
 
 def update_request_response(request_id: str, ai_response: str | None, tokens: int | None = None, metadata: dict | None = None):
     """Update an existing request row with AI response, tokens used and metadata."""
+    supabase = get_client()
     if supabase is None:
-        print(f"⚠️  Database not connected. Skipping update for id={request_id}")
+        log.debug("Database not connected. Skipping update for id=%s", request_id)
         return None
 
     try:
@@ -106,7 +114,7 @@ def update_request_response(request_id: str, ai_response: str | None, tokens: in
         result = supabase.table("requests").update(payload).eq("id", request_id).execute()
         return result
     except Exception as e:
-        print(f"✗ Database Error updating request {request_id}: {e}")
+        log.error("Database Error updating request %s: %s", request_id, e)
         raise
 
 
@@ -114,23 +122,35 @@ def verify_database_connection():
     """
     Test if Supabase connection is working.
     """
+    supabase = get_client()
     if supabase is None:
-        print(f"⚠️  Database not connected. Set SUPABASE_URL and SUPABASE_KEY in .env file")
+        log.warning("Database not connected. Set SUPABASE_URL and SUPABASE_KEY in .env file")
         return False
 
+    try:
+        supabase.table("requests").select("id").limit(1).execute()
+        log.info("Database connection verified")
+        return True
+    except Exception as e:
+        log.error("Database connection check failed: %s", e)
+        return False
 
-def add_memory(content: str, embedding: list, user_id: str | None = None):
+
+def add_memory(content: str, embedding: list, user_id: str | None = None, session_id: str | None = None, username: str | None = None):
     """Insert a memory row into the memory table with a vector embedding.
     embedding should be a list of floats matching the DB vector dimension (1536).
     Returns the inserted row or None.
     """
+    supabase = get_client()
     if supabase is None:
-        print(f"⚠️  Database not connected. Skipping memory insert: {content[:50]}...")
+        log.debug("Database not connected. Skipping memory insert: %s...", content[:50])
         return None
 
     try:
         payload = {
             "user_id": user_id,
+            "session_id": session_id,
+            "username": username,
             "content": content,
             "embedding": embedding,
         }
@@ -139,25 +159,44 @@ def add_memory(content: str, embedding: list, user_id: str | None = None):
             return result.data[0]
         return None
     except Exception as e:
-        print(f"✗ Database Error inserting memory: {e}")
+        log.error("Database Error inserting memory: %s", e)
         raise
 
 
-def find_similar_memories(query_embedding: list, match_count: int = 5):
+def find_similar_memories(query_embedding: list, match_count: int = 5, threshold: float = 0.0, session_id: str | None = None, username: str | None = None):
     """Call the database RPC `match_memory` function to find similar memory rows.
-    Returns a list of rows with fields (id, user_id, content, similarity).
+    Only rows with cosine similarity >= `threshold` are returned; `session_id`
+    and `username` restrict the search to one room and/or user.
+    Returns a list of rows with fields (id, user_id, session_id, username,
+    content, hit_count, created_at, similarity), most similar first.
     """
+    supabase = get_client()
     if supabase is None:
-        print("⚠️  Database not connected. Skipping memory search")
+        log.debug("Database not connected. Skipping memory search")
         return []
 
+    try:
+        params = {
+            "query_embedding": query_embedding,
+            "match_count": match_count,
+            "match_threshold": threshold,
+            "filter_session_id": session_id,
+            "filter_username": username,
+        }
+        result = supabase.rpc("match_memory", params).execute()
+        return result.data or []
+    except Exception as e:
+        log.error("Database Error searching memory: %s", e)
+        raise
+
 
 def add_fact(user_id: str | None, username: str | None, request_id: str | None, fact_type: str, value: str, normalized_value: str | None = None, confidence: float | None = None, metadata: dict | None = None):
     """Insert a structured fact (e.g. birthday) into `facts` table.
     Returns inserted row or None.
     """
+    supabase = get_client()
     if supabase is None:
-        print(f"⚠️  Database not connected. Skipping fact insert: {fact_type}={value}")
+        log.debug("Database not connected. Skipping fact insert: %s=%s", fact_type, value)
         return None
 
     try:
@@ -178,14 +217,15 @@ def add_fact(user_id: str | None, username: str | None, request_id: str | None,
             return result.data[0]
         return None
     except Exception as e:
-        print(f"✗ Database Error inserting fact: {e}")
+        log.error("Database Error inserting fact: %s", e)
         raise
 
 
 def get_facts_for_user(user_id: str | None = None, username: str | None = None):
     """Retrieve facts for a user either by user_id or username (or both)."""
+    supabase = get_client()
     if supabase is None:
-        print("⚠️  Database not connected. Skipping facts lookup")
+        log.debug("Database not connected. Skipping facts lookup")
         return []
 
     try:
@@ -206,7 +246,7 @@ def get_facts_for_user(user_id: str | None = None, username: str | None = None):
         # list so frontends can handle it gracefully. The UI can surface a
         # friendly message explaining the table needs creating.
         err_text = str(e)
-        print(f"✗ Database Error fetching facts: {err_text}")
+        log.error("Database Error fetching facts: %s", err_text)
         # Return empty list on missing table or schema issues so UI doesn't explode
         if "Could not find the table" in err_text or "PGRST205" in err_text:
             return []
@@ -216,8 +256,9 @@ def get_facts_for_user(user_id: str | None = None, username: str | None = None):
 
 def upsert_fact(user_id: str | None, username: str | None, request_id: str | None, fact_type: str, value: str, normalized_value: str | None = None, confidence: float | None = None, metadata: dict | None = None):
     """Insert or update a fact for a user. For MVP we dedupe by (user_id or username) + fact_type."""
+    supabase = get_client()
     if supabase is None:
-        print("⚠️  Database not connected. Skipping upsert for fact")
+        log.debug("Database not connected. Skipping upsert for fact")
         return None
 
     try:
@@ -246,14 +287,15 @@ def upsert_fact(user_id: str | None, username: str | None, request_id: str | Non
         # no existing row -> insert
         return add_fact(user_id, username, request_id, fact_type, value, normalized_value, confidence, metadata)
     except Exception as e:
-        print(f"✗ Database Error upserting fact: {e}")
+        log.error("Database Error upserting fact: %s", e)
         raise
 
 
 def delete_fact(fact_id: str):
     """Soft-delete a fact (set active=false)."""
+    supabase = get_client()
     if supabase is None:
-        print(f"⚠️  Database not connected. Skipping delete for fact {fact_id}")
+        log.debug("Database not connected. Skipping delete for fact %s", fact_id)
         return None
 
     try:
@@ -261,14 +303,15 @@ def delete_fact(fact_id: str):
         result = supabase.table("facts").update(payload).eq("id", fact_id).execute()
         return result
     except Exception as e:
-        print(f"✗ Database Error deleting fact {fact_id}: {e}")
+        log.error("Database Error deleting fact %s: %s", fact_id, e)
         raise
 
 
 def update_fact(fact_id: str, updates: dict):
     """Update arbitrary fields on a fact row (safe for metadata/values)."""
+    supabase = get_client()
     if supabase is None:
-        print(f"⚠️  Database not connected. Skipping update for fact {fact_id}")
+        log.debug("Database not connected. Skipping update for fact %s", fact_id)
         return None
 
     try:
@@ -276,5 +319,5 @@ def update_fact(fact_id: str, updates: dict):
         result = supabase.table("facts").update(updates).eq("id", fact_id).execute()
         return result
     except Exception as e:
-        print(f"✗ Database Error updating fact {fact_id}: {e}")
-        raise
\ No newline at end of file
+        log.error("Database Error updating fact %s: %s", fact_id, e)
+        raise
@@ -0,0 +1,62 @@
+"""
+Streaming NDJSON export of the `requests` and `facts` tables.
+
+`database.export_pages` reads a table one keyset page at a time;
+`ndjson_stream` turns those pages into NDJSON bytes (one JSON object per
+line), optionally gzip-compressed as it goes. The next page is only
+fetched when the client has taken the previous one, so an export uses the
+same memory for ten rows as for ten million, and a slow client slows the
+export down instead of buffering it.
+"""
+
+import json
+import zlib
+from typing import AsyncIterator, Iterable, List
+
+from ReplyChallenge.logs import get_logger
+
+log = get_logger("export")
+
+
+def ndjson(rows: Iterable[dict]) -> bytes:
+    return "".join(json.dumps(row, default=str, ensure_ascii=False) + "\n" for row in rows).encode("utf-8")
+
+
+async def first_page_ready(pages: AsyncIterator[List[dict]]) -> AsyncIterator[List[dict]]:
+    """Fetch the first page now and return an iterator over all pages.
+
+    Called before the response starts, so a query that fails outright is
+    reported with an error status instead of an empty 200.
+    """
+    first = await anext(pages, [])
+
+    async def chained():
+        yield first
+        async for page in pages:
+            yield page
+
+    return chained()
+
+
+async def ndjson_stream(pages: AsyncIterator[List[dict]], compress: bool = False) -> AsyncIterator[bytes]:
+    """Encode `pages` as NDJSON (gzip when `compress`).
+
+    Headers are already sent when a later page fails, so the error is
+    written as a final `{"error": ...}` line for the client to notice.
+    """
+    gz = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS) if compress else None
+    rows = 0
+    try:
+        async for page in pages:
+            rows += len(page)
+            data = ndjson(page)
+            data = gz.compress(data) if gz else data
+            if data:
+                yield data
+    except Exception as e:
+        log.exception("export failed after %s rows", rows)
+        data = ndjson([{"error": str(e), "rows": rows}])
+        yield gz.compress(data) if gz else data
+    if gz:
+        yield gz.flush()
+    log.info("export finished", extra={"rows": rows, "compressed": compress})
@@ -0,0 +1,159 @@
+"""
+Streaming bulk ingestion of text / markdown documents into memory.
+
+The upload body is consumed as it arrives: bytes are decoded incrementally,
+split into paragraph-aligned chunks of at most `max_chars` characters (a
+markdown heading starts a new chunk, and every chunk is prefixed with the
+document title and its section heading so it stands on its own when
+recalled), and every `batch_size` chunks are embedded with one embeddings
+request and inserted with one bulk INSERT. The next part of the body is
+only read once a batch has been stored, so memory stays bounded by one
+batch however large the document is, and a slow database slows the upload
+down instead of buffering it.
+
+`ingest_document` reports progress by updating the dict it is given.
+"""
+
+import codecs
+import re
+import time
+from typing import AsyncIterator, Awaitable, Callable, List, Optional
+
+PARAGRAPH_BREAK = re.compile(r"\n[ \t]*\n")
+SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+
+
+class DocumentTooLarge(Exception):
+    pass
+
+
+class TextChunker:
+    """Incremental UTF-8 text -> chunks splitter (see module docstring)."""
+
+    def __init__(self, max_chars: int = 1200, title: Optional[str] = None):
+        self.max_chars = max_chars
+        self.title = title
+        self._decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        self._buffer = ""
+        self._parts: List[str] = []
+        self._size = 0
+        self._heading: Optional[str] = None
+
+    def feed(self, data: bytes) -> List[str]:
+        """Consume more of the document; returns the chunks it completed."""
+        self._buffer += self._decoder.decode(data)
+        *paragraphs, self._buffer = PARAGRAPH_BREAK.split(self._buffer)
+        chunks = []
+        for paragraph in paragraphs:
+            chunks += self._add(paragraph)
+        # text without paragraph breaks mustn't accumulate without bound
+        while len(self._buffer) > 4 * self.max_chars:
+            head, self._buffer = self._cut(self._buffer)
+            chunks += self._add(head)
+        return chunks
+
+    def close(self) -> List[str]:
+        """Flush whatever is left at the end of the document."""
+        self._buffer += self._decoder.decode(b"", final=True)
+        chunks = self._add(self._buffer)
+        self._buffer = ""
+        return chunks + self._flush()
+
+    def _cut(self, text: str):
+        """Split `text` at the last sentence end (else whitespace) before max_chars."""
+        ends = [m.start() for m in SENTENCE_END.finditer(text, 0, self.max_chars)]
+        at = ends[-1] if ends else text.rfind(" ", 0, self.max_chars)
+        at = at if at > self.max_chars // 2 else self.max_chars
+        return text[:at], text[at:].lstrip()
+
+    def _pieces(self, paragraph: str) -> List[str]:
+        if len(paragraph) <= self.max_chars:
+            return [paragraph]
+        pieces, current = [], ""
+        for sentence in SENTENCE_END.split(paragraph):
+            while len(sentence) > self.max_chars:
+                head, sentence = self._cut(sentence)
+                pieces.append(head)
+            if current and len(current) + 1 + len(sentence) > self.max_chars:
+                pieces.append(current)
+                current = ""
+            current = f"{current} {sentence}" if current else sentence
+        if current:
+            pieces.append(current)
+        return pieces
+
+    def _add(self, paragraph: str) -> List[str]:
+        paragraph = paragraph.strip()
+        if not paragraph:
+            return []
+        chunks = []
+        if paragraph.startswith("#"):
+            chunks += self._flush()
+            self._heading = paragraph.split("\n", 1)[0].lstrip("#").strip() or None
+        for piece in self._pieces(paragraph):
+            if self._parts and self._size + len(piece) > self.max_chars:
+                chunks += self._flush()
+            self._parts.append(piece)
+            self._size += len(piece) + 2
+        return chunks
+
+    def _flush(self) -> List[str]:
+        if not self._parts:
+            return []
+        text = "\n\n".join(self._parts)
+        self._parts, self._size = [], 0
+        # a chunk that starts with its heading already says where it's from
+        context = [self.title, None if text.startswith("#") else self._heading]
+        prefix = " > ".join(c for c in context if c)
+        return [f"[{prefix}]\n{text}" if prefix else text]
+
+
+async def ingest_document(
+    body: AsyncIterator[bytes],
+    embed_many: Callable[[List[str]], Awaitable[List[list]]],
+    insert_many: Callable[[List[str], List[list]], Awaitable[int]],
+    progress: dict,
+    title: Optional[str] = None,
+    max_chars: int = 1200,
+    batch_size: int = 64,
+    max_bytes: Optional[int] = None,
+) -> dict:
+    """Chunk, embed and store a streamed document.
+
+    `embed_many(texts)` returns one vector per text; `insert_many(texts,
+    vectors)` stores a batch and returns how many rows it wrote. `progress`
+    is updated in place (bytes, chunks, inserted, batches, status) and
+    returned.
+    """
+    chunker = TextChunker(max_chars=max_chars, title=title)
+    pending: List[str] = []
+    progress.update({"status": "running", "bytes": 0, "chunks": 0, "inserted": 0, "batches": 0, "started_at": time.time()})
+
+    async def store(batch: List[str]):
+        vectors = await embed_many(batch)
+        progress["inserted"] += await insert_many(batch, vectors)
+        progress["batches"] += 1
+
+    try:
+        async for data in body:
+            progress["bytes"] += len(data)
+            if max_bytes is not None and progress["bytes"] > max_bytes:
+                raise DocumentTooLarge(f"document is larger than {max_bytes} bytes")
+            pending += chunker.feed(data)
+            while len(pending) >= batch_size:
+                batch, pending = pending[:batch_size], pending[batch_size:]
+                progress["chunks"] += len(batch)
+                await store(batch)
+        pending += chunker.close()
+        for start in range(0, len(pending), batch_size):
+            batch = pending[start:start + batch_size]
+            progress["chunks"] += len(batch)
+            await store(batch)
+        progress["status"] = "done"
+    except BaseException as e:
+        progress["status"] = "failed"
+        progress["error"] = str(e) or type(e).__name__
+        raise
+    finally:
+        progress["seconds"] = round(time.time() - progress["started_at"], 3)
+    return progress
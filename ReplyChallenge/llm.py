@@ -0,0 +1,94 @@
+"""
+OpenAI model layer.
+
+The client is built lazily on first use (never at import time) on an
+`httpx.AsyncClient` with a bounded keep-alive pool, so embeddings and
+completions are awaited on the event loop instead of blocking it. Calls go
+through a circuit breaker so an OpenAI outage fails fast.
+"""
+
+import os
+
+import httpx
+from openai import AsyncOpenAI, BadRequestError
+
+from ReplyChallenge.circuit_breaker import CircuitBreaker
+from ReplyChallenge.database.client import load_env
+from ReplyChallenge.logs import get_logger
+
+log = get_logger("llm")
+
+EMBEDDING_MODEL = "text-embedding-3-small"
+
+_client: AsyncOpenAI | None = None
+
+# Rejected prompts (400s) are our fault, not an outage, so they don't trip it
+breaker = CircuitBreaker.from_env(
+    "openai",
+    "OPENAI",
+    counts_as_failure=lambda e: not isinstance(e, BadRequestError),
+)
+
+
+def get_client() -> AsyncOpenAI | None:
+    """Return the shared AsyncOpenAI client, or None if OPENAI_API_KEY is unset."""
+    global _client
+    if _client is not None:
+        return _client
+
+    load_env()
+    api_key = os.getenv("OPENAI_API_KEY")
+    if not api_key:
+        return None
+
+    limits = httpx.Limits(
+        max_connections=int(os.getenv("OPENAI_POOL_MAX_CONNECTIONS", "20")),
+        max_keepalive_connections=int(os.getenv("OPENAI_POOL_MAX_KEEPALIVE", "10")),
+    )
+    _client = AsyncOpenAI(
+        api_key=api_key,
+        timeout=float(os.getenv("OPENAI_TIMEOUT", "60")),
+        http_client=httpx.AsyncClient(limits=limits),
+    )
+    log.info("OpenAI client initialized")
+    return _client
+
+
+async def close_client():
+    global _client
+    if _client is not None:
+        await _client.close()
+        _client = None
+
+
+async def embed(text: str) -> list:
+    """Return the embedding vector for `text`."""
+    emb = await breaker.call(get_client().embeddings.create, model=EMBEDDING_MODEL, input=text)
+    return emb.data[0].embedding if hasattr(emb.data[0], 'embedding') else emb.data[0]['embedding']
+
+
+async def embed_many(texts: list) -> list:
+    """Embed a batch of texts with one request; vectors come back in order."""
+    emb = await breaker.call(get_client().embeddings.create, model=EMBEDDING_MODEL, input=texts)
+    return [d.embedding for d in sorted(emb.data, key=lambda d: d.index)]
+
+
+async def chat(model: str, messages: list, temperature: float = 0.7, max_tokens: int | None = None):
+    """Run a chat completion and return the raw completion object."""
+    extra = {"max_tokens": max_tokens} if max_tokens else {}
+    return await breaker.call(
+        get_client().chat.completions.create,
+        model=model,
+        messages=messages,
+        temperature=temperature,
+        **extra,
+    )
+
+
+async def warm_up():
+    """Open a pooled connection to the API ahead of the first user request."""
+    client = get_client()
+    if client is None:
+        return False
+    await client.models.list()
+    return True
@@ -0,0 +1,184 @@
+"""
+Structured, non-blocking logging.
+
+A log call on the event loop only builds a LogRecord and puts it on a
+bounded in-memory queue (`QueueHandler`); a `QueueListener` thread formats
+records and writes them to stdout. When the queue is full records are
+dropped and counted rather than blocking the loop.
+
+Records carry the `request_id` / `session_id` of the message being handled
+(set with `bind`, inherited by tasks created afterwards) plus any keyword
+fields passed via `extra`, and are written one JSON object per line
+(`LOG_FORMAT=text` for a human-readable line instead).
+
+Sampling is per message: with `LOG_SAMPLE_RATE` below 1, a fraction of
+request ids is chosen by hash and only those requests' DEBUG/INFO records
+are kept, so sampled requests are logged end to end. Warnings and errors,
+and records outside any request, are always kept.
+
+Configuration: LOG_LEVEL (default INFO), LOG_FORMAT (json | text),
+LOG_SAMPLE_RATE (default 1.0), LOG_QUEUE_SIZE (default 10000).
+"""
+
+import atexit
+import contextvars
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import zlib
+from datetime import datetime, timezone
+from typing import Optional
+
+ROOT = "replychallenge"
+
+request_id_var: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("request_id", default=None)
+session_id_var: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("session_id", default=None)
+
+# attributes every LogRecord has; anything else was passed via `extra`
+_STANDARD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime", "request_id", "session_id"}
+
+
+def get_logger(name: str) -> logging.Logger:
+    return logging.getLogger(f"{ROOT}.{name}")
+
+
+def bind(request_id: Optional[str] = None, session_id: Optional[str] = None):
+    """Correlate subsequent records (and tasks created after this call) with
+    a request. Passing None clears the value."""
+    request_id_var.set(str(request_id) if request_id is not None else None)
+    session_id_var.set(session_id)
+
+
+class ContextFilter(logging.Filter):
+    def filter(self, record):
+        if not hasattr(record, "request_id"):
+            record.request_id = request_id_var.get()
+        if not hasattr(record, "session_id"):
+            record.session_id = session_id_var.get()
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """Keep DEBUG/INFO records of a `rate` fraction of requests."""
+
+    def __init__(self, rate: float = 1.0):
+        super().__init__()
+        self.rate = rate
+        self.sampled_out = 0
+
+    def keep(self, request_id: Optional[str]) -> bool:
+        if self.rate >= 1.0 or request_id is None:
+            return True
+        return zlib.crc32(request_id.encode("utf-8")) / 2**32 < self.rate
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING or self.keep(record.request_id):
+            return True
+        self.sampled_out += 1
+        return False
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        if record.request_id is not None:
+            entry["request_id"] = record.request_id
+        if record.session_id is not None:
+            entry["session_id"] = record.session_id
+        for key, value in vars(record).items():
+            if key not in _STANDARD_ATTRS and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)-7s %(name)s%(correlation)s %(message)s%(fields)s")
+
+    def format(self, record):
+        record.correlation = f" [{record.request_id}]" if record.request_id else ""
+        fields = {k: v for k, v in vars(record).items() if k not in _STANDARD_ATTRS and k not in ("correlation", "fields") and not k.startswith("_")}
+        record.fields = "".join(f" {k}={v}" for k, v in fields.items())
+        return super().format(record)
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that never blocks: a full queue drops the record."""
+
+    def __init__(self, q: queue.Queue):
+        super().__init__(q)
+        self.dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def prepare(self, record):
+        # Merge args now (they may be mutated later) but leave formatting to
+        # the listener thread; tracebacks are rendered here because the
+        # exception's frames can't be inspected safely once the loop moves on
+        record = logging.makeLogRecord(vars(record))
+        record.msg, record.args = record.getMessage(), None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+_handler: Optional[DroppingQueueHandler] = None
+_sampler: Optional[SamplingFilter] = None
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+def setup_logging(level: Optional[str] = None, fmt: Optional[str] = None, sample_rate: Optional[float] = None, queue_size: Optional[int] = None, stream=None):
+    """Route the `replychallenge` loggers through a queue to `stream`
+    (stdout). Calling it again replaces the previous configuration."""
+    global _handler, _sampler, _listener
+    stop_logging()
+
+    q = queue.Queue(maxsize=queue_size or int(os.getenv("LOG_QUEUE_SIZE", "10000")))
+    _sampler = SamplingFilter(sample_rate if sample_rate is not None else float(os.getenv("LOG_SAMPLE_RATE", "1.0")))
+    _handler = DroppingQueueHandler(q)
+    _handler.addFilter(ContextFilter())
+    _handler.addFilter(_sampler)
+
+    output = logging.StreamHandler(stream or sys.stdout)
+    output.setFormatter(TextFormatter() if (fmt or os.getenv("LOG_FORMAT", "json")) == "text" else JsonFormatter())
+    _listener = logging.handlers.QueueListener(q, output)
+    _listener.start()
+
+    root = logging.getLogger(ROOT)
+    root.handlers = [_handler]
+    root.setLevel((level or os.getenv("LOG_LEVEL", "INFO")).upper())
+    root.propagate = False
+
+
+def stop_logging():
+    """Flush queued records and stop the writer thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def metrics() -> dict:
+    return {
+        "queued": _handler.queue.qsize() if _handler else 0,
+        "dropped": _handler.dropped if _handler else 0,
+        "sampled_out": _sampler.sampled_out if _sampler else 0,
+    }
+
+
+atexit.register(stop_logging)
@@ -0,0 +1,143 @@
+"""
+Event-loop lag watchdog.
+
+A heartbeat task sleeps `interval` seconds at a time and records how late
+it wakes up: that delay is the loop lag every other coroutine is seeing.
+A monitor thread watches the heartbeat; when it is overdue by more than
+`threshold` the loop is stuck in a synchronous call, and the thread
+captures the loop thread's current stack (the blocking frame) while it is
+still running. Once the loop recovers the stall is logged with its total
+duration and that stack, and counted per culprit (the innermost frame in
+this package) for /health.
+
+Opt-in: LOOP_WATCHDOG=1, LOOP_LAG_THRESHOLD_MS (default 100),
+LOOP_WATCHDOG_INTERVAL_MS (default 50).
+"""
+
+import asyncio
+import os
+import sys
+import threading
+import time
+import traceback
+from collections import Counter, deque
+from datetime import datetime
+from typing import Deque, Optional
+
+from ReplyChallenge.logs import get_logger
+
+log = get_logger("loop_watchdog")
+
+PACKAGE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def culprit(stack: traceback.StackSummary) -> str:
+    """The innermost frame of our own code (the caller of whatever library
+    call is blocking), or the innermost frame if none is ours."""
+    ours = [f for f in stack if os.path.abspath(f.filename).startswith(PACKAGE_DIR) and f.filename != __file__]
+    frame = (ours or list(stack) or [None])[-1]
+    if frame is None:
+        return "unknown"
+    return f"{os.path.relpath(frame.filename, os.path.dirname(PACKAGE_DIR))}:{frame.lineno} in {frame.name}"
+
+
+class LoopWatchdog:
+    def __init__(self, threshold: float = 0.1, interval: float = 0.05, history: int = 20):
+        self.threshold = threshold
+        self.interval = interval
+        self.samples: Deque[float] = deque(maxlen=1000)
+        self.max_lag = 0.0
+        self.stalls = 0
+        self.culprits: Counter = Counter()
+        self.recent: Deque[dict] = deque(maxlen=history)
+        self._beat = time.monotonic()
+        self._captured: Optional[dict] = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._loop_thread: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+        self._thread: Optional[threading.Thread] = None
+
+    @classmethod
+    def from_env(cls) -> Optional["LoopWatchdog"]:
+        if os.getenv("LOOP_WATCHDOG", "0") != "1":
+            return None
+        return cls(
+            threshold=float(os.getenv("LOOP_LAG_THRESHOLD_MS", "100")) / 1000,
+            interval=float(os.getenv("LOOP_WATCHDOG_INTERVAL_MS", "50")) / 1000,
+        )
+
+    def start(self):
+        """Start watching the running loop (call from the loop thread)."""
+        self._loop_thread = threading.get_ident()
+        self._beat = time.monotonic()
+        self._stop.clear()
+        self._task = asyncio.create_task(self._heartbeat())
+        self._thread = threading.Thread(target=self._monitor, name="loop-watchdog", daemon=True)
+        self._thread.start()
+
+    async def stop(self):
+        self._stop.set()
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+        if self._thread is not None:
+            self._thread.join(timeout=1)
+
+    async def _heartbeat(self):
+        while True:
+            beat = self._beat
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            lag = max(0.0, now - beat - self.interval)
+            with self._lock:
+                self._beat = now
+                captured, self._captured = self._captured, None
+            self.samples.append(lag)
+            self.max_lag = max(self.max_lag, lag)
+            if lag >= self.threshold:
+                # a capture made for an earlier beat belongs to no stall of ours
+                self._report(lag, captured["stack"] if captured and captured["beat"] == beat else None)
+
+    def _monitor(self):
+        while not self._stop.wait(self.interval / 2):
+            with self._lock:
+                beat = self._beat
+                if self._captured is not None or time.monotonic() - beat - self.interval < self.threshold:
+                    continue
+            frame = sys._current_frames().get(self._loop_thread)
+            if frame is None:
+                continue
+            stack = traceback.extract_stack(frame)
+            del frame
+            with self._lock:
+                if self._beat == beat:
+                    self._captured = {"beat": beat, "stack": stack}
+
+    def _report(self, lag: float, stack: Optional[traceback.StackSummary]):
+        where = culprit(stack) if stack else "unknown"
+        self.stalls += 1
+        self.culprits[where] += 1
+        self.recent.append({
+            "at": datetime.utcnow().isoformat(),
+            "lag_ms": round(lag * 1000, 1),
+            "culprit": where,
+            "stack": traceback.format_list(stack[-8:]) if stack else [],
+        })
+        log.warning(
+            "event loop blocked for %.0f ms in %s", lag * 1000, where,
+            extra={"lag_ms": round(lag * 1000, 1), "culprit": where, "stack": "".join(traceback.format_list(stack)) if stack else None},
+        )
+
+    def metrics(self) -> dict:
+        ordered = sorted(self.samples)
+        pick = lambda p: round(ordered[min(len(ordered) - 1, int(p * len(ordered)))] * 1000, 1) if ordered else 0.0
+        return {
+            "threshold_ms": self.threshold * 1000,
+            "lag_p50_ms": pick(0.5),
+            "lag_p99_ms": pick(0.99),
+            "lag_max_ms": round(self.max_lag * 1000, 1),
+            "stalls": self.stalls,
+            "top_culprits": self.culprits.most_common(5),
+            "recent": list(self.recent)[-5:],
+        }
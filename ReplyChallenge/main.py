@@ -1,34 +1,45 @@
 import os
 import uuid
+from datetime import datetime
+import asyncio
+import hashlib
+import re
+import time
+from pathlib import Path
+from collections import OrderedDict
 from typing import List, Optional
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect
+from fastapi import Depends, FastAPI, HTTPException, Query, Request, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
-from openai import OpenAI
-from dotenv import load_dotenv
-from concurrent.futures import ThreadPoolExecutor
-from pathlib import Path
-
-# Import your custom database functions
-# (Preserving your specific import structure)
-from ReplyChallenge.database.service import (
-    log_chat_to_db,
-    verify_database_connection,
-    create_request_entry,
-    update_request_response,
-    add_memory,
-    find_similar_memories,
-    get_session_history,
-    add_fact,
-    get_facts_for_user,
-    upsert_fact,
-    delete_fact,
-    update_fact,
-)
-
-# Load env vars from ReplyChallenge/.env
-env_path = Path(__file__).parent / ".env"
-load_dotenv(env_path)
+from fastapi.responses import JSONResponse, PlainTextResponse, Response, StreamingResponse
+
+# Database access goes through the async service on a pooled HTTP client so
+# handlers await it directly instead of blocking the event loop.
+from ReplyChallenge.database import async_service as db
+from ReplyChallenge.database.client import close_async_client, load_env
+from ReplyChallenge.connections import ConnectionManager
+from ReplyChallenge.readiness import Readiness
+from ReplyChallenge.circuit_breaker import CircuitOpenError, snapshot_all
+from ReplyChallenge.background import JobQueue
+from ReplyChallenge.summaries import SessionSummarizer, history_messages
+from ReplyChallenge.prefetch import ContextPrefetcher
+from ReplyChallenge.loop_watchdog import LoopWatchdog
+from ReplyChallenge.profiler import SamplingProfiler, set_stage
+from ReplyChallenge.admin import require_admin
+from ReplyChallenge.routing import ModelRouter
+from ReplyChallenge.ingest import DocumentTooLarge, ingest_document
+from ReplyChallenge.export import first_page_ready, ndjson_stream
+from ReplyChallenge.traffic import TrafficRecorder
+from ReplyChallenge.memory_index import MemoryStore, is_trivial, parse_timestamp
+from ReplyChallenge import memory_compaction
+from ReplyChallenge.memory_snapshot import Snapshot, build_snapshot
+from ReplyChallenge import llm
+from ReplyChallenge import logs
+
+# Load env vars from ReplyChallenge/.env (clients are built lazily on first use)
+load_env()
+# Log calls only enqueue records; a writer thread does the stdout I/O
+logs.setup_logging()
+log = logs.get_logger("main")
 
 app = FastAPI()
 
@@ -60,70 +71,232 @@ def persona_ping_response(persona: str) -> str | None:
             return f"Hello — I am {p}. {instructions}"
     return None
 
-# --- 1. NEW: Connection Manager for Multiplayer ---
-class ConnectionManager:
-    def __init__(self):
-        # list of websocket connections and a mapping from websocket -> username
-        self.active_connections: List[WebSocket] = []
-        self.usernames: dict[WebSocket, str] = {}
-
-    async def connect(self, websocket: WebSocket):
-        await websocket.accept()
-        self.active_connections.append(websocket)
-
-    def disconnect(self, websocket: WebSocket):
-        if websocket in self.active_connections:
-            self.active_connections.remove(websocket)
-            # remove username mapping for this websocket
-            if websocket in self.usernames:
-                del self.usernames[websocket]
-
-    def set_username(self, websocket: WebSocket, username: str):
-        if websocket in self.active_connections:
-            self.usernames[websocket] = username
-
-    def get_username(self, websocket: WebSocket) -> Optional[str]:
-        return self.usernames.get(websocket)
-
-    async def broadcast_json(self, obj: dict, exclude: Optional[WebSocket] = None):
-        """Send a JSON-serializable object to all active connections as a JSON string.
-        Optionally exclude a websocket (e.g., do not send typing presence back to origin).
-        """
-        import json
-        payload = json.dumps(obj)
-        for connection in self.active_connections:
-            if exclude is not None and connection is exclude:
-                continue
-            try:
-                await connection.send_text(payload)
-            except Exception as e:
-                print(f"Error broadcasting JSON to a client: {e}")
-
-    async def broadcast(self, message: str):
-        # Send the message to every open tab
-        for connection in self.active_connections:
-            try:
-                await connection.send_text(message)
-            except Exception as e:
-                print(f"Error broadcasting to a client: {e}")
-
 # Initialize the manager
-manager = ConnectionManager()
+# Connections that stay silent (no frames, no pong) past the idle timeout are
+# reaped by the heartbeat sweep.
+manager = ConnectionManager(
+    heartbeat_interval=float(os.getenv("WS_HEARTBEAT_INTERVAL", "20")),
+    idle_timeout=float(os.getenv("WS_IDLE_TIMEOUT", "60")),
+    outbox_size=int(os.getenv("WS_OUTBOX_SIZE", "256")),
+    replay_size=int(os.getenv("WS_REPLAY_LOG_SIZE", "500")),
+)
 # --------------------------------------------------
 
-# Initialize OpenAI client
-try:
-    api_key = os.getenv("OPENAI_API_KEY")
-    if not api_key:
-        raise ValueError("OPENAI_API_KEY not found in .env file")
-    client = OpenAI(api_key=api_key)
-    print("✓ OpenAI client initialized")
-except Exception as e:
-    print(f"✗ OpenAI initialization failed: {e}")
-    client = None
 
-# Initialize thread pool for blocking DB operations
-executor = ThreadPoolExecutor(max_workers=5)
+def __getattr__(name):
+    # `main.client` is resolved lazily so importing the app never builds the
+    # OpenAI client; it is None when OPENAI_API_KEY is missing.
+    if name == "client":
+        return llm.get_client()
+    raise AttributeError(name)
+
+
+# Warm-up steps and dependency checks behind /ready
+readiness = Readiness(check_timeout=float(os.getenv("READINESS_CHECK_TIMEOUT", "3")))
+readiness.add_warmup("database", db.verify_database_connection)
+readiness.add_check("database", db.verify_database_connection)
+if os.getenv("WARMUP_OPENAI", "1") == "1":
+    readiness.add_warmup("openai", llm.warm_up)
+
+
+async def _openai_configured():
+    return llm.get_client() is not None
+
+readiness.add_check("openai", _openai_configured)
+
+# Database writes that don't gate a reply run as supervised background jobs
+jobs = JobQueue(
+    maxsize=int(os.getenv("BACKGROUND_QUEUE_SIZE", "1000")),
+    workers=int(os.getenv("BACKGROUND_WORKERS", "4")),
+    max_retries=int(os.getenv("BACKGROUND_MAX_RETRIES", "3")),
+    spool_path=os.getenv("BACKGROUND_SPOOL_PATH", str(Path(__file__).parent / "pending_jobs.jsonl")),
+)
+# Memories partitioned by (room, user), each with vector + keyword indexes
+memory_store = MemoryStore(
+    partition_cap=int(os.getenv("MEMORY_PARTITION_CAP", "2000")),
+    max_partitions=int(os.getenv("MEMORY_MAX_PARTITIONS", "256")),
+    precision=os.getenv("MEMORY_VECTOR_PRECISION", "float32"),
+    # a re-rank keeps a float32 copy next to the codes; opt in
+    rerank=os.getenv("MEMORY_RERANK", "0") == "1",
+    half_life_days=float(os.getenv("MEMORY_HALF_LIFE_DAYS", "30")),
+    recency_weight=float(os.getenv("MEMORY_RECENCY_WEIGHT", "0.1")),
+    hit_weight=float(os.getenv("MEMORY_HIT_WEIGHT", "0.05")),
+    max_bytes=int(float(os.getenv("MEMORY_MAX_MB", "512")) * 2**20) or None,
+)
+_partition_loads: dict[tuple, asyncio.Task] = {}
+
+# Memory-mapped copy of the memory table; partitions load from it and only
+# fetch rows newer than its watermark from the database
+MEMORY_SNAPSHOT_DIR = os.getenv("MEMORY_SNAPSHOT_DIR", str(Path(__file__).parent / "memory_snapshot"))
+memory_snapshot: Snapshot | None = None
+
+# Partitions are loaded this many rows per query: each page of embeddings
+# stays well inside the Supabase breaker's call timeout, so a large cold
+# load can't open the circuit for every other query
+MEMORY_LOAD_PAGE_SIZE = int(os.getenv("MEMORY_LOAD_PAGE_SIZE", "250"))
+# A new memory this similar to one of the newest in its partition only
+# bumps that memory's hit count instead of adding a row
+MEMORY_DEDUP_THRESHOLD = float(os.getenv("MEMORY_DEDUP_THRESHOLD", "0.95"))
+MEMORY_DEDUP_WINDOW = int(os.getenv("MEMORY_DEDUP_WINDOW", "50"))
+# Ingested documents are stored under this username in their room; every
+# member's persona requests search them alongside their own memories
+DOCUMENTS_USERNAME = "#documents"
+INGEST_MAX_BYTES = int(os.getenv("INGEST_MAX_BYTES", str(50 * 2**20)))
+INGEST_CHUNK_CHARS = int(os.getenv("INGEST_CHUNK_CHARS", "1200"))
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", "64"))
+# Progress of running and recent document uploads, by ingest id
+ingests: "OrderedDict[str, dict]" = OrderedDict()
+
+# Tables /admin/export can stream, and rows fetched per keyset page. Each
+# page is one query through the Supabase breaker, so like partition loads it
+# has to stay well inside the call timeout; requests can't ask for more than
+# EXPORT_MAX_PAGE_SIZE
+EXPORT_TABLES = ("requests", "facts")
+EXPORT_MAX_PAGE_SIZE = int(os.getenv("EXPORT_MAX_PAGE_SIZE", "1000"))
+EXPORT_PAGE_SIZE = min(int(os.getenv("EXPORT_PAGE_SIZE", "250")), EXPORT_MAX_PAGE_SIZE)
+
+# Minimum cosine similarity for matches from the `match_memory` RPC
+MEMORY_MATCH_THRESHOLD = float(os.getenv("MEMORY_MATCH_THRESHOLD", "0.3"))
+# Partitions with memories demoted to the database also search them there
+# (match_memory) when no in-process memory is at least this similar
+MEMORY_COLD_SEARCH_BELOW = float(os.getenv("MEMORY_COLD_SEARCH_BELOW", "0.75"))
+
+
+async def store_memory(content: str, embedding: list, user_id: str | None = None, session_id: str | None = None, username: str | None = None):
+    """Insert a memory row and add it to its in-process partition, unless it
+    nearly duplicates a recent memory of the same partition."""
+    await ensure_memory_partition(session_id, username)
+    part = memory_store.partition(session_id, username)
+    duplicate = part.near_duplicate(embedding, MEMORY_DEDUP_THRESHOLD, MEMORY_DEDUP_WINDOW)
+    if duplicate is not None:
+        memory_id, similarity = duplicate
+        hits = part.hit(memory_id)
+        log.debug("memory is a near-duplicate", extra={"memory_id": memory_id, "similarity": round(similarity, 3), "hit_count": hits})
+        return await db.update_memory(memory_id, {"hit_count": hits, "last_seen_at": datetime.utcnow().isoformat()})
+
+    row = await db.add_memory(content, embedding, user_id, session_id=session_id, username=username)
+    if row:
+        memory_store.add(row["id"], content, embedding, session_id, username)
+    return row
+
+
+async def compact_memories(threshold: float | None = None):
+    """Merge near-duplicate memories in the database, then drop the merged
+    rows from the in-process partitions."""
+    threshold = threshold or float(os.getenv("MEMORY_COMPACT_THRESHOLD", str(MEMORY_DEDUP_THRESHOLD)))
+    merged = 0
+    for session_id, username in await db.list_memory_partitions():
+        clusters = await memory_compaction.compact_partition(session_id, username, threshold, page_size=MEMORY_LOAD_PAGE_SIZE)
+        part = memory_store.partition(session_id, username, create=False)
+        for keep, duplicates in clusters:
+            merged += len(duplicates)
+            if part is not None:
+                for r in duplicates:
+                    part.remove(r["id"])
+                if keep["id"] in part:
+                    part.hits[keep["id"]] = sum((r.get("hit_count") or 1) for r in [keep, *duplicates])
+    log.info("memory compaction finished", extra={"merged": merged})
+
+
+async def refresh_memory_snapshot():
+    """Rebuild the snapshot from the database; partitions loaded from here on
+    use the new one."""
+    global memory_snapshot
+    result = await build_snapshot(MEMORY_SNAPSHOT_DIR, page_size=MEMORY_LOAD_PAGE_SIZE)
+    memory_snapshot = Snapshot.open(MEMORY_SNAPSHOT_DIR)
+    log.info("memory snapshot rebuilt", extra={"rows": result["rows"], "watermark": result["watermark"]})
+
+
+async def _submit_periodically(job_type: str, interval: float):
+    while True:
+        await asyncio.sleep(interval)
+        jobs.submit(job_type)
+
+
+async def _load_partition(session_id: str, username: str):
+    part = memory_store.partition(session_id, username)
+    after = None
+    if memory_snapshot is not None:
+        after = memory_snapshot.watermark
+        snapshot_rows = memory_snapshot.partition(session_id, username, limit=memory_store.partition_cap)
+        if snapshot_rows and not len(part):
+            part.load_arrays(*snapshot_rows)
+            # the snapshot may hold more than the newest `partition_cap`
+            part.cold = part.cold or len(snapshot_rows[0]) >= memory_store.partition_cap
+    rows = []
+    while len(rows) < memory_store.partition_cap:
+        wanted = min(MEMORY_LOAD_PAGE_SIZE, memory_store.partition_cap - len(rows))
+        page = await db.list_memories(session_id=session_id, username=username, limit=wanted, offset=len(rows), after=after, newest_first=True)
+        rows += page
+        if len(page) < wanted:
+            break
+    part.cold = part.cold or len(rows) >= memory_store.partition_cap
+    # oldest first so insertion order stays age order
+    for r in reversed(rows):
+        if r["id"] not in part and r.get("embedding") is not None:
+            seen = parse_timestamp(r.get("last_seen_at") or r.get("created_at"))
+            part.add(r["id"], r.get("content") or "", r["embedding"], r.get("hit_count") or 1, seen)
+    part.complete = True
+    memory_store.enforce_budget()
+
+
+async def ensure_memory_partition(session_id: str, username: str):
+    """Load a (room, user) partition from the database the first time it's
+    needed; concurrent callers share one load."""
+    part = memory_store.partition(session_id, username, create=False)
+    if part is not None and part.complete:
+        return
+    key = memory_store.key(session_id, username)
+    task = _partition_loads.get(key)
+    if task is None:
+        task = _partition_loads[key] = asyncio.create_task(_load_partition(session_id, username))
+        task.add_done_callback(lambda _: _partition_loads.pop(key, None))
+    await asyncio.shield(task)
+
+
+async def save_fact(fact_type: str, value: str, username: str | None = None, **fact):
+    """Persist an explicitly saved fact, then confirm it to the user's open
+    sockets."""
+    result = await db.upsert_fact(fact_type=fact_type, value=value, username=username, **fact)
+    if result is None:
+        return None
+    prefetcher.invalidate("facts", where=lambda key: key[1] == username)
+    log.info("saved fact", extra={"fact_type": fact_type, "username": username})
+    if username:
+        await manager.send_to_user(username, {"type": "system", "text": f"Saved: {fact_type} = {value}"})
+    return result
+
+
+jobs.register("memory.add", store_memory)
+jobs.register("memory.touch", db.touch_memories)
+jobs.register("memory.compact", compact_memories)
+jobs.register("memory.snapshot", refresh_memory_snapshot)
+jobs.register("fact.upsert", save_fact)
+jobs.register("request.update", db.update_request_response)
+jobs.register("request.log", db.log_chat_to_db)
+
+# Prompts carry a rolling per-session summary plus the turns it has yet to cover
+summarizer = SessionSummarizer(
+    every=int(os.getenv("SUMMARY_EVERY", "10")),
+    recent_turns=int(os.getenv("SUMMARY_RECENT_TURNS", "2")),
+    max_tail=int(os.getenv("SUMMARY_MAX_TAIL", "0")) or None,
+    model=os.getenv("SUMMARY_MODEL", "gpt-4o-mini"),
+)
+jobs.register("summary.refresh", summarizer.refresh)
+
+# Typing events warm the typist's context before their message arrives
+prefetcher = ContextPrefetcher(
+    max_concurrency=int(os.getenv("PREFETCH_CONCURRENCY", "4")),
+    ttl=float(os.getenv("PREFETCH_TTL", "30")),
+    max_entries=int(os.getenv("PREFETCH_MAX_ENTRIES", "256")),
+)
+
+# Opt-in (LOOP_WATCHDOG=1): logs the stack of anything that blocks the loop
+watchdog = LoopWatchdog.from_env()
+
+# Opt-in (TRAFFIC_CAPTURE=path): records /ws frames and dependency responses
+# for `python -m ReplyChallenge.replay`
+recorder = TrafficRecorder.from_env()
 
 # Enable CORS
 origins = [
@@ -148,42 +321,236 @@ async def root():
         "message": "ReplyChallenge API is live (Multiplayer Mode)",
         "endpoints": {
             "websocket": "ws://localhost:8000/ws",
-            "health": "/health"
+            "health": "/health",
+            "ready": "/ready"
         }
     })
 
 @app.get("/health")
 async def health():
-    """Health check endpoint"""
+    """Health check endpoint (liveness; reports the last known dependency status)"""
+    db_status = readiness.status.get("database", "unknown")
     return JSONResponse({
         "status": "healthy",
-        "database": "connected",
-        "openai": "initialized" if client else "not initialized",
-        "active_users": len(manager.active_connections)
+        "database": "connected" if db_status == "ok" else db_status,
+        "openai": "initialized" if llm.get_client() else "not initialized",
+        "active_users": len(manager.active_connections),
+        "circuits": snapshot_all(),
+        "jobs": jobs.metrics(),
+        "prefetch": prefetcher.metrics(),
+        "memory": {**memory_store.metrics(), "snapshot_rows": len(memory_snapshot) if memory_snapshot else 0},
+        "logging": logs.metrics(),
+        "loop": watchdog.metrics() if watchdog else None,
+        "routing": router.metrics(),
     })
 
 
+@app.get("/ready")
+async def ready():
+    """Readiness probe: 200 only after warm-up finished and dependencies respond."""
+    checks = await readiness.check()
+    is_ready = readiness.is_ready()
+    return JSONResponse({
+        "ready": is_ready,
+        "warmed_up": readiness.warmed,
+        "warmup_seconds": readiness.warmup_seconds,
+        "checks": checks,
+    }, status_code=200 if is_ready else 503)
+
+
+def _facts_etag(facts: list, limit: Optional[int], offset: int) -> str:
+    """Weak ETag over the page contents (ids + updated_at) and its position."""
+    h = hashlib.sha1(f"{limit}:{offset}".encode())
+    for f in facts:
+        h.update(f"|{f.get('id')}:{f.get('updated_at')}".encode())
+    return f'W/"{h.hexdigest()}"'
+
+
+# At most one profile runs at a time
+_profile_running = False
+
+
+@app.get("/admin/profile", dependencies=[Depends(require_admin)])
+async def admin_profile(
+    seconds: float = Query(10, gt=0, le=float(os.getenv("PROFILE_MAX_SECONDS", "60"))),
+    interval_ms: float = Query(5, ge=1, le=100),
+    format: str = Query("collapsed", pattern="^(collapsed|json)$"),
+):
+    """Sample the live event loop for `seconds` and return the profile as
+    collapsed stacks (flamegraph.pl / speedscope), rooted at the pipeline
+    stage each sample was taken in."""
+    global _profile_running
+    if _profile_running:
+        raise HTTPException(status_code=409, detail="A profile is already running")
+    _profile_running = True
+    profiler = SamplingProfiler.for_running_loop(interval_ms / 1000)
+    try:
+        profiler.start()
+        await asyncio.sleep(seconds)
+    finally:
+        profiler.stop()
+        _profile_running = False
+    if format == "json":
+        return JSONResponse({"samples": profiler.samples, "seconds": round(profiler.elapsed, 3), "stages": profiler.by_stage(), "collapsed": profiler.collapsed()})
+    return PlainTextResponse(profiler.collapsed(), headers={"X-Profile-Samples": str(profiler.samples)})
+
+
+@app.post("/admin/memory/documents", dependencies=[Depends(require_admin)])
+async def admin_ingest_document(
+    request: Request,
+    session_id: str = Query(...),
+    username: str = Query(DOCUMENTS_USERNAME),
+    title: Optional[str] = None,
+    ingest_id: Optional[str] = None,
+):
+    """Stream a text/markdown document (the raw request body) into memory.
+
+    It is chunked, embedded in batches and bulk-inserted while it uploads;
+    progress is visible at GET /admin/memory/documents. By default the
+    chunks are shared with everyone in `session_id`.
+    """
+    if not llm.get_client():
+        raise HTTPException(status_code=503, detail="OpenAI client not initialized")
+    ingest_id = ingest_id or str(uuid.uuid4())
+    progress = ingests[ingest_id] = {"id": ingest_id, "title": title, "session_id": session_id, "username": username}
+    while len(ingests) > 50:
+        ingests.popitem(last=False)
+
+    async def insert_many(texts, vectors):
+        rows = [
+            {"id": str(uuid.uuid4()), "content": text, "embedding": vector, "session_id": session_id, "username": username, "user_id": None}
+            for text, vector in zip(texts, vectors)
+        ]
+        written = await db.add_memories(rows)
+        if memory_store.partition(session_id, username, create=False) is not None:
+            for row in rows:
+                memory_store.add(row["id"], row["content"], row["embedding"], session_id, username)
+        log.debug("ingested batch", extra={"ingest_id": ingest_id, "inserted": progress["inserted"] + written})
+        return written
+
+    try:
+        await ingest_document(
+            request.stream(), llm.embed_many, insert_many, progress, title=title,
+            max_chars=INGEST_CHUNK_CHARS, batch_size=INGEST_BATCH_SIZE, max_bytes=INGEST_MAX_BYTES,
+        )
+    except DocumentTooLarge as e:
+        return JSONResponse({"ok": False, "error": str(e), "progress": progress}, status_code=413)
+    except Exception as e:
+        log.exception("document ingestion failed", extra={"ingest_id": ingest_id})
+        return JSONResponse({"ok": False, "error": str(e), "progress": progress}, status_code=500)
+    log.info("document ingested", extra={"ingest_id": ingest_id, "chunks": progress["chunks"], "bytes": progress["bytes"]})
+    return JSONResponse({"ok": True, "progress": progress})
+
+
+@app.get("/admin/memory/documents", dependencies=[Depends(require_admin)])
+async def admin_ingest_progress():
+    """Progress of running and recent document uploads."""
+    return JSONResponse({"ok": True, "data": list(ingests.values())})
+
+
+@app.get("/admin/export/{table}", dependencies=[Depends(require_admin)])
+async def admin_export(
+    table: str,
+    session_id: Optional[str] = None,
+    username: Optional[str] = None,
+    user_id: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    gzip: bool = False,
+    page_size: int = Query(EXPORT_PAGE_SIZE, ge=1, le=EXPORT_MAX_PAGE_SIZE),
+):
+    """Stream `requests` or `facts` as NDJSON in (created_at, id) order.
+
+    Filters: `session_id`, `username`, `user_id`, and `since` (inclusive) /
+    `until` (exclusive) on created_at. `gzip=true` returns a gzip file.
+    """
+    if table not in EXPORT_TABLES:
+        raise HTTPException(status_code=404, detail=f"Unknown table; expected one of {', '.join(EXPORT_TABLES)}")
+    pages = db.export_pages(
+        table, session_id=session_id, username=username, user_id=user_id,
+        since=since.isoformat() if since else None, until=until.isoformat() if until else None, page_size=page_size,
+    )
+    try:
+        pages = await first_page_ready(pages)
+    except CircuitOpenError as e:
+        return JSONResponse({"ok": False, "error": str(e)}, status_code=503)
+    except Exception as e:
+        return JSONResponse({"ok": False, "error": str(e)}, status_code=500)
+    filename = f"{table}.ndjson" + (".gz" if gzip else "")
+    return StreamingResponse(
+        ndjson_stream(pages, compress=gzip),
+        media_type="application/gzip" if gzip else "application/x-ndjson",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+
 @app.get("/api/facts")
-async def api_get_facts(username: Optional[str] = None, user_id: Optional[str] = None):
-    """Return facts for a user either by username or user_id."""
+async def api_get_facts(
+    request: Request,
+    username: Optional[str] = None,
+    user_id: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1, le=500),
+    offset: int = Query(0, ge=0),
+):
+    """Return facts for a user either by username or user_id.
+
+    Supports `limit`/`offset` paging and conditional requests: the response
+    carries an ETag and a matching `If-None-Match` gets an empty 304. The
+    page is still read to compute the tag, so a 304 saves the transfer, not
+    the query.
+    """
     try:
-        facts = get_facts_for_user(user_id, username)
+        facts = await db.get_facts_for_user(user_id, username, limit=limit, offset=offset)
+        etag = _facts_etag(facts, limit, offset)
+        headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+        if etag in [t.strip() for t in request.headers.get("if-none-match", "").split(",")]:
+            return Response(status_code=304, headers=headers)
         # If the backend returns an empty list it might mean either no facts
         # exist or the database/table isn't present. To help operators, return
         # a friendly payload and let the UI decide how to present it.
         if isinstance(facts, list) and len(facts) == 0:
-            return JSONResponse({"ok": True, "data": [], "note": "no facts found or facts table missing"})
-        return JSONResponse({"ok": True, "data": facts})
+            return JSONResponse({"ok": True, "data": [], "note": "no facts found or facts table missing"}, headers=headers)
+        body = {"ok": True, "data": facts}
+        if limit and len(facts) == limit:
+            body["next_offset"] = offset + limit
+        return JSONResponse(body, headers=headers)
     except Exception as e:
         # Unexpected errors should be reported but keep the response JSON
         # friendly rather than returning raw DB exceptions.
         return JSONResponse({"ok": False, "error": "Internal server error fetching facts"}, status_code=500)
 
 
+@app.delete("/api/facts")
+async def api_delete_facts(ids: List[str] = Query(...)):
+    """Soft-delete many facts (`?ids=a&ids=b`) in one database statement."""
+    try:
+        result = await db.delete_facts(ids)
+        prefetcher.invalidate("facts")
+        return JSONResponse({"ok": True, "result": getattr(result, 'data', None)})
+    except Exception as e:
+        return JSONResponse({"ok": False, "error": str(e)}, status_code=500)
+
+
+@app.patch("/api/facts")
+async def api_update_facts(payload: dict):
+    """Apply `{"ids": [...], "updates": {...}}` to many facts in one statement."""
+    ids = payload.get("ids")
+    updates = payload.get("updates")
+    if not ids or not isinstance(ids, list) or not isinstance(updates, dict) or not updates:
+        return JSONResponse({"ok": False, "error": "Expected non-empty 'ids' list and 'updates' object"}, status_code=400)
+    try:
+        result = await db.update_facts(ids, updates)
+        prefetcher.invalidate("facts")
+        return JSONResponse({"ok": True, "result": getattr(result, 'data', None)})
+    except Exception as e:
+        return JSONResponse({"ok": False, "error": str(e)}, status_code=500)
+
+
 @app.delete("/api/facts/{fact_id}")
 async def api_delete_fact(fact_id: str):
     try:
-        result = delete_fact(fact_id)
+        result = await db.delete_fact(fact_id)
+        prefetcher.invalidate("facts")
         return JSONResponse({"ok": True, "result": getattr(result, 'data', None)})
     except Exception as e:
         return JSONResponse({"ok": False, "error": str(e)}, status_code=500)
@@ -192,33 +559,460 @@ async def api_delete_fact(fact_id: str):
 @app.patch("/api/facts/{fact_id}")
 async def api_update_fact(fact_id: str, payload: dict):
     try:
-        result = update_fact(fact_id, payload)
+        result = await db.update_fact(fact_id, payload)
+        prefetcher.invalidate("facts")
         return JSONResponse({"ok": True, "result": getattr(result, 'data', None)})
     except Exception as e:
         return JSONResponse({"ok": False, "error": str(e)}, status_code=500)
 
 @app.on_event("startup")
 async def startup_event():
-    """Verify database connection on startup"""
-    print("\n" + "="*50)
-    print("APPLICATION STARTUP (MULTIPLAYER MODE)")
-    print("="*50)
+    """Warm up pooled connections and caches before reporting ready"""
+    global memory_snapshot
+    log.info("application startup (multiplayer mode)")
+    if recorder:
+        recorder.start()
+    await readiness.warm_up()
+    await readiness.check()
+    # zero-copy: pages are read from disk only as partitions touch them
+    memory_snapshot = Snapshot.open(MEMORY_SNAPSHOT_DIR)
+    if memory_snapshot is not None:
+        log.info("mapped memory snapshot", extra={"rows": len(memory_snapshot), "watermark": memory_snapshot.watermark})
+    await jobs.start()
+    manager.start()
+    if watchdog:
+        watchdog.start()
+    app.state.periodic_jobs = [
+        asyncio.create_task(_submit_periodically(job_type, interval))
+        for job_type, interval in (
+            ("memory.compact", float(os.getenv("MEMORY_COMPACT_INTERVAL", "0"))),
+            ("memory.snapshot", float(os.getenv("MEMORY_SNAPSHOT_INTERVAL", "0"))),
+        )
+        if interval > 0
+    ]
+    log.info("application ready")
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    for task in getattr(app.state, "periodic_jobs", []):
+        task.cancel()
+    if watchdog:
+        await watchdog.stop()
+    await manager.stop()
+    # drain pending writes (or spool them) before the DB pool goes away
+    await jobs.shutdown(timeout=float(os.getenv("BACKGROUND_DRAIN_TIMEOUT", "10")))
+    await close_async_client()
+    await llm.close_client()
+    if recorder:
+        recorder.stop()
+
+# Persona requests currently running, keyed by request id -> (task, origin socket)
+inflight: dict[str, tuple[asyncio.Task, WebSocket]] = {}
+
+# Upper bound on completions running at once across all sockets
+MAX_CONCURRENT_COMPLETIONS = int(os.getenv("MAX_CONCURRENT_COMPLETIONS", "8"))
+completion_slots = asyncio.Semaphore(MAX_CONCURRENT_COMPLETIONS)
+# Completions waiting for or holding a slot; an input to model routing
+completions_pending = 0
+
+# Picks the model tier for each persona completion (see routing.py)
+router = ModelRouter.from_env(MAX_CONCURRENT_COMPLETIONS)
+
+# Leading run of @mentions, e.g. "@Zeus @Hermes plan our launch"
+MENTIONS_RE = re.compile(r"^((?:@[A-Za-z0-9_-]+[\s,]*)+)(.*)$", re.S)
+
+
+def normalize_persona(name: str) -> str | None:
+    """Return the configured persona name matching `name` (case-insensitive)."""
+    for p in PERSONA_INSTRUCTIONS.keys():
+        if p.lower() == name.lower():
+            return p
+    return None
+
+
+def resolve_target_personas(parsed, message_text: str) -> tuple[list[str], str]:
+    """Work out which personas a message targets and the text to send them.
+
+    Structured clients may send `targetPersonas` (list) or `targetPersona`;
+    otherwise every leading @mention is considered. Unknown mentions are
+    ignored when at least one persona matches (they are likely user mentions);
+    if none match, the first one is returned so the caller can report it.
+    """
+    requested = []
+    if isinstance(parsed, dict):
+        requested = list(parsed.get("targetPersonas") or [])
+        if parsed.get("targetPersona"):
+            requested.append(parsed["targetPersona"])
+    text = message_text
+    m = MENTIONS_RE.match(message_text)
+    if m:
+        # the mentions address the personas; they aren't part of the prompt
+        if not requested:
+            requested = re.findall(r"@([A-Za-z0-9_-]+)", m.group(1))
+        text = m.group(2).strip()
+
+    personas = []
+    for name in requested:
+        p = normalize_persona(str(name))
+        if p and p not in personas:
+            personas.append(p)
+    if not personas and requested:
+        return [str(requested[0])], text
+    return personas, text
+
+
+def format_memory_context(memories: list) -> str:
+    if not memories:
+        return ""
+    memory_lines = []
+    for m in memories:
+        similarity = m.get("similarity")
+        content = m.get("content")
+        # keyword-only matches have no similarity score
+        memory_lines.append(f"- ({similarity:.3f}) {content}" if similarity is not None else f"- {content}")
+    return "Relevant memories:\n" + "\n".join(memory_lines)
+
+
+def format_fact_context(facts: list) -> str:
+    if not facts:
+        return ""
+    fact_lines = []
+    for f in facts:
+        ft = f.get("fact_type")
+        val = f.get("value")
+        norm = f.get("normalized_value")
+        fact_lines.append(f"- {ft}: {val}" + (f" (normalized: {norm})" if norm else ""))
+    return "Known facts about the user:\n" + "\n".join(fact_lines)
+
+
+async def load_history(session_id: str) -> tuple:
+    """The session's rolling summary and the `requests` rows it doesn't
+    cover yet (possibly including the message being answered)."""
+    return await summarizer.context(session_id)
+
+
+def prefetch_context(session_id: str, username: str):
+    """Start loading what `username`'s next message will need: their facts,
+    the session history and their memory partition. The query embedding,
+    memory search and completion remain."""
+    if not db.breaker.allows_request():
+        return
+    prefetcher.schedule(("facts", username), lambda: db.get_facts_for_user(None, username))
+    prefetcher.schedule(("history", session_id, username), lambda: load_history(session_id))
+    prefetcher.schedule(("memory", session_id, username), lambda: ensure_memory_partition(session_id, username))
+    prefetcher.schedule(("memory", session_id, DOCUMENTS_USERNAME), lambda: ensure_memory_partition(session_id, DOCUMENTS_USERNAME))
+
+
+def search_memories(query: str, embedding, session_id: str, username: str, k: int = 5, cold: dict | None = None) -> list:
+    """Search the asker's partition and the room's shared documents; the
+    best fused (RRF) scores of both win. `cold` maps a username to its
+    `match_memory` rows, searched alongside its partition."""
+    cold = cold or {}
+    found = memory_store.search(query, embedding, session_id, username, k, cold_rows=cold.get(username))
+    if username != DOCUMENTS_USERNAME:
+        found += memory_store.search(query, embedding, session_id, DOCUMENTS_USERNAME, k, cold_rows=cold.get(DOCUMENTS_USERNAME))
+    return sorted(found, key=lambda r: r["score"], reverse=True)[:k]
+
+
+async def recall_memories(query: str, embedding, session_id: str, username: str, k: int = 5) -> list:
+    """`search_memories` over the hot tier, plus the cold tier (memories
+    demoted to the database) when nothing in process is similar enough.
+    Recalled memories count as used, in process and in the database."""
+    found = search_memories(query, embedding, session_id, username, k)
+    best = max((r["similarity"] or 0.0 for r in found), default=0.0)
+    names = list(dict.fromkeys([username, DOCUMENTS_USERNAME]))
+    cold_names = [
+        name for name in names
+        if getattr(memory_store.partition(session_id, name, create=False), "cold", False)
+    ]
+    if embedding is not None and cold_names and best < MEMORY_COLD_SEARCH_BELOW:
+        results = await asyncio.gather(
+            *(db.find_similar_memories(embedding, k, MEMORY_MATCH_THRESHOLD, session_id=session_id, username=name) for name in cold_names),
+            return_exceptions=True,
+        )
+        cold = {}
+        for name, rows in zip(cold_names, results):
+            if isinstance(rows, Exception):
+                log.warning("searching cold memories failed: %s", rows)
+            else:
+                cold[name] = rows
+        found = search_memories(query, embedding, session_id, username, k, cold=cold)
+    ids = [r["id"] for r in found]
+    for name in names:
+        memory_store.touch(session_id, name, ids)
+    if ids:
+        jobs.submit("memory.touch", memory_ids=ids)
+    return found
+
+
+async def build_persona_context(message_text_for_ai: str, username: str, session_id: str, need_embedding: bool, request_id: str | None = None) -> dict:
+    """Gather the context shared by every persona answering one message.
+
+    One embedding + memory search, one facts lookup, and the session's
+    rolling summary plus its last few raw turns, run concurrently. Memory,
+    facts and history are optional; they are skipped while the Supabase
+    circuit is open. `request_id` is the row of the message being answered,
+    which is left out of the history.
+    """
+    database_up = db.breaker.allows_request()
+
+    async def memories():
+        set_stage("context.memories")
+        # Before calling the AI, compute an embedding of the query and search
+        # the asker's memory partition for similar items (plus exact keyword
+        # matches: ids, codes, names) to provide context.
+        async def partition():
+            if not database_up:
+                return False
+            # the asker's partition plus the documents shared with the room
+            own, shared = await asyncio.gather(
+                ensure_memory_partition(session_id, username),
+                ensure_memory_partition(session_id, DOCUMENTS_USERNAME),
+                return_exceptions=True,
+            )
+            for error in (own, shared):
+                if isinstance(error, Exception):
+                    log.warning("loading memories failed: %s", error)
+            return not isinstance(own, Exception)
+
+        embedding_vector, loaded = await asyncio.gather(llm.embed(message_text_for_ai), partition(), return_exceptions=True)
+        if isinstance(embedding_vector, Exception):
+            log.warning("computing query embedding failed: %s", embedding_vector)
+            embedding_vector = None
+        if loaded is False and embedding_vector is not None and database_up:
+            # the partition couldn't be pulled into process (e.g. the load
+            # timed out); let match_memory search it in the database instead
+            try:
+                return embedding_vector, await db.find_similar_memories(
+                    embedding_vector, 5, MEMORY_MATCH_THRESHOLD, session_id=session_id, username=username)
+            except Exception as e:
+                log.warning("searching memories failed: %s", e)
+        return embedding_vector, await recall_memories(message_text_for_ai, embedding_vector, session_id, username, k=5)
+
+    async def facts():
+        set_stage("context.facts")
+        # also include structured facts (birthdays, name, etc.) if present
+        try:
+            cached = await prefetcher.get(("facts", username))
+            if cached is not None:
+                return cached
+            return await db.get_facts_for_user(None, username) if database_up else []
+        except Exception:
+            return []
+
+    async def history():
+        set_stage("context.history")
+        # Long-range context comes from the rolling summary; the turns it
+        # doesn't cover yet are sent verbatim
+        warm = await prefetcher.get(("history", session_id, username), pop=True)
+        if not warm and not database_up:
+            return "", []
+        try:
+            summary, history_rows = warm or await load_history(session_id)
+            recent = [r for r in history_rows if r.get("id") != request_id][-summarizer.max_tail:]
+            return summary, history_messages(recent)
+        except Exception as e:
+            log.warning("retrieving chat history failed: %s", e)
+            return "", []
+
+    async def no_memories():
+        return None, []
+
+    (embedding_vector, found), fact_rows, (summary, recent_messages) = await asyncio.gather(
+        memories() if need_embedding else no_memories(), facts(), history()
+    )
+    return {
+        "embedding": embedding_vector,
+        "memory_context": format_memory_context(found),
+        "fact_context": format_fact_context(fact_rows),
+        "summary": summary,
+        "history": recent_messages,
+    }
+
+
+async def complete_for_persona(persona: str, message_text_for_ai: str, context: dict) -> dict:
+    """Ask one persona to answer; returns its reply text, tokens and metadata."""
+    # Short-circuit: if the user just 'pings' the persona (e.g., @Zeus or '@Zeus ping')
+    # respond with the persona's canned instruction instead of calling OpenAI.
+    if message_text_for_ai.strip().lower() in ("", "ping"):
+        log.debug("persona ping, sending canned response", extra={"persona": persona})
+        ai_text = persona_ping_response(persona) or (f"Hello, I am {persona}.")
+        return {"text": ai_text, "tokens": 0, "metadata": {"persona_ping": True}}
+
+    global completions_pending
+    route = router.route(persona, message_text_for_ai, completions_pending)
+    log.debug("calling OpenAI", extra={"persona": persona, "model": route["model"], "route_reasons": route["reasons"]})
+
+    # Combine the persona's core instructions with gathered context (facts/memory)
+    system_prompt_parts = [PERSONA_INSTRUCTIONS[persona]]
+    if context["summary"]:
+        system_prompt_parts.append("\n\nConversation so far:\n" + context["summary"])
+    if context["fact_context"]:
+        system_prompt_parts.append("\n\n" + context["fact_context"])
+    if context["memory_context"]:
+        system_prompt_parts.append("\n\n" + context["memory_context"])
+    full_system_prompt = "\n".join(system_prompt_parts)
+
+    messages_for_ai = [
+        # CRITICAL: This sets the persona!
+        {"role": "system", "content": full_system_prompt},
+        # Add the last few turns verbatim (older ones are in the summary)
+        *context["history"],
+        # Add the current user query
+        {"role": "user", "content": message_text_for_ai},
+    ]
+
+    # Holding a slot bounds concurrent completions; a cancelled request
+    # releases its slot as soon as the upstream call is aborted.
+    completions_pending += 1
     try:
-        verify_database_connection()
-    except Exception as e:
-        print(f"⚠ Warning: Database verification failed on startup: {e}")
-    print("="*50 + "\n")
+        async with completion_slots:
+            started = time.perf_counter()
+            completion = await llm.chat(
+                model=route["model"],
+                messages=messages_for_ai,
+                temperature=0.7 # Add a temperature to slightly increase creativity/persona adherence
+            )
+            route["latency_ms"] = round((time.perf_counter() - started) * 1000, 1)
+    finally:
+        completions_pending -= 1
+    ai_text = completion.choices[0].message.content
+    tokens = completion.usage.total_tokens
+    router.record(route, route["latency_ms"], tokens)
+    log.info("OpenAI response received", extra={"persona": persona, "tokens": tokens, "model": route["model"], "latency_ms": route["latency_ms"]})
+    return {"text": ai_text, "tokens": tokens, "metadata": {"persona": persona, "route": route, "metadata": completion.model_dump()}}
+
+
+async def answer_personas(personas: list[str], message_text_for_ai: str, message_text: str, username: str, request_id, session_id: str):
+    """Fan a message out to every targeted persona concurrently.
+
+    Context is built once and shared; each reply is persisted and broadcast
+    as soon as it arrives. The first reply fills in the original `requests`
+    row; further replies are logged as their own rows linked through
+    `parent_request_id`.
+    """
+    unknown = [p for p in personas if p not in PERSONA_INSTRUCTIONS]
+    if unknown:
+        await manager.broadcast_json({"type": "system", "text": f"Error: Persona '{unknown[0]}' not found or configured."}, room=session_id)
+        return
+
+    is_ping = message_text_for_ai.strip().lower() in ("", "ping")
+
+    # Fast fallback: while the OpenAI circuit is open don't spend
+    # time building context for completions that would fail anyway.
+    if not is_ping and not llm.breaker.allows_request():
+        for persona in personas:
+            await manager.broadcast_json({"type": "system", "text": f"{persona} is unavailable right now, please try again shortly."}, room=session_id)
+        return
+
+    async def run(persona, context):
+        set_stage("persona.completion")
+        try:
+            return persona, await complete_for_persona(persona, message_text_for_ai, context), None
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            return persona, None, e
+
+    request_row_used = False
+    tasks = []
+    try:
+        set_stage("persona.context")
+        context = await build_persona_context(message_text_for_ai, username, session_id, need_embedding=not is_ping, request_id=request_id)
+
+        tasks = [asyncio.create_task(run(p, context)) for p in personas]
+        set_stage("persona.wait")
+        for next_done in asyncio.as_completed(tasks):
+            persona, reply, error = await next_done
+            if error is not None:
+                if isinstance(error, CircuitOpenError):
+                    log.warning("%s", error)
+                    text = f"{persona} is unavailable right now, please try again shortly."
+                else:
+                    text = f"Error processing request: {str(error)}"
+                    log.error("persona completion failed", exc_info=error, extra={"persona": persona})
+                await manager.broadcast_json({"type": "system", "text": text}, room=session_id)
+                continue
+
+            # Save response to DB (in the background; the broadcast doesn't wait)
+            set_stage("persona.broadcast")
+            metadata = dict(reply["metadata"])
+            if request_id and not request_row_used:
+                request_row_used = True
+                jobs.submit("request.update", request_id=request_id, ai_response=reply["text"], tokens=reply["tokens"], metadata=metadata)
+            else:
+                if request_id:
+                    metadata["parent_request_id"] = request_id
+                jobs.submit("request.log", user_prompt=message_text, ai_response=reply["text"], tokens=reply["tokens"], session_id=session_id, metadata=metadata, username=username)
+
+            # BROADCAST AI RESPONSE (So everyone sees the answer)
+            log.debug("broadcasting reply", extra={"persona": persona, "chars": len(reply["text"])})
+            await manager.broadcast_json({"type": "ai", "text": reply["text"], "request_id": request_id, "username": persona}, room=session_id)
+            prefetcher.invalidate("history", where=lambda key: key[1] == session_id)
+    except asyncio.CancelledError:
+        # Abort the upstream calls still running (closing their HTTP requests)
+        # and record the cancellation; replies already delivered stay as-is.
+        for t in tasks:
+            t.cancel()
+        log.info("request cancelled")
+        if request_id and not request_row_used:
+            jobs.submit("request.update", request_id=request_id, ai_response=None, tokens=None, metadata={"status": "cancelled", "personas": personas})
+        await manager.broadcast_json({"type": "system", "text": "Request cancelled", "request_id": request_id}, room=session_id)
+        raise
+
+    # Persist the user's message as a memory vector for future recall
+    if context["embedding"] and not is_trivial(message_text_for_ai):
+        jobs.submit("memory.add", content=message_text_for_ai, embedding=context["embedding"], user_id=None, session_id=session_id, username=username)
+
+
+def start_persona_request(websocket: WebSocket, key: str, room: str, work) -> asyncio.Task:
+    """Run persona work in its own task so the socket keeps reading frames
+    (and can receive a cancel) while the completion is in flight."""
+    async def supervised():
+        try:
+            await work
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            error_msg = f"Error processing request: {str(e)}"
+            log.exception("persona request failed")
+            await manager.broadcast_json({"type": "system", "text": error_msg}, room=room)
+
+    task = asyncio.create_task(supervised())
+    inflight[key] = (task, websocket)
+    task.add_done_callback(lambda _: inflight.pop(key, None))
+    return task
+
+
+def cancel_inflight(websocket: WebSocket, request_id: str | None = None) -> int:
+    """Cancel the in-flight persona requests started from `websocket`
+    (only `request_id` if given). Returns how many were cancelled."""
+    cancelled = 0
+    for key, (task, owner) in list(inflight.items()):
+        if owner is websocket and (request_id is None or key == request_id):
+            task.cancel()
+            cancelled += 1
+    return cancelled
+
 
 @app.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket):
-    # 1. Connect user to the "Room" instead of just accepting
-    await manager.connect(websocket)
-    
-    # 2. Hardcode Session ID for Shared History (Hackathon Logic)
+    # 1. Hardcode Session ID for Shared History (Hackathon Logic)
     # Using a single ID means all users contribute to the same chat history
     session_id = "hackathon_public_room"
+
+    # 2. Connect user to the "Room" instead of just accepting; a reconnecting
+    # client passes the last seq it saw and is replayed what it missed
+    try:
+        since = int(websocket.query_params["since"])
+    except (KeyError, ValueError):
+        since = None
+    await manager.connect(websocket, room=session_id, since=since)
     
-    print(f"\n🔗 New Multiplayer Connection. Total Users: {len(manager.active_connections)}")
+    logs.bind(session_id=session_id)
+    log.info("websocket connected", extra={"connections": len(manager.active_connections)})
+    conn_id = recorder.connect() if recorder else None
 
     try:
         # helper: lightweight regex-based fact extraction (MVP)
@@ -309,8 +1103,12 @@ async def websocket_endpoint(websocket: WebSocket):
 
         while True:
             # 3. Receive User Input
+            set_stage(None)
             data = await websocket.receive_text()
-            print(f"📥 User Input: {data[:100]}...")
+            set_stage("ws.parse")
+            manager.touch(websocket)
+            if recorder:
+                recorder.frame(conn_id, data)
 
             # Try to parse structured JSON messages from clients. If JSON has a
             # 'type' field we treat it as a structured event (join, typing, etc.)
@@ -321,6 +1119,13 @@ async def websocket_endpoint(websocket: WebSocket):
             except Exception:
                 parsed = None
 
+            # Heartbeat replies only refresh last-seen (done above)
+            if isinstance(parsed, dict) and parsed.get("type") == "pong":
+                continue
+
+            logs.bind(session_id=session_id)
+            log.debug("frame received", extra={"chars": len(data), "preview": data[:100]})
+
             # If this is a typing presence event, broadcast but DO NOT forward to AI
             if isinstance(parsed, dict) and parsed.get("type") == "typing":
                 # ensure we have username & state
@@ -330,18 +1135,37 @@ async def websocket_endpoint(websocket: WebSocket):
                 if username:
                     manager.set_username(websocket, username)
 
+                # Start loading their context while they finish typing
+                if is_typing and username:
+                    prefetch_context(session_id, username)
+
                 # Broadcast a structured typing presence event to other clients
                 # do not echo typing events back to the origin websocket
-                await manager.broadcast_json({"type": "typing", "username": username, "isTyping": is_typing}, exclude=websocket)
+                await manager.broadcast_json({"type": "typing", "username": username, "isTyping": is_typing}, exclude=websocket, room=session_id, ephemeral=True)
                 # never forward typing events to the AI
                 continue
 
+            # Abort an in-flight persona request started from this socket
+            if isinstance(parsed, dict) and parsed.get("type") == "cancel":
+                if not cancel_inflight(websocket, parsed.get("request_id")):
+                    await manager.send_json(websocket, {"type": "system", "text": "Nothing to cancel"})
+                continue
+
+            # Older clients ask for the events they missed once connected
+            if isinstance(parsed, dict) and parsed.get("type") == "resume":
+                try:
+                    since = int(parsed.get("since") or 0)
+                except (TypeError, ValueError):
+                    since = 0
+                await manager.resume(websocket, since)
+                continue
+
             # If this is a join event, register username and broadcast user.joined
             if isinstance(parsed, dict) and parsed.get("type") == "join":
                 username = parsed.get("username")
                 if username:
                     manager.set_username(websocket, username)
-                    await manager.broadcast_json({"type": "user.joined", "username": username})
+                    await manager.broadcast_json({"type": "user.joined", "username": username}, room=session_id)
                 continue
 
             # If parsed JSON looks like a real chat message (has 'text'), use it
@@ -361,15 +1185,25 @@ async def websocket_endpoint(websocket: WebSocket):
             # Create DB entry for the user message (requests table). This
             # returns a request_id we can use to update later when the AI reply
             # arrives and also to link the message to stored records.
+            set_stage("ws.request_entry")
             request_row = None
             try:
-                request_row = create_request_entry(prompt=message_text, session_id=session_id, username=username)
+                request_row = await db.create_request_entry(prompt=message_text, session_id=session_id, username=username)
             except Exception as e:
-                print(f"⚠ Failed to create request entry: {e}")
+                log.warning("creating request entry failed: %s", e)
 
             request_id = request_row.get("id") if request_row and isinstance(request_row, dict) else None
+            # everything logged for this message from here on (including
+            # the persona task and its background jobs) carries its id
+            logs.bind(request_id=request_id, session_id=session_id)
+            if request_id and summarizer.note_message(session_id):
+                jobs.submit("summary.refresh", session_id=session_id)
+            if request_id:
+                # anyone else's prefetched history is now missing this message
+                prefetcher.invalidate("history", where=lambda key: key[1] == session_id and key[2] != username)
 
             # run a lightweight extractor for structured facts (MVP) and persist
+            set_stage("ws.facts")
             try:
                 extracted = extract_facts_from_text(message_text)
                 explicit_save = is_explicit_save(message_text)
@@ -377,269 +1211,91 @@ async def websocket_endpoint(websocket: WebSocket):
                     # only persist structured facts if the user explicitly asked us
                     # to remember/save them (privacy-first behaviour)
                     if explicit_save:
-                        try:
-                            upsert_fact(None, username, request_id, f["type"], f["value"], f.get("normalized"), f.get("confidence"), {"source": f.get("source")})
-                            print(f"✓ Explicitly saved fact {f['type']}={f['value']} for {username}")
-                            # Confirm to the origin that we saved the fact
-                            try:
-                                await websocket.send_text(json.dumps({"type": "system", "text": f"Saved: {f['type']} = {f['value']}"}))
-                            except Exception:
-                                pass
-                        except Exception as e:
-                            print(f"⚠ Failed to persist fact: {e}")
+                        # the confirmation is sent once the write lands, to
+                        # every socket open as this user
+                        if username:
+                            manager.set_username(websocket, username)
+                        queued = jobs.submit(
+                            "fact.upsert",
+                            user_id=None,
+                            username=username,
+                            request_id=request_id,
+                            fact_type=f["type"],
+                            value=f["value"],
+                            normalized_value=f.get("normalized"),
+                            confidence=f.get("confidence"),
+                            metadata={"source": f.get("source")},
+                        )
+                        if not queued:
+                            log.warning("queueing fact failed", extra={"fact_type": f["type"], "username": username})
                     else:
                         # If not explicit, we only extract candidates but do not
                         # persist them as stored user facts (MVP privacy choice).
-                        print(f"ℹ️ Detected candidate fact but not saving (no explicit save): {f['type']}={f['value']}")
+                        log.debug("candidate fact not saved (no explicit save)", extra={"fact_type": f["type"]})
             except Exception as e:
-                print(f"⚠ Fact extraction failed: {e}")
+                log.warning("fact extraction failed: %s", e)
 
             # Broadcast the message as a structured JSON event so frontends render it
             # as a chat bubble immediately. Do not send back to the origin (the
             # sender already has a local echo).
-            await manager.broadcast_json({"type": "message", "text": message_text, "username": username, "request_id": request_id}, exclude=websocket)
+            set_stage("ws.broadcast")
+            await manager.broadcast_json({"type": "message", "text": message_text, "username": username, "request_id": request_id}, exclude=websocket, room=session_id)
 
-            if not client:
+            if not llm.get_client():
                 error_msg = "OpenAI client not initialized"
-                print(f"✗ {error_msg}")
-                await manager.broadcast_json({"type": "system", "text": error_msg})
+                log.error(error_msg)
+                await manager.broadcast_json({"type": "system", "text": error_msg}, room=session_id)
                 continue
             
             try:
-                # Determine if this message should reach an AI persona. We only
-                # call the AI when the message explicitly targets a persona via
-                # parsed.targetPersona or a leading @mention. This avoids sending
-                # unrelated chat to OpenAI.
-                target_persona = None
-                if isinstance(parsed, dict):
-                    target_persona = parsed.get("targetPersona")
-                    if target_persona:
-                        for p in PERSONA_INSTRUCTIONS.keys():
-                            if p.lower() == target_persona.lower():
-                                target_persona = p  # normalize casing 
-                                break
-                    else:
-                        target_persona = None  # not found
-
-
-                message_text_for_ai = message_text
-                if not target_persona:
-                    # look for leading @persona syntax
-                    try:
-                        import re
-
-                        m = re.match(r"^@([A-Za-z0-9_-]+)\s+(.+)$", message_text)
-                        if m:
-                            target_persona = m.group(1)
-                            message_text_for_ai = m.group(2) or ""
-                    except Exception:
-                        m = None
-
-                if not target_persona:
-                    print("ℹ️  No target persona detected — skipping OpenAI call for this message")
+                # Determine if this message should reach AI personas. We only
+                # call the AI when the message explicitly targets personas via
+                # parsed.targetPersona(s) or leading @mentions. This avoids
+                # sending unrelated chat to OpenAI.
+                target_personas, message_text_for_ai = resolve_target_personas(parsed, message_text)
+
+                if not target_personas:
+                    log.debug("no target persona, skipping OpenAI")
                     # We'll still optionally persist the user's message to memory,
                     # but we won't call the OpenAI API.
                     # Persist a memory embedding for this message (best effort)
+                    set_stage("ws.memory")
                     try:
-                        if client and message_text_for_ai:
-                            emb = client.embeddings.create(model="text-embedding-3-small", input=message_text_for_ai)
-                            embedding_vector = emb.data[0].embedding if hasattr(emb.data[0], 'embedding') else emb.data[0]['embedding']
-                            # don't block: run in executor
-                            loop = __import__('asyncio').get_event_loop()
-                            loop.run_in_executor(executor, add_memory, message_text_for_ai, embedding_vector, None)
+                        if message_text_for_ai and not is_trivial(message_text_for_ai):
+                            embedding_vector = await llm.embed(message_text_for_ai)
+                            # don't block the reply path on the insert
+                            jobs.submit("memory.add", content=message_text_for_ai, embedding=embedding_vector, user_id=None, session_id=session_id, username=username)
                     except Exception as e:
-                        print(f"⚠️ Memory embedding failed: {e}")
+                        log.warning("memory embedding failed: %s", e)
                     continue
 
-                # 5. Before calling the AI, compute an embedding of the query and
-                # search the memory table for similar items to provide context.
-                memories = []
-                embedding_vector = None
-                try:
-                    emb = client.embeddings.create(model="text-embedding-3-small", input=message_text_for_ai)
-                    embedding_vector = emb.data[0].embedding if hasattr(emb.data[0], 'embedding') else emb.data[0]['embedding']
-                    # find similar memories (best effort)
-                    memories = find_similar_memories(embedding_vector, match_count=5)
-                except Exception as e:
-                    print(f"⚠️ Warning computing/querying embeddings: {e}")
-
-                # Construct a system prompt block containing the relevant memories
-                memory_context = ""
-                if memories:
-                    memory_lines = []
-                    for m in memories:
-                        similarity = m.get("similarity")
-                        content = m.get("content")
-                        memory_lines.append(f"- ({similarity:.3f}) {content}")
-                    memory_context = "Relevant memories:\n" + "\n".join(memory_lines)
-
-                # also include structured facts (birthdays, name, etc.) if present
-                try:
-                    facts = get_facts_for_user(None, username)
-                except Exception:
-                    facts = []
-
-                fact_context = ""
-                if facts:
-                    fact_lines = []
-                    for f in facts:
-                        ft = f.get("fact_type")
-                        val = f.get("value")
-                        norm = f.get("normalized_value")
-                        fact_lines.append(f"- {ft}: {val}" + (f" (normalized: {norm})" if norm else ""))
-                    fact_context = "Known facts about the user:\n" + "\n".join(fact_lines)
-
-                
-                # 6. Short-circuit: if the user just 'pings' the persona (e.g., @Zeus or '@Zeus ping')
-                # respond with the persona's canned instruction instead of calling OpenAI.
-                if target_persona and message_text_for_ai.strip().lower() in ("", "ping"):
-                    print(f"ℹ️ Persona ping detected for {target_persona} — sending canned response")
-                    ai_text = persona_ping_response(target_persona) or (f"Hello, I am {target_persona}.")
-
-                    # Broadcast the canned persona response and store in DB if possible
-                    try:
-                        print(f"💾 Saving canned persona response to DB for persona {target_persona}")
-                        loop = __import__('asyncio').get_event_loop()
-                        if request_id:
-                            await loop.run_in_executor(
-                                executor,
-                                update_request_response,
-                                request_id,
-                                ai_text,
-                                0,
-                                {"persona_ping": True},
-                            )
-                        else:
-                            await loop.run_in_executor(
-                                executor,
-                                log_chat_to_db,
-                                message_text_for_ai,
-                                ai_text,
-                                0,
-                                session_id,
-                                {"persona_ping": True},
-                            )
-                    except Exception as e:
-                        print(f"⚠ Failed to persist canned persona response: {e}")
-
-                    await manager.broadcast_json({"type": "ai", "text": ai_text, "request_id": request_id, "username": target_persona})
-                    continue
-
-               # 6. Call OpenAI API with memory context included as a system message
-                print(f"🤖 Calling OpenAI API for persona: {target_persona}...")
-                
-                # --- START OF FIX: Construct the full system prompt and message list ---
-                
-                # 1. Get the base instruction for the target persona
-                base_instruction = PERSONA_INSTRUCTIONS.get(target_persona)
-
-                if not base_instruction:
-                    ai_text = f"Error: Persona '{target_persona}' not found or configured."
-                    # Broadcast error and continue to cleanup/end block
-                    await manager.broadcast_json({"type": "system", "text": ai_text})
-                    continue 
-
-                # 2. Construct the full system prompt
-                # Combine the persona's core instructions with gathered context (facts/memory)
-                system_prompt_parts = [base_instruction]
-                if fact_context:
-                    system_prompt_parts.append("\n\n" + fact_context)
-                if memory_context:
-                    system_prompt_parts.append("\n\n" + memory_context)
-                
-                full_system_prompt = "\n".join(system_prompt_parts)
-                
-                # 3. Retrieve recent chat history for conversation context (Recommended)
-                history_messages = []
-                try:
-                    # Get last 5 messages, excluding the current one
-                    history_rows = get_session_history(session_id, limit=5)
-                    # Map history into OpenAI format. Filter to only 'user' and 'assistant' roles.
-                    history_messages = [
-                        {"role": "user" if r.get("is_user_message") else "assistant", "content": r.get("content")}
-                        for r in history_rows 
-                        if r.get("is_user_message") is not None and r.get("content")
-                    ]
-                except Exception as e:
-                    print(f"⚠ Failed to retrieve chat history: {e}")
-                    
-                # 4. Construct the final message list for the API call
-                messages_for_ai = [
-                    # CRITICAL: This sets the persona!
-                    {"role": "system", "content": full_system_prompt},
-                    # Add recent history for context
-                    *history_messages,
-                    # Add the current user query
-                    {"role": "user", "content": message_text_for_ai},
-                ]
-                
-                # --- END OF FIX ---
-
-                completion = client.chat.completions.create(
-                    model="gpt-4o",
-                    messages=messages_for_ai, # Now correctly using the list with System Role
-                    temperature=0.7 # Add a temperature to slightly increase creativity/persona adherence
+                # Run it in the background so this loop can still read a cancel
+                # frame; the origin gets the id it needs to cancel.
+                set_stage("ws.dispatch")
+                inflight_id = request_id or f"local-{uuid.uuid4()}"
+                start_persona_request(
+                    websocket,
+                    inflight_id,
+                    session_id,
+                    answer_personas(target_personas, message_text_for_ai, message_text, username, request_id, session_id),
                 )
-                
-                # ... (continuation of the try block)
-                
-                ai_text = completion.choices[0].message.content
-                tokens = completion.usage.total_tokens
-                full_metadata = completion.model_dump() # Capture all response data
-                
-                print(f"✓ OpenAI Response received ({tokens} tokens)")
-
-                # 6. Save response to DB and persist memory for the user's message
-                print(f"💾 Saving AI response to database and storing memory...")
-                loop = __import__('asyncio').get_event_loop()
-
-                # Update the requests row that we created earlier with the AI response
-                if request_id:
-                    await loop.run_in_executor(
-                        executor,
-                        update_request_response,
-                        request_id,
-                        ai_text,
-                        tokens,
-                        {"persona": target_persona, "metadata": full_metadata}, # Store persona and metadata
-                    )
-                else:
-                    # fallback to legacy logger
-                    await loop.run_in_executor(
-                        executor,
-                        log_chat_to_db,
-                        message_text,
-                        ai_text,
-                        tokens,
-                        session_id,
-                        {"persona": target_persona, "metadata": full_metadata},
-                    )
-
-                # ... (rest of the code for memory and broadcast is fine)
-
-                # Persist the user's message as a memory vector for future recall
-                try:
-                    if embedding_vector:
-                        await loop.run_in_executor(executor, add_memory, message_text_for_ai, embedding_vector, None)
-                except Exception as e:
-                    print(f"⚠️ Failed to persist memory: {e}")
-
-                # 7. BROADCAST AI RESPONSE (So everyone sees the answer)
-                print(f"📤 Broadcasting response ({len(ai_text)} chars)")
-                await manager.broadcast_json({"type": "ai", "text": ai_text, "request_id": request_id, "username": target_persona})
+                await manager.send_json(websocket, {"type": "request.accepted", "request_id": inflight_id, "personas": target_personas})
 
             except Exception as e:
                 error_msg = f"Error processing request: {str(e)}"
-                print(f"✗ {error_msg}")
-                await manager.broadcast_json({"type": "system", "text": error_msg})
+                log.exception("processing message failed")
+                await manager.broadcast_json({"type": "system", "text": error_msg}, room=session_id)
 
     except WebSocketDisconnect:
-        username = manager.get_username(websocket)
-        manager.disconnect(websocket)
-        # Broadcast user.left event so clients can update presence
-        if username:
-            await manager.broadcast_json({"type": "user.left", "username": username})
-        print(f"🔌 Client disconnected. Remaining: {len(manager.active_connections)}")
+        # The requester is gone: stop spending tokens on its completions
+        cancel_inflight(websocket)
+        # Broadcasts user.left so clients can update presence (no-op if the
+        # heartbeat or a failed send already evicted this socket)
+        await manager.drop(websocket, reason="client disconnected")
     except Exception as e:
-        print(f"✗ WebSocket Error: {e}")
-        manager.disconnect(websocket)
\ No newline at end of file
+        log.exception("websocket error")
+        cancel_inflight(websocket)
+        await manager.drop(websocket, reason="error")
+    finally:
+        if recorder:
+            recorder.disconnect(conn_id)
\ No newline at end of file
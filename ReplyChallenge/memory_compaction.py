@@ -0,0 +1,117 @@
+"""
+Offline near-duplicate compaction for the `memory` table.
+
+The write-time gate only compares a new memory with the newest few in its
+partition, so near-duplicates written further apart (or before the gate
+existed) still accumulate. Compaction walks each (room, user) partition,
+greedily clusters memories whose embeddings have cosine similarity of at
+least `threshold`, keeps one representative per cluster (the most used,
+then the newest), adds the cluster's hit counts to it and deletes the rest.
+
+Run it against the database directly:
+
+    python -m ReplyChallenge.memory_compaction [--threshold 0.95] [--session ID --username NAME] [--dry-run] [--page-size 250]
+
+or let the server schedule it as a background job (MEMORY_COMPACT_INTERVAL).
+"""
+
+import argparse
+import asyncio
+import os
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from ReplyChallenge.database import async_service as db
+from ReplyChallenge.database.client import close_async_client, load_env
+from ReplyChallenge.memory_index import normalized
+
+
+def cluster_duplicates(rows: List[dict], threshold: float) -> List[Tuple[dict, List[dict]]]:
+    """Group near-duplicate rows (oldest first, each with an `embedding`).
+
+    Returns (representative, duplicates) pairs for clusters with more than
+    one member; every row belongs to at most one cluster.
+    """
+    if len(rows) < 2:
+        return []
+    vectors = np.stack([normalized(r["embedding"]) for r in rows])
+    unassigned = np.ones(len(rows), dtype=bool)
+    clusters = []
+    for i in range(len(rows)):
+        if not unassigned[i]:
+            continue
+        members = np.flatnonzero(unassigned & (vectors @ vectors[i] >= threshold))
+        unassigned[members] = False
+        if len(members) < 2:
+            continue
+        group = [rows[m] for m in members]
+        # most used wins; among equals the newest (rows are oldest first)
+        keep = max(range(len(group)), key=lambda g: (group[g].get("hit_count") or 1, g))
+        clusters.append((group[keep], group[:keep] + group[keep + 1:]))
+    return clusters
+
+
+async def compact_partition(session_id: Optional[str], username: Optional[str], threshold: float = 0.95, dry_run: bool = False, page_size: int = 250) -> List[Tuple[dict, List[dict]]]:
+    """Merge the near-duplicates of one partition; returns the clusters.
+
+    Rows are read `page_size` per query; like the server's partition loads
+    (MEMORY_LOAD_PAGE_SIZE) each page of embeddings must stay well inside the
+    Supabase breaker's call timeout.
+    """
+    rows, seen, after = [], set(), None
+    while True:
+        page = await db.list_memories(session_id=session_id, username=username, limit=page_size, after=after,
+                                      columns="id, session_id, username, content, embedding, hit_count, created_at")
+        fresh = [r for r in page if r["id"] not in seen and r.get("embedding") is not None]
+        rows.extend(fresh)
+        seen.update(r["id"] for r in fresh)
+        if len(page) < page_size or not fresh:
+            break
+        after = page[-1]["created_at"]
+
+    clusters = cluster_duplicates(rows, threshold)
+    if dry_run:
+        return clusters
+    for keep, duplicates in clusters:
+        hits = sum((r.get("hit_count") or 1) for r in [keep, *duplicates])
+        await db.update_memory(keep["id"], {"hit_count": hits, "last_seen_at": datetime.utcnow().isoformat()})
+        await db.delete_memories([r["id"] for r in duplicates])
+    return clusters
+
+
+async def compact_all(threshold: float = 0.95, dry_run: bool = False, page_size: int = 250) -> dict:
+    """Compact every partition; returns how many rows were merged away."""
+    partitions = await db.list_memory_partitions()
+    merged = 0
+    for session_id, username in partitions:
+        clusters = await compact_partition(session_id, username, threshold, dry_run, page_size)
+        merged += sum(len(duplicates) for _, duplicates in clusters)
+    return {"partitions": len(partitions), "merged": merged}
+
+
+async def _main(args):
+    load_env()
+    try:
+        if args.session is not None or args.username is not None:
+            clusters = await compact_partition(args.session, args.username, args.threshold, args.dry_run, args.page_size)
+            for keep, duplicates in clusters:
+                print(f"{keep['content'][:60]!r} <- {len(duplicates)} duplicates")
+            summary = {"partitions": 1, "merged": sum(len(d) for _, d in clusters)}
+        else:
+            summary = await compact_all(args.threshold, args.dry_run, args.page_size)
+        verb = "would merge" if args.dry_run else "merged"
+        print(f"✓ {verb} {summary['merged']} memories across {summary['partitions']} partitions")
+    finally:
+        await close_async_client()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Merge near-duplicate memories.")
+    parser.add_argument("--threshold", type=float, default=0.95)
+    parser.add_argument("--session")
+    parser.add_argument("--username")
+    parser.add_argument("--dry-run", action="store_true")
+    parser.add_argument("--page-size", type=int, default=int(os.getenv("MEMORY_LOAD_PAGE_SIZE", "250")))
+    asyncio.run(_main(parser.parse_args()))
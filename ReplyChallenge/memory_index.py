@@ -0,0 +1,532 @@
+"""
+In-process memory store.
+
+Memories are partitioned by (room, user); each partition holds the
+memories' unit-normalized embeddings (optionally quantized, see
+`quantization.py`) and a BM25 inverted index over their `content`. Vector search is good at paraphrases but weak at exact
+identifiers: ticket numbers, function names and product codes embed close
+to every other string of their kind. The keyword index catches those, and
+the two rankings are merged by reciprocal-rank fusion (RRF), which needs no
+score calibration between them. Both are maintained incrementally as
+memories are added.
+
+Memories are tiered. Each one tracks its hit count and when it was last
+stored or recalled. Its retention, `(1 + ln hits) * 0.5 ** (idle /
+half_life)`, decides which memories leave the process when a partition
+reaches its cap or the store its byte budget. Those memories become
+"cold": they are still in the database, where `match_memory` can find
+them. Retrieval multiplies each fused score by `1 + recency_weight *
+0.5 ** (age / half_life) + hit_weight * ln(hits)`, so between equally
+relevant memories the fresher and more used ones come first.
+"""
+
+import json
+import math
+import re
+import time
+from datetime import datetime, timezone
+from collections import OrderedDict, defaultdict
+from itertools import islice
+from typing import Dict, Hashable, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from ReplyChallenge.quantization import Codec, get_codec
+
+# Identifiers like "ABC-1234", "parse_config" or "v2.1.0" stay whole; their
+# parts are indexed too so "config" still matches "parse_config".
+TOKEN_RE = re.compile(r"[a-z0-9]+(?:[-_.:/][a-z0-9]+)*")
+PART_RE = re.compile(r"[a-z0-9]+")
+
+STOPWORDS = frozenset(
+    "a an and are as at be but by do for from has have i if in is it its me my "
+    "of on or so that the their them they this to was we were what when where "
+    "which who will with you your".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    tokens = []
+    for token in TOKEN_RE.findall(text.lower()):
+        parts = PART_RE.findall(token)
+        if len(parts) > 1:
+            tokens.append(token)
+        tokens.extend(p for p in parts if p not in STOPWORDS)
+    return tokens
+
+
+class BM25Index:
+    def __init__(self, k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self._postings: Dict[str, Dict[Hashable, int]] = defaultdict(dict)
+        self._doc_terms: Dict[Hashable, Dict[str, int]] = {}
+        self._doc_len: Dict[Hashable, int] = {}
+        self._total_len = 0
+
+    def __len__(self) -> int:
+        return len(self._doc_terms)
+
+    def __contains__(self, doc_id: Hashable) -> bool:
+        return doc_id in self._doc_terms
+
+    def add(self, doc_id: Hashable, text: str):
+        if doc_id in self._doc_terms:
+            self.remove(doc_id)
+        counts: Dict[str, int] = defaultdict(int)
+        for token in tokenize(text):
+            counts[token] += 1
+        for term, tf in counts.items():
+            self._postings[term][doc_id] = tf
+        self._doc_terms[doc_id] = dict(counts)
+        self._doc_len[doc_id] = sum(counts.values())
+        self._total_len += self._doc_len[doc_id]
+
+    def remove(self, doc_id: Hashable):
+        counts = self._doc_terms.pop(doc_id, None)
+        if counts is None:
+            return
+        for term in counts:
+            posting = self._postings[term]
+            posting.pop(doc_id, None)
+            if not posting:
+                del self._postings[term]
+        self._total_len -= self._doc_len.pop(doc_id)
+
+    def search(self, query: str, k: int = 10) -> List[Tuple[Hashable, float]]:
+        """Return up to `k` (doc_id, score) pairs, best first."""
+        n = len(self._doc_terms)
+        if not n:
+            return []
+        avg_len = self._total_len / n or 1.0
+        scores: Dict[Hashable, float] = defaultdict(float)
+        for term in set(tokenize(query)):
+            posting = self._postings.get(term)
+            if not posting:
+                continue
+            idf = math.log(1 + (n - len(posting) + 0.5) / (len(posting) + 0.5))
+            for doc_id, tf in posting.items():
+                norm = tf + self.k1 * (1 - self.b + self.b * self._doc_len[doc_id] / avg_len)
+                scores[doc_id] += idf * tf * (self.k1 + 1) / norm
+        return sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+
+
+def rrf_fuse(rankings: Iterable[List[Hashable]], k: int = 60) -> List[Tuple[Hashable, float]]:
+    """Reciprocal-rank fusion: each ranking contributes 1 / (k + rank)."""
+    scores: Dict[Hashable, float] = defaultdict(float)
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, start=1):
+            scores[doc_id] += 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+
+def parse_embedding(value) -> np.ndarray:
+    """PostgREST returns pgvector columns as text ("[0.1,0.2,...]")."""
+    if isinstance(value, str):
+        value = json.loads(value)
+    return np.asarray(value, dtype=np.float32)
+
+
+def normalized(value) -> np.ndarray:
+    vector = parse_embedding(value)
+    norm = float(np.linalg.norm(vector))
+    return vector / norm if norm else vector
+
+
+# Acknowledgements and small talk that aren't worth remembering
+TRIVIAL_MESSAGES = frozenset(
+    "ok okay k kk yes yep yeah no nope thanks thank you thx ty cool nice great "
+    "lol haha hi hello hey bye sure np".split()
+)
+
+
+def parse_timestamp(value) -> Optional[float]:
+    """Epoch seconds of an ISO timestamp (naive ones are UTC), or None."""
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    return parsed.timestamp() if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc).timestamp()
+
+
+def retention(hits, idle_seconds, half_life: float):
+    """How strongly memories deserve their place in process: use count
+    damped by the time since last use (scalars or arrays)."""
+    hits = np.maximum(np.asarray(hits, dtype=np.float64), 1.0)
+    idle = np.maximum(np.asarray(idle_seconds, dtype=np.float64), 0.0)
+    return (1.0 + np.log(hits)) * 0.5 ** (idle / half_life)
+
+
+def is_trivial(text: str, min_chars: int = 0) -> bool:
+    """True for chatter like "ok", "thanks!" or "@Zeus ping". Short messages
+    often matter ("I'm vegan", "use port 8080"), so a length cutoff only
+    applies when `min_chars` is given."""
+    words = [w for w in PART_RE.findall(text.lower()) if w not in ("ping",)]
+    if not words or all(w in TRIVIAL_MESSAGES for w in words):
+        return True
+    return len(" ".join(words)) < min_chars
+
+
+class Partition:
+    """The memories of one (room, user): their encoded unit vectors in
+    growable arrays, contents, a keyword index, and each memory's hit count
+    and last use (epoch seconds). At `cap` the memories with the lowest
+    retention are evicted, `cap // 20` at a time so the scan is amortized.
+    Evicted memories stay in the database and the partition is marked
+    `cold`.
+
+    With a lossy `codec` the candidate scan runs on the codes; when `rerank`
+    is set the full-precision vectors are kept as well and the best
+    `rerank_factor * k` candidates are re-scored on them.
+    """
+
+    def __init__(self, cap: int, codec: Optional[Codec] = None, rerank: bool = False, rerank_factor: int = 4, half_life: float = 30 * 86400.0):
+        self.cap = cap
+        self.half_life = half_life
+        self.codec = codec or Codec()
+        self.rerank = rerank and type(self.codec) is not Codec
+        self.rerank_factor = rerank_factor
+        self.complete = False  # True once the partition was loaded from the database
+        self.cold = False  # True when some of its memories are only in the database
+        self.keywords = BM25Index()
+        self.contents: Dict[Hashable, str] = {}
+        self.hits: Dict[Hashable, int] = {}
+        self.seen: Dict[Hashable, float] = {}
+        self.content_bytes = 0
+        self._rows: "OrderedDict[Hashable, int]" = OrderedDict()
+        self._ids: List[Hashable] = []
+        self._codes: Optional[np.ndarray] = None
+        self._scales: Optional[np.ndarray] = None
+        self._full: Optional[np.ndarray] = None
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def __contains__(self, memory_id: Hashable) -> bool:
+        return memory_id in self._rows
+
+    def nbytes(self) -> int:
+        """Bytes held by the vector arrays (allocated capacity)."""
+        return sum(a.nbytes for a in (self._codes, self._scales, self._full) if a is not None)
+
+    def row_bytes(self) -> int:
+        """Vector bytes per memory."""
+        return sum(a[0].nbytes for a in (self._codes, self._scales, self._full) if a is not None and len(a))
+
+    def used_bytes(self) -> int:
+        """Vector and content bytes of the memories held (without spare capacity)."""
+        return len(self) * self.row_bytes() + self.content_bytes
+
+    def retentions(self, now: Optional[float] = None) -> Tuple[List[Hashable], np.ndarray]:
+        """Ids (oldest first) and their retention scores."""
+        now = time.time() if now is None else now
+        ids = list(self._rows)
+        hits = [self.hits[i] for i in ids]
+        idle = [now - self.seen[i] for i in ids]
+        return ids, retention(hits, idle, self.half_life)
+
+    def evict_coldest(self, n: int, now: Optional[float] = None) -> List[Hashable]:
+        """Drop the `n` memories with the lowest retention (oldest first on ties)."""
+        ids, scores = self.retentions(now)
+        order = np.argsort(scores, kind="stable")[:n]
+        evicted = [ids[i] for i in order]
+        for memory_id in evicted:
+            self.remove(memory_id)
+        if evicted:
+            self.cold = True
+        return evicted
+
+    def shrink(self):
+        """Release array capacity left unused after evictions."""
+        n = len(self._ids)
+        if self._codes is None or self._codes.shape[0] <= max(2 * n, 64):
+            return
+        for name in ("_codes", "_scales", "_full"):
+            a = getattr(self, name)
+            if a is not None:
+                setattr(self, name, a[:max(n, 1)].copy())
+
+    def _reserve(self, n: int, dim: int):
+        if self._codes is not None and n < self._codes.shape[0]:
+            return
+        size = min(self.cap, 64) if self._codes is None else min(self.cap, n * 2)
+        shape, dtype = self.codec.code_shape(dim)
+
+        def grow(old, row_shape, row_dtype):
+            new = np.zeros((size, *row_shape), dtype=row_dtype)
+            if old is not None:
+                new[:n] = old[:n]
+            return new
+
+        self._codes = grow(self._codes, shape, dtype)
+        if self.codec.has_scales():
+            self._scales = grow(self._scales, (), np.float32)
+        if self.rerank:
+            self._full = grow(self._full, (dim,), np.float32)
+
+    def add(self, memory_id: Hashable, content: str, embedding, hits: int = 1, seen: Optional[float] = None) -> List[Hashable]:
+        """Add a memory last used at `seen` (default now); returns the ids
+        evicted to stay within `cap`."""
+        if memory_id in self._rows:
+            self.remove(memory_id)
+        vector = normalized(embedding)
+        evicted = []
+        if len(self._rows) >= self.cap:
+            evicted = self.evict_coldest(len(self._rows) - self.cap + max(1, self.cap // 20))
+        n = len(self._rows)
+        self._reserve(n, vector.shape[0])
+        codes, scales = self.codec.encode(vector[None, :])
+        self._codes[n] = codes[0]
+        if scales is not None:
+            self._scales[n] = scales[0]
+        if self._full is not None:
+            self._full[n] = vector
+        self._ids.append(memory_id)
+        self._rows[memory_id] = n
+        self.contents[memory_id] = content
+        self.content_bytes += len(content)
+        self.hits[memory_id] = hits
+        self.seen[memory_id] = time.time() if seen is None else seen
+        self.keywords.add(memory_id, content)
+        return evicted
+
+    def load_arrays(self, ids: List[Hashable], contents: List[str], vectors: np.ndarray, hits: List[int], seen: Optional[List[float]] = None):
+        """Fill an empty partition in bulk from unit-normalized `vectors`
+        (oldest first). float32 codes and the re-rank copy reference
+        `vectors` directly, so a memory-mapped matrix is not copied until
+        the partition grows."""
+        assert not self._rows, "load_arrays needs an empty partition"
+        if not len(ids):
+            return
+        if len(ids) > self.cap:
+            self.cold = True
+        seen = seen if seen is not None else [time.time()] * len(ids)
+        ids, contents, vectors, hits, seen = ids[-self.cap:], contents[-self.cap:], vectors[-self.cap:], hits[-self.cap:], seen[-self.cap:]
+        codes, scales = self.codec.encode(vectors)
+        self._codes, self._scales = codes, scales
+        self._full = vectors if self.rerank else None
+        self._ids = list(ids)
+        self._rows = OrderedDict((memory_id, row) for row, memory_id in enumerate(self._ids))
+        for memory_id, content, count, at in zip(self._ids, contents, hits, seen):
+            self.contents[memory_id] = content
+            self.content_bytes += len(content)
+            self.hits[memory_id] = count
+            self.seen[memory_id] = at
+            self.keywords.add(memory_id, content)
+
+    def remove(self, memory_id: Hashable):
+        row = self._rows.pop(memory_id, None)
+        if row is None:
+            return
+        last = len(self._ids) - 1
+        if row != last:
+            # keep rows dense: move the last row into the freed slot
+            moved = self._ids[last]
+            for a in (self._codes, self._scales, self._full):
+                if a is not None:
+                    a[row] = a[last]
+            self._ids[row] = moved
+            self._rows[moved] = row
+        self._ids.pop()
+        self.content_bytes -= len(self.contents.pop(memory_id, ""))
+        self.hits.pop(memory_id, None)
+        self.seen.pop(memory_id, None)
+        self.keywords.remove(memory_id)
+
+    def _scores(self, rows, query: np.ndarray) -> np.ndarray:
+        if self._full is not None:
+            return self._full[rows] @ query
+        scales = self._scales[rows] if self._scales is not None else None
+        return self.codec.scores(self._codes[rows], scales, query)
+
+    def near_duplicate(self, embedding, threshold: float, window: int) -> Optional[Tuple[Hashable, float]]:
+        """The most similar of the `window` newest memories, if its cosine
+        similarity to `embedding` is at least `threshold`."""
+        recent = list(islice(reversed(self._rows.items()), window))
+        if not recent:
+            return None
+        scores = self._scores([row for _, row in recent], normalized(embedding))
+        best = int(np.argmax(scores))
+        if scores[best] < threshold:
+            return None
+        return recent[best][0], float(scores[best])
+
+    def hit(self, memory_id: Hashable, count: int = 1) -> int:
+        """Count a use (a repeat or a recall) of a memory; it is fresh again."""
+        self.hits[memory_id] = self.hits.get(memory_id, 1) + count
+        self.seen[memory_id] = time.time()
+        return self.hits[memory_id]
+
+    def vector_search(self, query: np.ndarray, k: int) -> List[Tuple[Hashable, float]]:
+        n = len(self._ids)
+        if not n or query is None:
+            return []
+        scales = self._scales[:n] if self._scales is not None else None
+        scores = self.codec.scores(self._codes[:n], scales, query)
+        depth = min(n, k * self.rerank_factor if self._full is not None else k)
+        top = np.argpartition(-scores, depth - 1)[:depth] if n > depth else np.arange(n)
+        if self._full is not None:
+            # re-score the candidates on full precision
+            scores = np.zeros(n, dtype=np.float32)
+            scores[top] = self._full[top] @ query
+        top = top[np.argsort(-scores[top])][:k]
+        return [(self._ids[i], float(scores[i])) for i in top]
+
+
+class MemoryStore:
+    """Memories partitioned by (room, user).
+
+    A query only looks at the asker's partition, so it neither scans nor
+    leaks other users' or rooms' memories, and its cost is bounded by
+    `partition_cap`. At most `max_partitions` are kept in process (least
+    recently used ones are dropped and reloaded on demand), and with
+    `max_bytes` set the coldest memories across all partitions are demoted
+    to the database whenever vectors and contents outgrow it.
+    """
+
+    def __init__(
+        self,
+        partition_cap: int = 2000,
+        max_partitions: int = 256,
+        rrf_k: int = 60,
+        precision: str = "float32",
+        rerank: bool = False,
+        half_life_days: float = 30.0,
+        recency_weight: float = 0.1,
+        hit_weight: float = 0.05,
+        max_bytes: Optional[int] = None,
+    ):
+        self.partition_cap = partition_cap
+        self.max_partitions = max_partitions
+        self.rrf_k = rrf_k
+        self.codec = get_codec(precision)
+        self.rerank = rerank
+        self.half_life = half_life_days * 86400.0
+        self.recency_weight = recency_weight
+        self.hit_weight = hit_weight
+        self.max_bytes = max_bytes
+        self.partitions: "OrderedDict[Tuple[str, str], Partition]" = OrderedDict()
+        self.evicted = 0
+        self.demoted = 0
+
+    @staticmethod
+    def key(session_id: Optional[str], username: Optional[str]) -> Tuple[str, str]:
+        return (session_id or "", username or "")
+
+    def __len__(self) -> int:
+        return sum(len(p) for p in self.partitions.values())
+
+    def nbytes(self) -> int:
+        """Vector and content bytes of the memories in process. Arrays
+        reserve up to twice that while they grow."""
+        return sum(p.used_bytes() for p in self.partitions.values())
+
+    def partition(self, session_id: Optional[str], username: Optional[str], create: bool = True) -> Optional[Partition]:
+        key = self.key(session_id, username)
+        part = self.partitions.get(key)
+        if part is not None:
+            self.partitions.move_to_end(key)
+        elif create:
+            part = self.partitions[key] = Partition(self.partition_cap, self.codec, self.rerank, half_life=self.half_life)
+            while len(self.partitions) > self.max_partitions:
+                self.partitions.popitem(last=False)
+        return part
+
+    def add(self, memory_id: Hashable, content: str, embedding, session_id: Optional[str], username: Optional[str], hits: int = 1, seen: Optional[float] = None):
+        if not content or embedding is None:
+            return
+        self.evicted += len(self.partition(session_id, username).add(memory_id, content, embedding, hits, seen))
+        if self.max_bytes and self.nbytes() > self.max_bytes:
+            self.enforce_budget()
+
+    def enforce_budget(self, now: Optional[float] = None) -> int:
+        """Demote the coldest memories (any partition) until the store is back
+        under 90% of `max_bytes`; returns how many were demoted."""
+        if not self.max_bytes or self.nbytes() <= self.max_bytes:
+            return 0
+        excess = self.nbytes() - int(self.max_bytes * 0.9)
+        parts = [p for p in self.partitions.values() if len(p)]
+        candidates = []  # (retention, partition index, id, bytes freed)
+        for index, part in enumerate(parts):
+            ids, scores = part.retentions(now)
+            row = part.row_bytes()
+            candidates += [(score, index, memory_id, row + len(part.contents[memory_id])) for memory_id, score in zip(ids, scores.tolist())]
+        candidates.sort(key=lambda c: c[0])
+        demoted, freed, touched = 0, 0, set()
+        for _, index, memory_id, size in candidates:
+            if freed >= excess:
+                break
+            parts[index].remove(memory_id)
+            parts[index].cold = True
+            touched.add(index)
+            freed += size
+            demoted += 1
+        for index in touched:
+            parts[index].shrink()
+        self.demoted += demoted
+        return demoted
+
+    def touch(self, session_id: Optional[str], username: Optional[str], memory_ids: Iterable[Hashable]) -> List[Hashable]:
+        """Count a recall of those `memory_ids` that live in this partition;
+        returns them."""
+        part = self.partition(session_id, username, create=False)
+        if part is None:
+            return []
+        touched = [memory_id for memory_id in memory_ids if memory_id in part]
+        for memory_id in touched:
+            part.hit(memory_id)
+        return touched
+
+    def boost(self, hits: int, age_seconds: float) -> float:
+        decay = 0.5 ** (max(age_seconds, 0.0) / self.half_life)
+        return 1.0 + self.recency_weight * decay + self.hit_weight * math.log(max(hits, 1))
+
+    def search(self, query: str, embedding, session_id: Optional[str], username: Optional[str], k: int = 5, cold_rows: Optional[List[dict]] = None) -> List[dict]:
+        """Hybrid search of one partition: the vector and keyword rankings are
+        fused with RRF, then weighted by recency and use. `cold_rows` (from
+        `match_memory`, most similar first) join as a third ranking. Rows
+        look like `match_memory`'s (id, content, similarity) plus `score` and
+        `tier` (hot/cold); keyword-only hits have `similarity` None."""
+        part = self.partition(session_id, username, create=False)
+        hot = part is not None and len(part) > 0
+        cold = {r["id"]: r for r in cold_rows or [] if not (hot and r["id"] in part)}
+        if not hot and not cold:
+            return []
+        rankings = []
+        similar = {}
+        if hot:
+            vector = normalized(embedding) if embedding is not None else None
+            depth = max(k * 2, 10)
+            similar = dict(part.vector_search(vector, depth))
+            rankings += [list(similar), [doc_id for doc_id, _ in part.keywords.search(query, k=depth)]]
+        if cold:
+            rankings.append(list(cold))
+        now = time.time()
+        results = []
+        for doc_id, score in rrf_fuse(rankings, k=self.rrf_k):
+            if doc_id in cold:
+                row = cold[doc_id]
+                seen = parse_timestamp(row.get("last_seen_at") or row.get("created_at")) or now
+                hits = row.get("hit_count") or 1
+                results.append({"id": doc_id, "content": row.get("content") or "", "similarity": row.get("similarity"), "tier": "cold"})
+            else:
+                seen, hits = part.seen[doc_id], part.hits[doc_id]
+                results.append({"id": doc_id, "content": part.contents[doc_id], "similarity": similar.get(doc_id), "tier": "hot"})
+            results[-1]["score"] = score * self.boost(hits, now - seen)
+        return sorted(results, key=lambda r: r["score"], reverse=True)[:k]
+
+    def metrics(self) -> dict:
+        return {
+            "partitions": len(self.partitions),
+            "memories": len(self),
+            "evicted": self.evicted,
+            "demoted": self.demoted,
+            "cold_partitions": sum(p.cold for p in self.partitions.values()),
+            "partition_cap": self.partition_cap,
+            "precision": self.codec.name,
+            "vector_bytes": sum(p.nbytes() for p in self.partitions.values()),
+            "bytes": self.nbytes(),
+            "max_bytes": self.max_bytes,
+        }
@@ -0,0 +1,200 @@
+"""
+Memory-mapped snapshot of the memory table for fast cold starts.
+
+Rebuilding partitions from PostgREST means pulling every 1536-dim vector
+as JSON text. A snapshot keeps them on local disk instead:
+
+    manifest.json   dim, row count, watermark and each (room, user)
+                    partition's [start, end) row range
+    vectors.f32     unit-normalized float32 matrix, rows grouped by partition
+    table.bin       one fixed-width record per row: id, content offset and
+                    length, hit count, last use (epoch seconds)
+    contents.bin    UTF-8 contents, concatenated
+
+The server maps the files read-only (copy-on-write) at startup; loading a
+partition slices the mapped matrix without copying it and only asks the
+database for that partition's rows created since the snapshot watermark.
+
+Build or refresh it offline (or let the server do it every
+MEMORY_SNAPSHOT_INTERVAL seconds):
+
+    python -m ReplyChallenge.memory_snapshot [--path DIR] [--page-size 250]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import time
+from datetime import datetime, timedelta
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from ReplyChallenge.database import async_service as db
+from ReplyChallenge.database.client import close_async_client, load_env
+from ReplyChallenge.logs import get_logger
+from ReplyChallenge.memory_index import normalized, parse_timestamp
+
+log = get_logger("memory_snapshot")
+
+VERSION = 2
+ID_BYTES = 40
+TABLE_DTYPE = np.dtype([("id", f"S{ID_BYTES}"), ("offset", "<i8"), ("length", "<i4"), ("hits", "<i4"), ("seen", "<f8")])
+
+# Rows written while a build runs may carry a created_at slightly before
+# the moment the build started; loading re-fetches from a bit earlier.
+WATERMARK_SKEW = timedelta(seconds=60)
+
+
+class SnapshotWriter:
+    """Streams partitions to a new snapshot directory (constant memory)."""
+
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        self._vectors = open(os.path.join(path, "vectors.f32"), "wb")
+        self._table = open(os.path.join(path, "table.bin"), "wb")
+        self._contents = open(os.path.join(path, "contents.bin"), "wb")
+        self._offset = 0
+        self.count = 0
+        self.dim: Optional[int] = None
+        self.partitions: List[list] = []
+
+    def add_partition(self, session_id: Optional[str], username: Optional[str], rows: List[dict]):
+        """Append one partition's rows (oldest first)."""
+        start = self.count
+        for r in rows:
+            if r.get("embedding") is None:
+                continue
+            vector = normalized(r["embedding"])
+            if self.dim is None:
+                self.dim = vector.shape[0]
+            content = (r.get("content") or "").encode("utf-8")
+            record = np.zeros(1, dtype=TABLE_DTYPE)
+            record["id"] = str(r["id"]).encode("ascii")
+            record["offset"], record["length"], record["hits"] = self._offset, len(content), r.get("hit_count") or 1
+            record["seen"] = parse_timestamp(r.get("last_seen_at") or r.get("created_at")) or time.time()
+            self._vectors.write(vector.astype("<f4").tobytes())
+            self._table.write(record.tobytes())
+            self._contents.write(content)
+            self._offset += len(content)
+            self.count += 1
+        if self.count > start:
+            self.partitions.append([session_id, username, start, self.count])
+
+    def close(self, watermark: str):
+        for fh in (self._vectors, self._table, self._contents):
+            fh.close()
+        manifest = {
+            "version": VERSION,
+            "dim": self.dim or 0,
+            "count": self.count,
+            "watermark": watermark,
+            "partitions": self.partitions,
+        }
+        with open(os.path.join(self.path, "manifest.json"), "w", encoding="utf-8") as fh:
+            json.dump(manifest, fh)
+
+
+class Snapshot:
+    """A mapped snapshot; see the module docstring for the layout."""
+
+    def __init__(self, path: str, manifest: dict):
+        self.path = path
+        self.watermark: str = manifest["watermark"]
+        self.count: int = manifest["count"]
+        self.dim: int = manifest["dim"]
+        self._ranges = {(s or "", u or ""): (start, end) for s, u, start, end in manifest["partitions"]}
+        shape = (self.count, self.dim)
+        # copy-on-write: partitions can modify their rows without touching the file
+        self.vectors = np.memmap(os.path.join(path, "vectors.f32"), dtype="<f4", mode="c", shape=shape) if self.count else np.zeros(shape, np.float32)
+        self.table = np.memmap(os.path.join(path, "table.bin"), dtype=TABLE_DTYPE, mode="r", shape=(self.count,)) if self.count else np.zeros(0, TABLE_DTYPE)
+        size = os.path.getsize(os.path.join(path, "contents.bin"))
+        self.contents = np.memmap(os.path.join(path, "contents.bin"), dtype=np.uint8, mode="r") if size else np.zeros(0, np.uint8)
+
+    @classmethod
+    def open(cls, path: str) -> Optional["Snapshot"]:
+        """Map the snapshot at `path`, or return None if there is none usable."""
+        try:
+            with open(os.path.join(path, "manifest.json"), encoding="utf-8") as fh:
+                manifest = json.load(fh)
+            if manifest.get("version") != VERSION:
+                log.warning("ignoring memory snapshot with version %s", manifest.get("version"))
+                return None
+            return cls(path, manifest)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            log.warning("could not open memory snapshot at %s: %s", path, e)
+            return None
+
+    def __len__(self) -> int:
+        return self.count
+
+    def partition(self, session_id: Optional[str], username: Optional[str], limit: Optional[int] = None) -> Optional[Tuple[list, list, np.ndarray, list, list]]:
+        """(ids, contents, vectors, hits, seen) of a partition's newest
+        `limit` rows. `vectors` is a view into the mapped file."""
+        found = self._ranges.get((session_id or "", username or ""))
+        if found is None:
+            return None
+        start, end = found
+        if limit:
+            start = max(start, end - limit)
+        records = self.table[start:end]
+        ids = [raw.decode("ascii") for raw in records["id"]]
+        contents = [
+            bytes(self.contents[off:off + length]).decode("utf-8")
+            for off, length in zip(records["offset"].tolist(), records["length"].tolist())
+        ]
+        return ids, contents, self.vectors[start:end], records["hits"].tolist(), records["seen"].tolist()
+
+
+async def build_snapshot(path: str, page_size: int = 250) -> dict:
+    """Write a fresh snapshot of the memory table to `path`, replacing any
+    existing one only once the new one is complete. Rows are read
+    `page_size` per query (MEMORY_LOAD_PAGE_SIZE when run by the server)."""
+    watermark = (datetime.utcnow() - WATERMARK_SKEW).isoformat()
+    tmp = path.rstrip("/") + ".tmp"
+    shutil.rmtree(tmp, ignore_errors=True)
+    writer = SnapshotWriter(tmp)
+    try:
+        for session_id, username in await db.list_memory_partitions():
+            rows, seen, after = [], set(), None
+            while True:
+                page = await db.list_memories(session_id=session_id, username=username, limit=page_size, after=after)
+                fresh = [r for r in page if r["id"] not in seen]
+                rows.extend(fresh)
+                seen.update(r["id"] for r in fresh)
+                if len(page) < page_size or not fresh:
+                    break
+                after = page[-1]["created_at"]
+            writer.add_partition(session_id, username, rows)
+    finally:
+        writer.close(watermark)
+
+    old = path.rstrip("/") + ".old"
+    shutil.rmtree(old, ignore_errors=True)
+    if os.path.exists(path):
+        os.replace(path, old)
+    os.replace(tmp, path)
+    # mapped files stay readable by a running server after they are unlinked
+    shutil.rmtree(old, ignore_errors=True)
+    return {"rows": writer.count, "partitions": len(writer.partitions), "watermark": watermark}
+
+
+async def _main(args):
+    load_env()
+    try:
+        result = await build_snapshot(args.path, args.page_size)
+        print(f"✓ Wrote memory snapshot to {args.path}: {result['rows']} rows in {result['partitions']} partitions (watermark {result['watermark']})")
+    finally:
+        await close_async_client()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Write a memory-mapped snapshot of the memory table.")
+    parser.add_argument("--path", default=os.getenv("MEMORY_SNAPSHOT_DIR", os.path.join(os.path.dirname(__file__), "memory_snapshot")))
+    parser.add_argument("--page-size", type=int, default=int(os.getenv("MEMORY_LOAD_PAGE_SIZE", "250")))
+    asyncio.run(_main(parser.parse_args()))
@@ -0,0 +1,112 @@
+"""
+Speculative context prefetch.
+
+A typing indicator usually arrives a few seconds before the message it
+announces, so the server starts loading that user's context (facts,
+summary and recent history) as soon as it sees one. When the message
+arrives the persona pipeline picks the loaded value up from here instead
+of querying the database on the critical path.
+
+At most `max_concurrency` loads run at once (further requests are skipped,
+not queued); entries expire after `ttl` seconds and the least recently
+used ones are evicted beyond `max_entries`. Writers invalidate the entries
+they make stale.
+"""
+
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+
+from ReplyChallenge.logs import get_logger
+
+log = get_logger("prefetch")
+
+Loader = Callable[[], Awaitable[Any]]
+
+
+class ContextPrefetcher:
+    def __init__(self, max_concurrency: int = 4, ttl: float = 30.0, max_entries: int = 256):
+        self.max_concurrency = max_concurrency
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._loading: Dict[Hashable, asyncio.Task] = {}
+        self.stats = {"scheduled": 0, "skipped": 0, "hits": 0, "misses": 0, "evicted": 0, "failed": 0}
+
+    def _fresh(self, key: Hashable) -> bool:
+        entry = self._entries.get(key)
+        if entry is None:
+            return False
+        if time.monotonic() - entry[0] > self.ttl:
+            del self._entries[key]
+            self.stats["evicted"] += 1
+            return False
+        return True
+
+    def schedule(self, key: Hashable, loader: Loader) -> bool:
+        """Start loading `key` in the background unless it is already cached,
+        loading, or all prefetch slots are busy."""
+        if key in self._loading or self._fresh(key):
+            return False
+        if len(self._loading) >= self.max_concurrency:
+            self.stats["skipped"] += 1
+            return False
+        task = asyncio.create_task(loader())
+        self._loading[key] = task
+        task.add_done_callback(lambda t: self._loaded(key, t))
+        self.stats["scheduled"] += 1
+        return True
+
+    def _loaded(self, key: Hashable, task: asyncio.Task):
+        # an invalidated load is no longer in `_loading`; drop its result
+        if self._loading.get(key) is not task:
+            return
+        del self._loading[key]
+        if task.cancelled():
+            return
+        if task.exception() is not None:
+            self.stats["failed"] += 1
+            log.warning("prefetch of %s failed: %s", key, task.exception())
+            return
+        self._entries[key] = (time.monotonic(), task.result())
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.stats["evicted"] += 1
+
+    async def get(self, key: Hashable, pop: bool = False) -> Optional[Any]:
+        """Return the prefetched value for `key` (waiting for a load already
+        in flight), or None on a miss. `pop` removes it once taken."""
+        task = self._loading.get(key)
+        if task is not None:
+            try:
+                await asyncio.shield(task)
+            except asyncio.CancelledError:
+                # the load was invalidated; re-raise only if we were cancelled
+                if not task.cancelled():
+                    raise
+            except Exception:
+                pass
+        if not self._fresh(key):
+            self.stats["misses"] += 1
+            return None
+        self.stats["hits"] += 1
+        if pop:
+            return self._entries.pop(key)[1]
+        self._entries.move_to_end(key)
+        return self._entries[key][1]
+
+    def invalidate(self, kind: str, where: Optional[Callable[[tuple], bool]] = None):
+        """Drop cached and in-flight entries whose key is a tuple starting with
+        `kind` (and for which `where(key)` is true, if given)."""
+        def matches(key):
+            return isinstance(key, tuple) and key[0] == kind and (where is None or where(key))
+
+        for key in [k for k in self._entries if matches(k)]:
+            del self._entries[key]
+        for key in [k for k in self._loading if matches(k)]:
+            self._loading.pop(key).cancel()
+
+    def metrics(self) -> dict:
+        return {"entries": len(self._entries), "loading": len(self._loading), **self.stats}
@@ -0,0 +1,148 @@
+"""
+Compact embedding codecs for the in-process memory store.
+
+A 1536-dim `text-embedding-3-small` vector is 6 KB as float32. The codecs
+here trade a little accuracy for footprint:
+
+  * float16 - 2 bytes/dim, practically lossless for cosine ranking
+  * int8    - 1 byte/dim plus one float32 scale per vector (symmetric,
+              per-vector scalar quantization)
+  * pq      - product quantization: `m` sub-vectors, each replaced by the
+              id of its nearest of 256 trained centroids (m bytes/vector);
+              scored with per-query lookup tables (asymmetric distance)
+
+Every codec encodes unit-normalized rows and scores them against a float32
+query with an (approximate) dot product. Lossy codecs are meant to be used
+for the candidate scan, followed by a re-rank of the best candidates on
+full-precision vectors.
+"""
+
+from typing import Optional, Tuple
+
+import numpy as np
+
+
+# Lossy codes are widened to float32 a block at a time, so a scan never
+# materializes a full float32 copy of the partition
+BLOCK_ROWS = 4096
+
+
+def _blocked_scores(codes: np.ndarray, query: np.ndarray) -> np.ndarray:
+    out = np.empty(len(codes), dtype=np.float32)
+    for start in range(0, len(codes), BLOCK_ROWS):
+        out[start:start + BLOCK_ROWS] = codes[start:start + BLOCK_ROWS].astype(np.float32) @ query
+    return out
+
+
+class Codec:
+    name = "float32"
+
+    def encode(self, vectors: np.ndarray) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+        """Return (codes, per-row scales or None) for float32 rows."""
+        return vectors.astype(np.float32, copy=False), None
+
+    def scores(self, codes: np.ndarray, scales: Optional[np.ndarray], query: np.ndarray) -> np.ndarray:
+        return codes @ query
+
+    def code_shape(self, dim: int) -> Tuple[tuple, np.dtype]:
+        return (dim,), np.dtype(np.float32)
+
+    def has_scales(self) -> bool:
+        return False
+
+
+class Float16Codec(Codec):
+    name = "float16"
+
+    def encode(self, vectors):
+        return vectors.astype(np.float16), None
+
+    def scores(self, codes, scales, query):
+        # numpy has no fast float16 matmul, so widen block by block
+        return _blocked_scores(codes, query)
+
+    def code_shape(self, dim):
+        return (dim,), np.dtype(np.float16)
+
+
+class Int8Codec(Codec):
+    name = "int8"
+
+    def encode(self, vectors):
+        scales = np.abs(vectors).max(axis=1) / 127.0
+        scales[scales == 0] = 1.0
+        codes = np.clip(np.rint(vectors / scales[:, None]), -127, 127).astype(np.int8)
+        return codes, scales.astype(np.float32)
+
+    def scores(self, codes, scales, query):
+        return _blocked_scores(codes, query) * scales
+
+    def code_shape(self, dim):
+        return (dim,), np.dtype(np.int8)
+
+    def has_scales(self):
+        return True
+
+
+class ProductQuantizer(Codec):
+    """PQ with `m` sub-spaces of 256 centroids each; call `train` first."""
+
+    name = "pq"
+
+    def __init__(self, m: int = 96, iterations: int = 10, seed: int = 0):
+        self.m = m
+        self.iterations = iterations
+        self.seed = seed
+        self.centroids: Optional[np.ndarray] = None  # (m, 256, dim // m)
+
+    def train(self, sample: np.ndarray) -> "ProductQuantizer":
+        n, dim = sample.shape
+        if dim % self.m:
+            raise ValueError(f"dimension {dim} is not divisible by m={self.m}")
+        rng = np.random.default_rng(self.seed)
+        sub = dim // self.m
+        k = min(256, n)
+        centroids = np.zeros((self.m, 256, sub), dtype=np.float32)
+        for j in range(self.m):
+            x = sample[:, j * sub:(j + 1) * sub]
+            c = x[rng.choice(n, k, replace=False)].copy()
+            for _ in range(self.iterations):
+                # nearest centroid by squared distance, then recompute means
+                assign = np.argmin((x ** 2).sum(1)[:, None] - 2 * x @ c.T + (c ** 2).sum(1)[None, :], axis=1)
+                for ci in range(k):
+                    members = x[assign == ci]
+                    if len(members):
+                        c[ci] = members.mean(axis=0)
+            centroids[j, :k] = c
+        self.centroids = centroids
+        return self
+
+    def encode(self, vectors):
+        sub = self.centroids.shape[2]
+        codes = np.empty((len(vectors), self.m), dtype=np.uint8)
+        for j in range(self.m):
+            x = vectors[:, j * sub:(j + 1) * sub]
+            c = self.centroids[j]
+            codes[:, j] = np.argmin(-2 * x @ c.T + (c ** 2).sum(1)[None, :], axis=1)
+        return codes, None
+
+    def scores(self, codes, scales, query):
+        sub = self.centroids.shape[2]
+        # table[j, c] = <query sub-vector j, centroid c of sub-space j>
+        table = np.einsum("jcs,js->jc", self.centroids, query.reshape(self.m, sub))
+        return table[np.arange(self.m), codes].sum(axis=1)
+
+    def code_shape(self, dim):
+        return (self.m,), np.dtype(np.uint8)
+
+
+CODECS = {"float32": Codec, "float16": Float16Codec, "int8": Int8Codec}
+
+
+def get_codec(name: str) -> Codec:
+    """Codec for MEMORY_VECTOR_PRECISION (PQ needs training, so it is built
+    explicitly rather than by name)."""
+    try:
+        return CODECS[name]()
+    except KeyError:
+        raise ValueError(f"Unknown vector precision '{name}' (expected one of {', '.join(CODECS)})")
@@ -0,0 +1,63 @@
+"""
+Startup warm-up and readiness checks.
+
+Components register warm-up steps (open pooled connections, preload caches
+or indexes) and dependency checks. `/health` stays a cheap liveness probe;
+`/ready` only reports ready once warm-up has finished and every check passes,
+so rolling restarts don't route traffic to a cold worker.
+"""
+
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable, Dict, List, Tuple
+
+from ReplyChallenge.logs import get_logger
+
+log = get_logger("readiness")
+
+Check = Callable[[], Awaitable[bool]]
+
+
+class Readiness:
+    def __init__(self, check_timeout: float = 3.0):
+        self.check_timeout = check_timeout
+        self.warmups: List[Tuple[str, Check]] = []
+        self.checks: Dict[str, Check] = {}
+        self.status: Dict[str, str] = {}
+        self.warmed = False
+        self.warmup_seconds: float | None = None
+
+    def add_warmup(self, name: str, step: Check):
+        self.warmups.append((name, step))
+
+    def add_check(self, name: str, check: Check):
+        self.checks[name] = check
+        self.status.setdefault(name, "unknown")
+
+    async def _run(self, fn: Check) -> str:
+        try:
+            ok = await asyncio.wait_for(fn(), timeout=self.check_timeout)
+            return "ok" if ok else "unavailable"
+        except asyncio.TimeoutError:
+            return "timeout"
+        except Exception as e:
+            return f"error: {e}"
+
+    async def warm_up(self):
+        """Run every warm-up step concurrently; failures are reported, not raised."""
+        started = time.monotonic()
+        results = await asyncio.gather(*(self._run(step) for _, step in self.warmups))
+        for (name, _), result in zip(self.warmups, results):
+            log.log(logging.INFO if result == "ok" else logging.WARNING, "warm-up %s: %s", name, result)
+        self.warmup_seconds = round(time.monotonic() - started, 3)
+        self.warmed = True
+
+    async def check(self) -> Dict[str, str]:
+        names = list(self.checks)
+        results = await asyncio.gather(*(self._run(self.checks[n]) for n in names))
+        self.status.update(zip(names, results))
+        return dict(self.status)
+
+    def is_ready(self) -> bool:
+        return self.warmed and all(v == "ok" for v in self.status.values())
@@ -0,0 +1,397 @@
+"""
+Replay a traffic capture (`traffic.py`) against this build, and compare
+per-stage latency between builds.
+
+    python -m ReplyChallenge.replay run capture.ndjson.gz [--speed 4] [--no-latency] [--out after.json]
+    python -m ReplyChallenge.replay compare before.json after.json [--fail-above 10]
+
+`run` drives the FastAPI app in process. Every recorded connection is
+opened as an ASGI websocket and its frames are sent at their recorded
+offsets divided by `--speed`. OpenAI and Supabase are never contacted:
+each call gets the recorded response to the same request, after the
+recorded latency (`--no-latency` answers at once). When this build asks
+something the capture doesn't have verbatim (a prompt changed, a query
+got a new filter), it gets the next unused response recorded for the same
+endpoint. Those substitutions are counted in the report as `fallback`.
+
+The driver answers pings itself and delivers a disconnect only once the
+server has handled the connection's frames and finished its persona
+requests, so a sped-up replay doesn't cancel work the original traffic saw
+completed.
+
+The report has wall-clock latency percentiles per pipeline stage (the
+`profiler.set_stage` names), end to end latencies (`frame`: until the
+server is ready for the next frame; `first_reply` / `reply`: until a
+persona's answer arrives), and how responses were matched. Run the same
+capture on two checkouts and `compare` the reports.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from types import SimpleNamespace
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from ReplyChallenge.traffic import VERSION, chat_key, db_key, db_route, decode_vectors, read_capture, text_key
+
+
+class ReplayMiss(LookupError):
+    pass
+
+
+class ReplayedError(RuntimeError):
+    """A dependency error replayed from the capture."""
+
+
+class RecordedResponses:
+    """Recorded dependency calls, handed out exact match first, then in
+    recorded order per endpoint."""
+
+    def __init__(self, calls: List[dict], latency: bool = True):
+        self.latency = latency
+        self._by_key = defaultdict(deque)
+        self._by_dep = defaultdict(deque)
+        self.stats = defaultdict(lambda: {"exact": 0, "fallback": 0, "missing": 0})
+        for call in calls:
+            entry = [call, False]
+            self._by_key[(call["dep"], call["key"])].append(entry)
+            self._by_dep[call["dep"]].append(entry)
+
+    def take(self, dep: str, key: str) -> dict:
+        for queue, match in ((self._by_key.get((dep, key)), "exact"), (self._by_dep.get(dep), "fallback")):
+            while queue and queue[0][1]:
+                queue.popleft()
+            if queue:
+                entry = queue.popleft()
+                entry[1] = True
+                self.stats[dep][match] += 1
+                return entry[0]
+        self.stats[dep]["missing"] += 1
+        raise ReplayMiss(f"no recorded response left for {dep}")
+
+    async def answer(self, dep: str, key: str, decode):
+        call = self.take(dep, key)
+        if self.latency:
+            await asyncio.sleep(call["ms"] / 1000)
+        if "error" in call:
+            raise ReplayedError(f"{call['error_type']}: {call['error']}")
+        return decode(call["result"])
+
+
+class StageTimer:
+    """Wall time each task spends in each `set_stage` stage; a stage ends at
+    the task's next `set_stage` or when the task finishes."""
+
+    def __init__(self):
+        self.samples: Dict[str, List[float]] = defaultdict(list)
+        self._open: dict = {}
+
+    def mark(self, name: Optional[str]):
+        task = asyncio.current_task()
+        if task is None:
+            return
+        now = time.perf_counter()
+        current = self._open.pop(task, None)
+        if current is not None:
+            self.samples[current[0]].append(now - current[1])
+        elif name is not None:
+            task.add_done_callback(self._finish)
+        if name is not None:
+            self._open[task] = (name, now)
+
+    def _finish(self, task):
+        current = self._open.pop(task, None)
+        if current is not None:
+            self.samples[current[0]].append(time.perf_counter() - current[1])
+
+
+def summarize(seconds: List[float]) -> dict:
+    if not seconds:
+        return {"count": 0}
+    ms = np.asarray(seconds) * 1000
+    return {
+        "count": len(ms),
+        "mean_ms": round(float(ms.mean()), 3),
+        "p50_ms": round(float(np.percentile(ms, 50)), 3),
+        "p95_ms": round(float(np.percentile(ms, 95)), 3),
+        "p99_ms": round(float(np.percentile(ms, 99)), 3),
+        "max_ms": round(float(ms.max()), 3),
+    }
+
+
+class ReplayConnection:
+    """One recorded websocket, driven through the app's ASGI interface."""
+
+    def __init__(self, driver: "Replay", conn: int):
+        self.driver = driver
+        self.conn = conn
+        self.inbox: asyncio.Queue = asyncio.Queue()
+        self.waiting = False
+        self.current_sent: Optional[float] = None
+        self.requests: set = set()
+        self.task: Optional[asyncio.Task] = None
+
+    def open(self, app):
+        scope = {
+            "type": "websocket", "asgi": {"version": "3.0"}, "scheme": "ws", "path": "/ws", "raw_path": b"/ws",
+            "root_path": "", "query_string": b"", "headers": [], "subprotocols": [],
+            "client": ("replay", self.conn), "server": ("replay", 80),
+        }
+        self.inbox.put_nowait({"type": "websocket.connect"})
+        self.task = asyncio.create_task(app(scope, self.receive, self.send))
+        self.driver.by_task[self.task] = self
+
+    def send_frame(self, data: str):
+        self.inbox.put_nowait({"type": "websocket.receive", "text": data, "sent": time.perf_counter()})
+
+    async def receive(self) -> dict:
+        if self.current_sent is not None:
+            # the server is ready for the next frame: the previous one is done
+            self.driver.end_to_end["frame"].append(time.perf_counter() - self.current_sent)
+            self.current_sent = None
+        self.waiting = self.inbox.empty()
+        message = await self.inbox.get()
+        self.waiting = False
+        self.current_sent = message.pop("sent", None)
+        return message
+
+    async def send(self, message: dict):
+        if message["type"] != "websocket.send":
+            return
+        try:
+            event = json.loads(message.get("text") or "")
+        except ValueError:
+            return
+        if not isinstance(event, dict):
+            return
+        if event.get("type") == "ping":
+            self.inbox.put_nowait({"type": "websocket.receive", "text": json.dumps({"type": "pong"})})
+        elif event.get("type") == "ai":
+            self.driver.reply_received(event.get("request_id"), event.get("username"))
+
+    def idle(self, inflight: dict) -> bool:
+        return self.waiting and self.inbox.empty() and not any(key in inflight for key in self.requests)
+
+    async def close(self, inflight: dict):
+        while not self.idle(inflight) and not self.task.done():
+            await asyncio.sleep(0.005)
+        self.inbox.put_nowait({"type": "websocket.disconnect", "code": 1000})
+        await asyncio.wait([self.task], timeout=5)
+
+
+def _is_pong(data: str) -> bool:
+    try:
+        frame = json.loads(data)
+    except ValueError:
+        return False
+    return isinstance(frame, dict) and frame.get("type") == "pong"
+
+
+class Replay:
+    def __init__(self, path: str, speed: float = 1.0, latency: bool = True, settle: float = 60.0):
+        self.path = path
+        self.speed = speed
+        self.settle = settle
+        events, calls = [], []
+        for record in read_capture(path):
+            if record["kind"] == "header":
+                if record.get("version") != VERSION:
+                    raise ValueError(f"capture version {record.get('version')} is not supported")
+            elif record["kind"] == "call":
+                calls.append(record)
+            else:
+                events.append(record)
+        self.events = sorted(events, key=lambda r: r["t"])
+        self.responses = RecordedResponses(calls, latency)
+        self.timer = StageTimer()
+        self.end_to_end: Dict[str, List[float]] = defaultdict(list)
+        self.by_task: dict = {}
+        self._request_sent: Dict[str, float] = {}
+        self._replied: set = set()
+
+    def reply_received(self, request_id, persona):
+        sent = self._request_sent.get(request_id)
+        if sent is None or (request_id, persona) in self._replied:
+            return
+        now = time.perf_counter()
+        if not any(r == request_id for r, _ in self._replied):
+            self.end_to_end["first_reply"].append(now - sent)
+        self._replied.add((request_id, persona))
+        self.end_to_end["reply"].append(now - sent)
+
+    @contextmanager
+    def _patched(self, main):
+        from openai.types.chat import ChatCompletion
+        from postgrest import AsyncPostgrestClient
+
+        from ReplyChallenge import llm
+        from ReplyChallenge.database import async_service
+
+        answer = self.responses.answer
+
+        async def no_op():
+            return None
+
+        def start_persona_request(websocket, key, room, work):
+            conn = self.by_task.get(asyncio.current_task())
+            if conn is not None:
+                conn.requests.add(key)
+                if conn.current_sent is not None:
+                    self._request_sent[key] = conn.current_sent
+            return original_start(websocket, key, room, work)
+
+        def set_stage(name):
+            original_set_stage(name)
+            self.timer.mark(name)
+
+        client = SimpleNamespace(models=SimpleNamespace(list=no_op))
+        database = AsyncPostgrestClient("http://replay.invalid/rest/v1")
+        original_start, original_set_stage = main.start_persona_request, main.set_stage
+        patches = [
+            (main, "recorder", None),
+            (main, "start_persona_request", start_persona_request),
+            (main, "set_stage", set_stage),
+            (llm, "get_client", lambda: client),
+            (llm, "embed", lambda text: answer("openai.embed", text_key(text), decode_vectors)),
+            (llm, "embed_many", lambda texts: answer("openai.embed_many", text_key(texts), decode_vectors)),
+            (llm, "chat", lambda model, messages, temperature=0.7, max_tokens=None: answer(
+                "openai.chat", chat_key(model, messages, temperature, max_tokens), ChatCompletion.model_validate)),
+            (async_service, "get_async_client", lambda: database),
+            (async_service, "_execute", lambda query: answer(db_route(query), db_key(query), lambda r: SimpleNamespace(**r))),
+        ]
+        originals = [(owner, name, getattr(owner, name)) for owner, name, _ in patches]
+        for owner, name, value in patches:
+            setattr(owner, name, value)
+        try:
+            yield
+        finally:
+            for owner, name, value in originals:
+                setattr(owner, name, value)
+
+    async def run(self) -> dict:
+        from ReplyChallenge import main
+
+        connections: Dict[int, ReplayConnection] = {}
+        closing = []
+        frames = 0
+        with self._patched(main):
+            await main.app.router.startup()
+            started = time.perf_counter()
+            try:
+                for event in self.events:
+                    delay = started + event["t"] / self.speed - time.perf_counter()
+                    if delay > 0:
+                        await asyncio.sleep(delay)
+                    conn = connections.get(event["conn"])
+                    if event["kind"] == "connect":
+                        conn = connections[event["conn"]] = ReplayConnection(self, event["conn"])
+                        conn.open(main.app)
+                    elif conn is None:
+                        continue
+                    elif event["kind"] == "frame":
+                        if _is_pong(event["data"]):
+                            continue  # pings are answered as they arrive
+                        conn.send_frame(event["data"])
+                        frames += 1
+                    elif event["kind"] == "disconnect":
+                        closing.append(asyncio.create_task(conn.close(main.inflight)))
+                        connections.pop(event["conn"])
+                closing += [asyncio.create_task(conn.close(main.inflight)) for conn in connections.values()]
+                if closing:
+                    await asyncio.wait(closing, timeout=self.settle)
+                deadline = time.perf_counter() + self.settle
+                while main.inflight and time.perf_counter() < deadline:
+                    await asyncio.sleep(0.01)
+                elapsed = time.perf_counter() - started
+            finally:
+                await main.app.router.shutdown()
+
+        return {
+            "capture": self.path,
+            "speed": self.speed,
+            "latency": self.responses.latency,
+            "seconds": round(elapsed, 3),
+            "connections": sum(1 for e in self.events if e["kind"] == "connect"),
+            "frames": frames,
+            "stages": {name: summarize(samples) for name, samples in sorted(self.timer.samples.items())},
+            "end_to_end": {name: summarize(samples) for name, samples in sorted(self.end_to_end.items())},
+            "responses": dict(sorted(self.responses.stats.items())),
+        }
+
+
+def compare(before: dict, after: dict, fail_above: Optional[float] = None) -> List[dict]:
+    """Per stage / end-to-end metric p50 and p95 of two reports; rows whose
+    p95 grew by more than `fail_above` percent are marked `regressed`."""
+    rows = []
+    for section in ("stages", "end_to_end"):
+        a, b = before.get(section, {}), after.get(section, {})
+        for name in sorted(set(a) | set(b)):
+            row = {"section": section, "name": name}
+            for pct in ("p50_ms", "p95_ms"):
+                old, new = a.get(name, {}).get(pct), b.get(name, {}).get(pct)
+                row[pct] = (old, new)
+                row[pct.replace("_ms", "_change")] = round((new - old) / old * 100, 1) if old and new is not None else None
+            change = row["p95_change"]
+            row["regressed"] = fail_above is not None and change is not None and change > fail_above
+            rows.append(row)
+    return rows
+
+
+def _fmt(value) -> str:
+    return "-" if value is None else f"{value:.1f}"
+
+
+def _print_comparison(rows: List[dict]):
+    print(f"{'stage':<28} {'p50 before':>10} {'after':>9} {'Δ%':>7}   {'p95 before':>10} {'after':>9} {'Δ%':>7}")
+    for row in rows:
+        name = row["name"] if row["section"] == "stages" else f"e2e.{row['name']}"
+        (b50, a50), (b95, a95) = row["p50_ms"], row["p95_ms"]
+        flag = "  ✗" if row["regressed"] else ""
+        print(f"{name:<28} {_fmt(b50):>10} {_fmt(a50):>9} {_fmt(row['p50_change']):>7}   {_fmt(b95):>10} {_fmt(a95):>9} {_fmt(row['p95_change']):>7}{flag}")
+
+
+def _main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Replay captured traffic and compare per-stage latency between builds.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    run = sub.add_parser("run", help="replay a capture against this build")
+    run.add_argument("capture")
+    run.add_argument("--speed", type=float, default=1.0, help="divide recorded gaps between frames by this factor")
+    run.add_argument("--no-latency", action="store_true", help="answer dependency calls at once instead of after their recorded latency")
+    run.add_argument("--out", help="write the JSON report here (default: stdout)")
+    cmp = sub.add_parser("compare", help="compare two replay reports")
+    cmp.add_argument("before")
+    cmp.add_argument("after")
+    cmp.add_argument("--fail-above", type=float, help="exit 1 if any p95 grew by more than this many percent")
+    args = parser.parse_args(argv)
+
+    if args.command == "run":
+        # never record the replay itself
+        os.environ.pop("TRAFFIC_CAPTURE", None)
+        report = asyncio.run(Replay(args.capture, speed=args.speed, latency=not args.no_latency).run())
+        text = json.dumps(report, indent=2)
+        if args.out:
+            with open(args.out, "w", encoding="utf-8") as fh:
+                fh.write(text + "\n")
+            print(f"✓ Replayed {report['frames']} frames over {report['connections']} connections in {report['seconds']}s; report written to {args.out}")
+        else:
+            print(text)
+        return 0
+
+    with open(args.before, encoding="utf-8") as fh:
+        before = json.load(fh)
+    with open(args.after, encoding="utf-8") as fh:
+        after = json.load(fh)
+    rows = compare(before, after, args.fail_above)
+    _print_comparison(rows)
+    return 1 if any(row["regressed"] for row in rows) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(_main())
@@ -0,0 +1,128 @@
+"""
+Latency-aware model routing for persona completions.
+
+Every persona request used to go to gpt-4o. `ModelRouter.route` picks a
+model tier per request instead, from:
+
+  * the persona's entry in the routing table (default tier, which intents
+    need the full model, how short a prompt can be answered by the fast one)
+  * the prompt length
+  * the detected intent (regex heuristics, see `detect_intent`)
+  * how many completions are queued or running: when the completion slots
+    are saturated, requests that don't need the full model are sent to the
+    fast tier, whose latency is lower
+
+The chosen route (tier, model, intent, reasons) is stored in the reply's
+request metadata, and per-tier counts and latencies are reported in
+/health, so the savings can be measured.
+
+Configuration:
+  MODEL_TIER_FAST / MODEL_TIER_FULL   model names (gpt-4o-mini / gpt-4o)
+  ROUTE_BUSY_DEPTH                    queued + running completions at which
+                                      routing prefers the fast tier
+                                      (default: MAX_CONCURRENT_COMPLETIONS)
+  PERSONA_ROUTES                      JSON object merged over the table
+                                      below, e.g. {"Zeus": {"tier": "fast"}}
+"""
+
+import json
+import os
+import re
+from collections import defaultdict
+from typing import Dict, Optional
+
+FAST, FULL = "fast", "full"
+
+# Per-persona routing table.
+#   tier            tier for requests no rule below applies to
+#   fast_max_chars  prompts up to this length go to the fast tier
+#   fast_intents    intents the fast tier handles well
+#   full_intents    intents that always get the full model, even when busy
+PERSONA_ROUTES: Dict[str, dict] = {
+    "Zeus": {"tier": FULL, "fast_max_chars": 60, "fast_intents": ["quick"], "full_intents": ["analysis"]},
+    "Athena": {"tier": FULL, "fast_max_chars": 40, "fast_intents": ["quick"], "full_intents": ["code", "analysis"]},
+    "Hermes": {"tier": FAST, "fast_max_chars": 200, "fast_intents": ["quick", "chat", "copy"], "full_intents": ["analysis"]},
+}
+DEFAULT_ROUTE = {"tier": FULL, "fast_max_chars": 60, "fast_intents": ["quick"], "full_intents": ["code", "analysis"]}
+
+# Prompts at least this long carry enough material to need the full model
+LONG_PROMPT_CHARS = 1500
+
+INTENT_PATTERNS = [
+    # checked in order; the first match wins
+    ("code", re.compile(r"```|\b(?:debug|stack ?trace|traceback|exception|refactor|implement|regex|sql|compile|bug)\b", re.I)),
+    ("analysis", re.compile(r"\b(?:analy[sz]e|analysis|strategy|strategic|plan|roadmap|compare|trade-?offs?|pros and cons|step by step|in depth|forecast|evaluate)\b", re.I)),
+    ("quick", re.compile(r"\b(?:hashtags?|slogan|tagline|title|one[- ]liner|name (?:ideas|for)|emoji|synonyms?|translate|define|yes or no|tl;?dr)\b", re.I)),
+    ("copy", re.compile(r"\b(?:ad copy|caption|tweet|headline|subject line|blurb)\b", re.I)),
+]
+
+
+def detect_intent(text: str) -> str:
+    for intent, pattern in INTENT_PATTERNS:
+        if pattern.search(text):
+            return intent
+    return "chat"
+
+
+class ModelRouter:
+    def __init__(self, models: Dict[str, str], routes: Optional[Dict[str, dict]] = None, busy_depth: int = 8):
+        self.models = models
+        self.routes = routes if routes is not None else dict(PERSONA_ROUTES)
+        self.busy_depth = busy_depth
+        self._stats = defaultdict(lambda: {"requests": 0, "total_ms": 0.0, "tokens": 0})
+
+    @classmethod
+    def from_env(cls, slots: int) -> "ModelRouter":
+        routes = {p: dict(cfg) for p, cfg in PERSONA_ROUTES.items()}
+        for persona, overrides in json.loads(os.getenv("PERSONA_ROUTES", "{}")).items():
+            routes[persona] = {**routes.get(persona, DEFAULT_ROUTE), **overrides}
+        return cls(
+            models={FAST: os.getenv("MODEL_TIER_FAST", "gpt-4o-mini"), FULL: os.getenv("MODEL_TIER_FULL", "gpt-4o")},
+            routes=routes,
+            busy_depth=int(os.getenv("ROUTE_BUSY_DEPTH", str(slots))),
+        )
+
+    def route(self, persona: str, prompt: str, queue_depth: int = 0) -> dict:
+        """Pick a model for one completion; returns the route record."""
+        cfg = self.routes.get(persona, DEFAULT_ROUTE)
+        intent = detect_intent(prompt)
+        chars = len(prompt)
+        if intent in cfg["full_intents"]:
+            tier, reason = FULL, f"intent:{intent}"
+        elif chars >= LONG_PROMPT_CHARS:
+            tier, reason = FULL, "long_prompt"
+        elif intent in cfg["fast_intents"] and chars <= cfg["fast_max_chars"] * 4:
+            tier, reason = FAST, f"intent:{intent}"
+        elif chars <= cfg["fast_max_chars"]:
+            tier, reason = FAST, "short_prompt"
+        else:
+            tier, reason = cfg["tier"], "persona_default"
+        reasons = [reason]
+        if tier == FULL and queue_depth >= self.busy_depth and intent not in cfg["full_intents"]:
+            tier = FAST
+            reasons.append("busy")
+        return {
+            "tier": tier,
+            "model": self.models[tier],
+            "intent": intent,
+            "reasons": reasons,
+            "prompt_chars": chars,
+            "queue_depth": queue_depth,
+        }
+
+    def record(self, route: dict, latency_ms: float, tokens: int):
+        stats = self._stats[route["tier"]]
+        stats["requests"] += 1
+        stats["total_ms"] += latency_ms
+        stats["tokens"] += tokens or 0
+
+    def metrics(self) -> dict:
+        return {
+            tier: {
+                "model": self.models.get(tier),
+                "requests": s["requests"],
+                "avg_ms": round(s["total_ms"] / s["requests"], 1) if s["requests"] else 0.0,
+                "tokens": s["tokens"],
+            }
+            for tier, s in self._stats.items()
+        }
@@ -0,0 +1,172 @@
+"""
+Rolling per-session conversation summaries.
+
+Persona prompts can't carry a room's whole history, so each session keeps
+a compact summary of everything older than its last few turns. Every
+`every` messages a background job folds the `requests` rows created after
+the stored `covered_until` watermark into the previous summary and saves
+the result in `session_summaries`. The newest `recent_turns` rows are left
+out of the summary because prompts include them verbatim. Prompts carry
+every row the summary doesn't cover yet (at most `max_tail`), so messages
+between two refreshes are never lost, and the input-token cost of a prompt
+stays bounded however long the session runs.
+"""
+
+import asyncio
+from typing import Dict, Optional
+
+from ReplyChallenge import llm
+from ReplyChallenge.database import async_service as db
+from ReplyChallenge.logs import get_logger
+from ReplyChallenge.memory_index import parse_timestamp
+
+log = get_logger("summaries")
+
+SUMMARY_INSTRUCTIONS = (
+    "You maintain a running summary of a group chat between users and AI personas. "
+    "Update the current summary with the new messages. Keep names, decisions, open "
+    "questions, preferences and facts people shared; drop greetings and small talk. "
+    "Write plain prose in at most {max_words} words and return only the summary."
+)
+
+
+def history_messages(rows: list) -> list:
+    """Map `requests` rows to chat messages: the prompt is the user turn and
+    the stored reply (if any) the assistant turn."""
+    messages = []
+    for r in rows:
+        if r.get("prompt"):
+            messages.append({"role": "user", "content": r["prompt"]})
+        if r.get("response"):
+            messages.append({"role": "assistant", "content": r["response"]})
+    return messages
+
+
+def transcript(rows: list) -> str:
+    """Render `requests` rows as "speaker: text" lines for the summarizer."""
+    lines = []
+    for r in rows:
+        if r.get("prompt"):
+            lines.append(f"{r.get('username') or 'user'}: {r['prompt']}")
+        if r.get("response"):
+            persona = (r.get("metadata") or {}).get("persona") or "assistant"
+            lines.append(f"{persona}: {r['response']}")
+    return "\n".join(lines)
+
+
+class SessionSummarizer:
+    def __init__(
+        self,
+        every: int = 10,
+        recent_turns: int = 2,
+        batch_size: int = 50,
+        model: str = "gpt-4o-mini",
+        max_words: int = 200,
+        max_tail: Optional[int] = None,
+    ):
+        self.every = every
+        self.recent_turns = recent_turns
+        # the uncovered tail is normally under `every + recent_turns` rows;
+        # the cap only bites while refreshes are failing
+        self.max_tail = max_tail or every + recent_turns
+        self.batch_size = batch_size
+        self.model = model
+        self.max_words = max_words
+        self._summaries: Dict[str, dict] = {}
+        self._unsummarized: Dict[str, int] = {}
+        self._refreshing: set = set()
+
+    def note_message(self, session_id: str) -> bool:
+        """Count a new message; True when the session is due for a refresh."""
+        count = self._unsummarized.get(session_id, 0) + 1
+        if count >= self.every:
+            self._unsummarized[session_id] = 0
+            return True
+        self._unsummarized[session_id] = count
+        return False
+
+    async def _state(self, session_id: str) -> dict:
+        state = self._summaries.get(session_id)
+        if state is None:
+            row = await db.get_session_summary(session_id) or {}
+            state = {
+                "summary": row.get("summary") or "",
+                "covered_until": row.get("covered_until"),
+                "message_count": row.get("message_count") or 0,
+            }
+            self._summaries[session_id] = state
+        return state
+
+    async def get(self, session_id: str) -> str:
+        """Return the current summary for prompts ("" if there is none)."""
+        try:
+            return (await self._state(session_id))["summary"]
+        except Exception as e:
+            log.warning("loading summary for %s failed: %s", session_id, e)
+            return ""
+
+    async def context(self, session_id: str) -> tuple:
+        """The summary and the rows it doesn't cover yet, oldest first.
+
+        Reads one row more than `max_tail`, since the message being
+        answered is usually the newest.
+        """
+        state, rows = await asyncio.gather(
+            self._state(session_id),
+            db.get_session_history(session_id, limit=self.max_tail + 1),
+            return_exceptions=True,
+        )
+        if isinstance(rows, Exception):
+            raise rows
+        if isinstance(state, Exception):
+            log.warning("loading summary for %s failed: %s", session_id, state)
+            return "", rows
+        covered_until = parse_timestamp(state["covered_until"])
+        if covered_until is not None:
+            rows = [r for r in rows if (parse_timestamp(r.get("created_at")) or float("inf")) > covered_until]
+        return state["summary"], rows
+
+    async def refresh(self, session_id: str) -> Optional[str]:
+        """Fold the messages since the watermark into the summary. Runs as a
+        background job, so errors propagate and the job queue retries."""
+        if session_id in self._refreshing:
+            return None
+        self._refreshing.add(session_id)
+        try:
+            state = await self._state(session_id)
+            rows = await db.get_session_history(
+                session_id, limit=self.batch_size + self.recent_turns, after=state["covered_until"]
+            )
+            fold = rows[:max(0, len(rows) - self.recent_turns)]
+            # a persona's reply is written after its prompt row; stop at the
+            # last answered row so the watermark never passes a pending reply
+            answered = [i for i, r in enumerate(fold) if r.get("response")]
+            fold = fold[:answered[-1] + 1] if answered else []
+            if not fold:
+                return state["summary"]
+
+            summary = await self._summarize(state["summary"], fold)
+            covered_until = fold[-1]["created_at"]
+            message_count = state["message_count"] + len(fold)
+            await db.save_session_summary(session_id, summary, covered_until, message_count)
+            self._summaries[session_id] = {
+                "summary": summary,
+                "covered_until": covered_until,
+                "message_count": message_count,
+            }
+            log.info("summarized %s messages", len(fold), extra={"session_id": session_id})
+            return summary
+        finally:
+            self._refreshing.discard(session_id)
+
+    async def _summarize(self, previous: str, rows: list) -> str:
+        completion = await llm.chat(
+            model=self.model,
+            messages=[
+                {"role": "system", "content": SUMMARY_INSTRUCTIONS.format(max_words=self.max_words)},
+                {"role": "user", "content": f"Current summary:\n{previous or '(none yet)'}\n\nNew messages:\n{transcript(rows)}"},
+            ],
+            temperature=0.2,
+            max_tokens=self.max_words * 2,
+        )
+        return completion.choices[0].message.content.strip()
@@ -0,0 +1,78 @@
+import asyncio
+import json
+
+from ReplyChallenge.background import JobQueue
+
+
+def test_failed_jobs_are_retried_until_they_succeed():
+    attempts = []
+
+    async def flaky(value):
+        attempts.append(value)
+        if len(attempts) < 3:
+            raise ConnectionError("db down")
+
+    async def scenario():
+        jobs = JobQueue(workers=1, max_retries=3, retry_backoff=0.001)
+        jobs.register("flaky", flaky)
+        await jobs.start()
+        assert jobs.submit("flaky", value=1)
+        await asyncio.sleep(0.1)
+        await jobs.shutdown(timeout=1)
+        return jobs.metrics()["types"]["flaky"]
+
+    stats = asyncio.run(scenario())
+    assert attempts == [1, 1, 1]
+    assert stats["succeeded"] == 1 and stats["retried"] == 2 and stats["failed"] == 0
+
+
+def test_full_queue_drops_instead_of_blocking():
+    async def slow(value):
+        await asyncio.sleep(1)
+
+    async def scenario():
+        jobs = JobQueue(maxsize=1, workers=1)
+        jobs.register("slow", slow)
+        await jobs.start()
+        results = [jobs.submit("slow", value=i) for i in range(3)]
+        await jobs.shutdown(timeout=0)
+        return results, jobs.metrics()["types"]["slow"]
+
+    results, stats = asyncio.run(scenario())
+    assert results == [True, False, False]
+    assert stats["dropped"] == 2
+
+
+def test_shutdown_spools_pending_jobs_and_start_restores_them(tmp_path):
+    spool = tmp_path / "pending.jsonl"
+    seen = []
+
+    async def blocked(value):
+        await asyncio.sleep(10)
+
+    async def record(value):
+        seen.append(value)
+
+    async def first_run():
+        jobs = JobQueue(workers=1, spool_path=str(spool))
+        jobs.register("write", blocked)
+        await jobs.start()
+        for i in range(3):
+            jobs.submit("write", value=i)
+        await asyncio.sleep(0.01)
+        await jobs.shutdown(timeout=0.01)
+
+    async def second_run():
+        jobs = JobQueue(workers=1, spool_path=str(spool))
+        jobs.register("write", record)
+        await jobs.start()
+        await asyncio.sleep(0.01)
+        await jobs.shutdown(timeout=1)
+
+    asyncio.run(first_run())
+    spooled = [json.loads(line) for line in spool.read_text().splitlines()]
+    assert sorted(item["payload"]["value"] for item in spooled) == [0, 1, 2]
+
+    asyncio.run(second_run())
+    assert sorted(seen) == [0, 1, 2]
+    assert not spool.exists()
@@ -0,0 +1,73 @@
+import asyncio
+
+import pytest
+
+from ReplyChallenge.circuit_breaker import CircuitBreaker, CircuitOpenError
+
+
+async def ok():
+    return "ok"
+
+
+async def boom():
+    raise ConnectionError("down")
+
+
+def test_opens_after_failure_rate_and_rejects_fast():
+    async def scenario():
+        breaker = CircuitBreaker("test-open", min_calls=4, failure_rate_threshold=0.5, open_seconds=60)
+        await breaker.call(ok)
+        await breaker.call(ok)
+        for _ in range(2):
+            with pytest.raises(ConnectionError):
+                await breaker.call(boom)
+
+        assert breaker.state == "open"
+        with pytest.raises(CircuitOpenError):
+            await breaker.call(ok)
+        assert breaker.snapshot()["rejected"] == 1
+
+    asyncio.run(scenario())
+
+
+def test_half_open_probe_closes_or_reopens():
+    async def scenario():
+        breaker = CircuitBreaker("test-half-open", min_calls=1, open_seconds=0)
+        with pytest.raises(ConnectionError):
+            await breaker.call(boom)
+        assert breaker.state == "half_open"
+
+        with pytest.raises(ConnectionError):
+            await breaker.call(boom)
+        breaker.open_seconds = 0
+        assert breaker.state == "half_open"
+
+        assert await breaker.call(ok) == "ok"
+        assert breaker.state == "closed"
+
+    asyncio.run(scenario())
+
+
+def test_slow_calls_and_ignored_errors():
+    async def slow():
+        await asyncio.sleep(1)
+
+    async def bad_request():
+        raise ValueError("caller error")
+
+    async def scenario():
+        breaker = CircuitBreaker(
+            "test-timeout",
+            min_calls=1,
+            call_timeout=0.01,
+            counts_as_failure=lambda e: not isinstance(e, ValueError),
+        )
+        with pytest.raises(ValueError):
+            await breaker.call(bad_request)
+        assert breaker.state == "closed"
+
+        with pytest.raises(asyncio.TimeoutError):
+            await breaker.call(slow)
+        assert breaker.state == "open"
+
+    asyncio.run(scenario())
@@ -0,0 +1,137 @@
+import asyncio
+import json
+
+from ReplyChallenge.connections import ConnectionManager
+
+
+class FakeWebSocket:
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.sent = []
+        self.closed = False
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, text):
+        if self.fail:
+            raise RuntimeError("socket is dead")
+        self.sent.append(json.loads(text))
+
+    async def close(self):
+        self.closed = True
+
+
+def test_failed_send_evicts_and_broadcasts_user_left():
+    async def scenario():
+        manager = ConnectionManager()
+        alive, dead = FakeWebSocket(), FakeWebSocket(fail=True)
+        await manager.connect(alive, room="room")
+        await manager.connect(dead, room="room")
+        manager.set_username(dead, "bob")
+
+        await manager.broadcast_json({"type": "message", "text": "hi"})
+        await asyncio.sleep(0.01)
+
+        assert manager.active_connections == [alive]
+        assert dead.closed
+        assert any(f["type"] == "user.left" and f["username"] == "bob" for f in alive.sent)
+        await manager.stop()
+
+    asyncio.run(scenario())
+
+
+def test_idle_connections_are_reaped_and_others_pinged():
+    async def scenario():
+        manager = ConnectionManager(idle_timeout=5)
+        idle, active = FakeWebSocket(), FakeWebSocket()
+        idle_conn = await manager.connect(idle, room="room")
+        await manager.connect(active, room="room")
+        idle_conn.last_seen -= 10
+
+        await manager.reap_idle()
+        await asyncio.sleep(0.01)
+
+        assert manager.active_connections == [active]
+        assert "ping" in [frame["type"] for frame in active.sent]
+        await manager.stop()
+
+    asyncio.run(scenario())
+
+
+def test_resume_replays_only_missed_events_and_resyncs_old_gaps():
+    async def scenario():
+        manager = ConnectionManager(replay_size=3)
+        ws = FakeWebSocket()
+        await manager.connect(ws, room="room")
+        for i in range(5):
+            await manager.broadcast_json({"type": "message", "text": str(i)}, room="room")
+        await manager.broadcast_json({"type": "typing", "isTyping": True}, room="room", ephemeral=True)
+        await asyncio.sleep(0.01)
+        ws.sent.clear()
+
+        await manager.resume(ws, since=3)
+        await asyncio.sleep(0.01)
+        assert [frame["seq"] for frame in ws.sent] == [4, 5]
+
+        ws.sent.clear()
+        await manager.resume(ws, since=1)
+        await asyncio.sleep(0.01)
+        assert ws.sent[0]["type"] == "resync"
+        assert [frame["seq"] for frame in ws.sent[1:]] == [3, 4, 5]
+        await manager.stop()
+
+    asyncio.run(scenario())
+
+
+def test_connect_with_since_replays_before_live_broadcasts():
+    async def scenario():
+        manager = ConnectionManager()
+        for i in range(3):
+            await manager.broadcast_json({"type": "message", "text": str(i)}, room="room")
+        ws = FakeWebSocket()
+        await manager.connect(ws, room="room", since=1)
+        # broadcast before the writer has sent anything
+        await manager.broadcast_json({"type": "message", "text": "live"}, room="room")
+        await asyncio.sleep(0.01)
+        assert [(f["type"], f["seq"]) for f in ws.sent] == [("session", 3), ("message", 2), ("message", 3), ("message", 4)]
+        await manager.stop()
+
+    asyncio.run(scenario())
+
+
+def test_reconnecting_client_gets_missed_events_before_newer_ones(monkeypatch):
+    from fastapi.testclient import TestClient
+
+    from ReplyChallenge import main
+
+    async def no_op():
+        return {}
+
+    monkeypatch.setattr(main.readiness, "warm_up", no_op)
+    monkeypatch.setattr(main.readiness, "check", no_op)
+    room = main.manager.room_log("hackathon_public_room")
+
+    with TestClient(main.app) as client, client.websocket_connect("/ws") as bob:
+        assert bob.receive_json()["type"] == "session"
+        bob.send_text(json.dumps({"type": "join", "username": "bob"}))
+        assert bob.receive_json()["type"] == "user.joined"
+        with client.websocket_connect("/ws") as ann:
+            last_seq = ann.receive_json()["seq"]
+            ann.send_text(json.dumps({"type": "join", "username": "ann"}))
+            assert bob.receive_json()["type"] == "user.joined"
+        # ann drops before reading her own user.joined; she also misses her
+        # user.left and two later room events
+        assert bob.receive_json()["type"] == "user.left"
+        for text in ("one", "two"):
+            room.append({"type": "system", "text": text})
+
+        with client.websocket_connect(f"/ws?since={last_seq}") as ann:
+            assert ann.receive_json()["type"] == "session"
+            ann.send_text(json.dumps({"type": "join", "username": "ann"}))
+            frames = [ann.receive_json() for _ in range(5)]
+            assert [(f["type"], f.get("username") or f["text"]) for f in frames] == [
+                ("user.joined", "ann"), ("user.left", "ann"), ("system", "one"), ("system", "two"), ("user.joined", "ann"),
+            ]
+            # seqs only grow, so a client deduping on `seq <= lastSeq` keeps every frame
+            assert [f["seq"] for f in frames] == [last_seq + i for i in range(1, 6)]
@@ -0,0 +1,54 @@
+import asyncio
+import json
+
+import httpx
+
+from ReplyChallenge.database import async_service, client
+
+
+def test_async_client_is_built_once_with_the_configured_pool(monkeypatch):
+    monkeypatch.setattr(client, "_env_loaded", True)
+    monkeypatch.setattr(client, "_async_client", None)
+    monkeypatch.delenv("SUPABASE_URL", raising=False)
+    assert client.get_async_client() is None
+
+    monkeypatch.setenv("SUPABASE_URL", "https://example.supabase.co/")
+    monkeypatch.setenv("SUPABASE_KEY", "anon-key")
+    monkeypatch.setenv("SUPABASE_POOL_MAX_CONNECTIONS", "7")
+    monkeypatch.setenv("SUPABASE_POOL_MAX_KEEPALIVE", "3")
+    monkeypatch.setenv("SUPABASE_POOL_KEEPALIVE_EXPIRY", "5")
+    pooled = client.get_async_client()
+    assert pooled is client.get_async_client()
+    pool = pooled.session._transport._pool
+    assert (pool._max_connections, pool._max_keepalive_connections, pool._keepalive_expiry) == (7, 3, 5.0)
+    assert str(pooled.session.base_url) == "https://example.supabase.co/rest/v1/"
+    assert pooled.session.headers["Authorization"] == "Bearer anon-key"
+
+    asyncio.run(client.close_async_client())
+    assert client._async_client is None and pooled.session.is_closed
+
+
+def test_service_calls_share_the_client_without_a_thread_pool_cap(monkeypatch):
+    in_flight = peak = 0
+
+    async def handler(request):
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        await asyncio.sleep(0.05)
+        in_flight -= 1
+        row = json.loads(request.content)
+        return httpx.Response(201, json=[{"id": row["prompt"], **row}])
+
+    pooled = client.PooledPostgrestClient("http://db.invalid/rest/v1", headers={}, timeout=5, limits=httpx.Limits(max_connections=20))
+    pooled.session = httpx.AsyncClient(base_url="http://db.invalid/rest/v1", transport=httpx.MockTransport(handler))
+    monkeypatch.setattr(async_service, "get_async_client", lambda: pooled)
+
+    async def scenario():
+        return await asyncio.gather(*(async_service.create_request_entry(f"msg {i}", "room", "ann") for i in range(20)))
+
+    rows = asyncio.run(scenario())
+    assert [r["id"] for r in rows] == [f"msg {i}" for i in range(20)]
+    assert rows[0]["session_id"] == "room" and rows[0]["username"] == "ann"
+    # the old executor ran five queries at a time
+    assert peak == 20
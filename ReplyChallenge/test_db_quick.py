@@ -5,7 +5,7 @@ Use this to quickly verify your database setup before running full integration t
 
 import os
 from dotenv import load_dotenv
-from database.service import verify_database_connection, log_chat_to_db, get_session_history
+from database.service import verify_database_connection, log_chat_to_db, get_session_history, add_memory, find_similar_memories
 import uuid
 
 load_dotenv()
@@ -54,7 +54,6 @@ def quick_test():
                 print(f"      - Response: {msg.get('response')}")
                 print(f"      - Created: {msg.get('created_at')}")
             print()
-            return True
         else:
             print("   ✗ No messages found\n")
             return False
@@ -62,6 +61,23 @@ def quick_test():
         print(f"   ✗ Error: {e}\n")
         return False
 
+    # Test 4: Vector memory search (memory table + match_memory RPC)
+    print("4️⃣  Searching memories with match_memory...")
+    try:
+        near, far = [1.0] + [0.0] * 1535, [0.0, 1.0] + [0.0] * 1534
+        add_memory("quick test memory", near, session_id=session_id, username="QuickTest")
+        add_memory("quick test memory (other user)", near, session_id=session_id, username="SomeoneElse")
+        matches = find_similar_memories(near, 5, threshold=0.9, session_id=session_id, username="QuickTest")
+        unrelated = find_similar_memories(far, 5, threshold=0.9, session_id=session_id, username="QuickTest")
+        if [m.get("content") for m in matches] == ["quick test memory"] and not unrelated:
+            print(f"   ✓ Found only this user's memory (similarity {matches[0].get('similarity'):.3f})\n")
+            return True
+        print(f"   ✗ Unexpected matches: {matches} / {unrelated}\n")
+        return False
+    except Exception as e:
+        print(f"   ✗ Error: {e} (did you run supabase_setup.sql?)\n")
+        return False
+
 if __name__ == "__main__":
     print("\n🚀 Starting Supabase connection test...\n")
     
@@ -0,0 +1,92 @@
+import asyncio
+import gzip
+import json
+from types import SimpleNamespace
+
+from fastapi.testclient import TestClient
+
+from ReplyChallenge.database import async_service
+from ReplyChallenge.export import ndjson_stream
+
+ROWS = [{"id": f"id-{i:02d}", "created_at": f"2024-05-01T10:00:0{i // 3}+00:00", "prompt": f"message {i}"} for i in range(7)]
+
+
+def test_export_pages_continue_after_the_last_key(fake_db):
+    queries = []
+
+    async def fake_execute(query):
+        params = query.params
+        queries.append(params)
+        rows = ROWS
+        if "or" in params:  # emulate the keyset condition from the last row of the previous page
+            last = next(r for r in ROWS if f'id.gt.{r["id"]}' in params["or"])
+            rows = [r for r in ROWS if (r["created_at"], r["id"]) > (last["created_at"], last["id"])]
+        return SimpleNamespace(data=[dict(r) for r in rows[: int(params["limit"])]])
+
+    fake_db(fake_execute)
+
+    async def scenario():
+        return [page async for page in async_service.export_pages("requests", session_id="room", since="2024-05-01T00:00:00+00:00", page_size=3)]
+
+    pages = asyncio.run(scenario())
+    assert [len(p) for p in pages] == [3, 3, 1] and [r["id"] for p in pages for r in p] == [r["id"] for r in ROWS]
+    assert queries[0]["order"] == "created_at,id" and queries[0]["session_id"] == "eq.room" and "or" not in queries[0]
+    assert queries[1]["or"] == '(created_at.gt."2024-05-01T10:00:00+00:00",and(created_at.eq."2024-05-01T10:00:00+00:00",id.gt.id-02))'
+
+
+def test_ndjson_stream_gzip_and_error_trailer():
+    async def pages():
+        yield ROWS[:3]
+        yield ROWS[3:]
+        raise RuntimeError("connection reset")
+
+    async def collect(compress):
+        return b"".join([chunk async for chunk in ndjson_stream(pages(), compress=compress)])
+
+    plain = asyncio.run(collect(False))
+    assert plain == gzip.decompress(asyncio.run(collect(True)))
+    lines = [json.loads(line) for line in plain.decode().splitlines()]
+    assert lines[:-1] == ROWS and lines[-1] == {"error": "connection reset", "rows": 7}
+
+
+def test_export_endpoint_filters_and_gzip(monkeypatch):
+    from ReplyChallenge import main
+
+    calls = []
+
+    async def export_pages(table, **filters):
+        calls.append((table, filters))
+        for start in range(0, len(ROWS), filters["page_size"]):
+            yield ROWS[start:start + filters["page_size"]]
+
+    monkeypatch.setenv("ADMIN_TOKEN", "t")
+    monkeypatch.setattr(main.db, "export_pages", export_pages)
+    client = TestClient(main.app)
+    auth = {"Authorization": "Bearer t"}
+
+    assert client.get("/admin/export/memory", headers=auth).status_code == 404
+    # a page is one query through the database breaker
+    assert client.get(f"/admin/export/facts?page_size={main.EXPORT_MAX_PAGE_SIZE + 1}", headers=auth).status_code == 422
+    response = client.get("/admin/export/facts?username=ann&since=2024-05-01T00:00:00Z&page_size=2&gzip=true", headers=auth)
+    assert response.status_code == 200 and response.headers["content-type"] == "application/gzip"
+    assert [json.loads(line) for line in gzip.decompress(response.content).splitlines()] == ROWS
+    assert calls[-1] == ("facts", {"session_id": None, "username": "ann", "user_id": None, "since": "2024-05-01T00:00:00+00:00", "until": None, "page_size": 2})
+
+
+def test_pages_are_fetched_as_the_client_reads():
+    fetched = []
+
+    async def pages():
+        for start in range(0, len(ROWS), 2):
+            fetched.append(start)
+            yield ROWS[start:start + 2]
+
+    async def scenario():
+        stream = ndjson_stream(pages())
+        first = await anext(stream)
+        seen = len(fetched)
+        rest = [chunk async for chunk in stream]
+        return first, seen, rest
+
+    first, seen, rest = asyncio.run(scenario())
+    assert first == b"".join(json.dumps(r).encode() + b"\n" for r in ROWS[:2]) and seen == 1 and len(rest) == 3
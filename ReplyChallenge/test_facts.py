@@ -0,0 +1,95 @@
+import asyncio
+from types import SimpleNamespace
+
+from fastapi.testclient import TestClient
+
+from ReplyChallenge.database import async_service
+
+FACTS = [{"id": f"f{i}", "username": "ann", "fact_type": "name", "value": f"v{i}", "updated_at": "2024-05-01T10:00:00+00:00"} for i in range(3)]
+
+
+def fake_database(fake_db, rows=FACTS):
+    queries = []
+
+    async def fake_execute(query):
+        queries.append(query)
+        return SimpleNamespace(data=[dict(r) for r in rows])
+
+    fake_db(fake_execute)
+    return queries
+
+
+def test_list_queries_send_one_combined_order(fake_db):
+    queries = fake_database(fake_db)
+
+    async def scenario():
+        await async_service.get_facts_for_user(None, "ann", limit=2, offset=4)
+        await async_service.get_facts_for_user(None, "ann", offset=4)
+        await async_service.list_memories(session_id="room", limit=10, newest_first=True)
+        await async_service.list_memory_partitions(page_size=10)
+
+    asyncio.run(scenario())
+    page, rest, memories, partitions = (q.params for q in queries)
+    assert page.get_list("order") == ["created_at,id"] and (page["offset"], page["limit"]) == ("4", "2")
+    assert rest.get_list("order") == ["created_at,id"] and rest["offset"] == "4" and "limit" not in rest
+    assert memories.get_list("order") == ["created_at.desc,id.desc"]
+    assert queries[-1].path == "/memory_partitions" and partitions.get_list("order") == ["session_id,username"] and (partitions["offset"], partitions["limit"]) == ("0", "10")
+
+
+def test_bulk_delete_and_patch_run_one_statement_each(fake_db):
+    from ReplyChallenge import main
+
+    queries = fake_database(fake_db)
+    client = TestClient(main.app)
+
+    assert client.delete("/api/facts?ids=f1&ids=f2").json()["ok"]
+    response = client.patch("/api/facts", json={"ids": ["f1", "f2"], "updates": {"value": "x"}})
+    assert response.json()["ok"]
+    assert client.patch("/api/facts", json={"ids": [], "updates": {"value": "x"}}).status_code == 400
+    assert client.patch("/api/facts", json={"ids": ["f1"]}).status_code == 400
+
+    delete, patch = queries
+    assert (delete.http_method, delete.path, delete.params["id"]) == ("PATCH", "/facts", "in.(f1,f2)")
+    assert delete.json["active"] is False
+    assert (patch.http_method, patch.params["id"], patch.json["value"]) == ("PATCH", "in.(f1,f2)", "x")
+
+
+def test_unchanged_facts_get_304(fake_db):
+    from ReplyChallenge import main
+
+    rows = [dict(f) for f in FACTS[:2]]
+    fake_database(fake_db, rows)
+    client = TestClient(main.app)
+
+    first = client.get("/api/facts?username=ann&limit=2")
+    etag = first.headers["etag"]
+    assert first.status_code == 200 and first.json()["next_offset"] == 2
+
+    again = client.get("/api/facts?username=ann&limit=2", headers={"If-None-Match": etag})
+    assert again.status_code == 304 and again.content == b"" and again.headers["etag"] == etag
+    # a different page has its own tag
+    assert client.get("/api/facts?username=ann&limit=2&offset=2", headers={"If-None-Match": etag}).status_code == 200
+
+    rows[0]["updated_at"] = "2024-05-02T10:00:00+00:00"
+    changed = client.get("/api/facts?username=ann&limit=2", headers={"If-None-Match": etag})
+    assert changed.status_code == 200 and changed.headers["etag"] != etag
+
+
+def test_saved_fact_is_confirmed_once_written(fake_db, monkeypatch):
+    from ReplyChallenge import main
+
+    queries = fake_database(fake_db)
+    sent = []
+
+    async def send_to_user(username, obj):
+        sent.append((username, obj["text"], len(queries)))
+
+    monkeypatch.setattr(main.manager, "send_to_user", send_to_user)
+    fact = {"user_id": None, "request_id": "r1", "fact_type": "name", "value": "Ann", "username": "ann"}
+    asyncio.run(main.save_fact(**fact))
+    # after the lookup and the update
+    assert sent == [("ann", "Saved: name = Ann", 2)]
+
+    monkeypatch.setattr(async_service, "get_async_client", lambda: None)
+    asyncio.run(main.save_fact(**fact))
+    assert len(sent) == 1
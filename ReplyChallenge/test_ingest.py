@@ -0,0 +1,115 @@
+import asyncio
+
+import pytest
+from fastapi.testclient import TestClient
+
+from ReplyChallenge.ingest import DocumentTooLarge, TextChunker, ingest_document
+
+DOC = """# Architecture
+
+The gateway terminates TLS and forwards websocket frames.
+
+## Storage
+
+Memories live in Postgres with pgvector. Facts are in their own table.
+
+""" + "Sentence number %d is about caching. " * 60
+
+
+def chunk_all(text, piece=7, **kwargs):
+    chunker = TextChunker(**kwargs)
+    data = text.encode("utf-8")
+    chunks = []
+    for start in range(0, len(data), piece):  # splits multi-byte characters too
+        chunks += chunker.feed(data[start:start + piece])
+    return chunks + chunker.close()
+
+
+def test_chunks_follow_paragraphs_and_headings():
+    text = DOC % tuple(range(60))
+    chunks = chunk_all(text, max_chars=300, title="Notes")
+    assert chunks[0] == "[Notes]\n# Architecture\n\nThe gateway terminates TLS and forwards websocket frames."
+    assert chunks[1].startswith("[Notes]\n## Storage\n\nMemories live in Postgres")
+    # the long paragraph is split at sentence boundaries and keeps its section
+    rest = chunks[2:]
+    assert rest and all(c.startswith("[Notes > Storage]\nSentence number") for c in rest)
+    assert all(len(c.split("\n", 1)[1]) <= 300 for c in rest)
+    assert " ".join(c.split("\n", 1)[1] for c in rest) == ("Sentence number %d is about caching. " * 60 % tuple(range(60))).strip()
+
+
+def test_unicode_and_unbroken_text_stay_bounded():
+    assert chunk_all("Café ☕ notes\n\nnaïve") == ["Café ☕ notes\n\nnaïve"]
+    chunker = TextChunker(max_chars=100)
+    out = []
+    for _ in range(100):
+        out += chunker.feed(b"word " * 20)
+        assert len(chunker._buffer) <= 400
+    out += chunker.close()
+    assert all(len(c) <= 100 for c in out) and sum(c.count("word") for c in out) == 2000
+
+
+def test_ingest_embeds_and_inserts_in_batches_as_the_body_arrives():
+    events = []
+
+    async def body():
+        for i in range(10):
+            events.append(("read", i))
+            yield (f"Paragraph {i}.\n\n").encode()
+
+    async def embed_many(texts):
+        return [[float(len(t))] for t in texts]
+
+    async def insert_many(texts, vectors):
+        events.append(("insert", len(texts)))
+        return len(texts)
+
+    progress = asyncio.run(ingest_document(body(), embed_many, insert_many, {}, batch_size=3, max_chars=12))
+    assert progress["status"] == "done" and progress["chunks"] == 10 and progress["inserted"] == 10 and progress["batches"] == 4
+    # the first batch is stored before the rest of the body is read
+    assert events.index(("insert", 3)) < events.index(("read", 5))
+
+
+def test_ingest_rejects_oversized_documents():
+    async def body():
+        while True:
+            yield b"x" * 1000
+
+    async def noop(*args):
+        return 0
+
+    progress = {}
+    with pytest.raises(DocumentTooLarge):
+        asyncio.run(ingest_document(body(), noop, noop, progress, max_bytes=5000))
+    assert progress["status"] == "failed" and progress["bytes"] == 6000
+
+
+def test_ingest_endpoint_streams_into_the_shared_room_partition(monkeypatch):
+    from ReplyChallenge import main
+
+    inserted = []
+
+    async def embed_many(texts):
+        return [[1.0, 0.0] for _ in texts]
+
+    async def add_memories(rows):
+        inserted.extend(rows)
+        return len(rows)
+
+    monkeypatch.setenv("ADMIN_TOKEN", "t")
+    monkeypatch.setattr(main.llm, "get_client", lambda: object())
+    monkeypatch.setattr(main.llm, "embed_many", embed_many)
+    monkeypatch.setattr(main.db, "add_memories", add_memories)
+    main.memory_store.partition("room-1", main.DOCUMENTS_USERNAME)
+
+    client = TestClient(main.app)
+    response = client.post(
+        "/admin/memory/documents?session_id=room-1&title=Deck&ingest_id=deck",
+        content=b"# Plan\n\nShip the ENG-4821 fix first.\n\nThen the launch.",
+        headers={"Authorization": "Bearer t"},
+    )
+    assert response.status_code == 200 and response.json()["progress"]["inserted"] == 1
+    assert inserted[0]["session_id"] == "room-1" and inserted[0]["username"] == "#documents"
+    found = main.search_memories("what about ENG-4821?", [1.0, 0.0], "room-1", "ann")
+    assert found and found[0]["content"].startswith("[Deck]\n# Plan")
+    listing = client.get("/admin/memory/documents", headers={"Authorization": "Bearer t"}).json()["data"]
+    assert [p["id"] for p in listing][-1] == "deck"
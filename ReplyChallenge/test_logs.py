@@ -0,0 +1,72 @@
+import asyncio
+import io
+import json
+import logging
+import queue
+
+from ReplyChallenge import logs
+
+
+def records(stream):
+    logs.stop_logging()  # flushes the queue
+    return [json.loads(line) for line in stream.getvalue().splitlines()]
+
+
+def test_records_are_json_and_carry_the_bound_request():
+    stream = io.StringIO()
+    logs.setup_logging(level="DEBUG", fmt="json", sample_rate=1.0, stream=stream)
+    log = logs.get_logger("test")
+
+    async def scenario():
+        logs.bind(request_id="req-1", session_id="room")
+
+        async def persona():
+            log.info("reply ready", extra={"persona": "Zeus", "tokens": 12})
+
+        await asyncio.create_task(persona())
+        logs.bind(session_id="room")
+        try:
+            raise ValueError("boom")
+        except ValueError:
+            log.exception("failed %s", "badly")
+
+    asyncio.run(scenario())
+    first, second = records(stream)
+    assert first["msg"] == "reply ready" and first["request_id"] == "req-1" and first["session_id"] == "room"
+    assert first["persona"] == "Zeus" and first["tokens"] == 12 and first["level"] == "INFO"
+    assert "request_id" not in second and second["msg"] == "failed badly" and "ValueError: boom" in second["exc"]
+
+
+def test_sampling_keeps_whole_requests_and_all_warnings():
+    stream = io.StringIO()
+    logs.setup_logging(level="INFO", fmt="json", sample_rate=0.5, stream=stream)
+    log = logs.get_logger("test")
+    kept = [f"req-{i}" for i in range(40) if logs.SamplingFilter(0.5).keep(f"req-{i}")]
+    assert 0 < len(kept) < 40
+
+    for i in range(40):
+        logs.bind(request_id=f"req-{i}")
+        log.info("received")
+        log.info("answered")
+        log.warning("slow")
+    logs.bind()
+    log.info("outside any request")
+    sampled_out = logs.metrics()["sampled_out"]
+
+    out = records(stream)
+    infos = [r["request_id"] for r in out if r["level"] == "INFO" and "request_id" in r]
+    assert infos == [rid for rid in kept for _ in range(2)]
+    assert sum(r["level"] == "WARNING" for r in out) == 40
+    assert out[-1]["msg"] == "outside any request"
+    assert sampled_out == 2 * (40 - len(kept))
+
+
+def test_full_queue_drops_instead_of_blocking():
+    handler = logs.DroppingQueueHandler(queue.Queue(maxsize=2))
+    log = logging.getLogger("replychallenge.test.dropping")
+    log.propagate = False
+    log.addHandler(handler)
+    for i in range(5):
+        log.warning("message %d", i)
+    assert handler.queue.qsize() == 2 and handler.dropped == 3
+    assert handler.queue.get_nowait().msg == "message 0"
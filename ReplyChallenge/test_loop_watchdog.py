@@ -0,0 +1,41 @@
+import asyncio
+import time
+
+from ReplyChallenge.loop_watchdog import LoopWatchdog
+
+
+def blocking_parse():
+    time.sleep(0.25)
+
+
+def test_stall_is_reported_with_the_blocking_frame():
+    async def scenario():
+        watchdog = LoopWatchdog(threshold=0.08, interval=0.01)
+        watchdog.start()
+        await asyncio.sleep(0.05)
+        blocking_parse()
+        await asyncio.sleep(0.05)
+        await watchdog.stop()
+        return watchdog.metrics()
+
+    stats = asyncio.run(scenario())
+    assert stats["stalls"] == 1
+    event = stats["recent"][0]
+    assert "blocking_parse" in event["culprit"] and "test_loop_watchdog.py" in event["culprit"]
+    assert event["lag_ms"] >= 150
+    assert any("time.sleep" in line for line in event["stack"])
+    assert stats["top_culprits"][0][1] == 1 and stats["lag_max_ms"] >= 150
+
+
+def test_short_callbacks_are_not_stalls():
+    async def scenario():
+        watchdog = LoopWatchdog(threshold=0.1, interval=0.01)
+        watchdog.start()
+        for _ in range(10):
+            time.sleep(0.005)
+            await asyncio.sleep(0.005)
+        await watchdog.stop()
+        return watchdog.metrics()
+
+    stats = asyncio.run(scenario())
+    assert stats["stalls"] == 0 and stats["lag_p50_ms"] < 100
@@ -0,0 +1,38 @@
+import asyncio
+
+from ReplyChallenge import memory_compaction
+from ReplyChallenge.memory_compaction import cluster_duplicates
+
+
+def row(id, embedding, hits=1):
+    return {"id": id, "content": id, "embedding": embedding, "hit_count": hits}
+
+
+def test_clusters_near_duplicates_and_keeps_most_used_then_newest():
+    rows = [
+        row("a1", [1.0, 0.0]),
+        row("b", [0.0, 1.0]),
+        row("a2", [0.999, 0.02], hits=3),
+        row("a3", [0.998, 0.03]),
+        row("c1", [0.7, 0.7]),
+        row("c2", [0.71, 0.70]),
+    ]
+    clusters = {keep["id"]: sorted(r["id"] for r in dupes) for keep, dupes in cluster_duplicates(rows, 0.99)}
+    assert clusters == {"a2": ["a1", "a3"], "c2": ["c1"]}
+
+
+def test_no_clusters_below_threshold():
+    assert cluster_duplicates([row("a", [1.0, 0.0]), row("b", [0.0, 1.0])], 0.9) == []
+
+
+def test_partition_is_read_one_small_page_at_a_time(monkeypatch):
+    rows = [{**row(f"r{i}", [1.0, float(i)]), "created_at": f"2024-01-01T00:00:{i:02d}"} for i in range(5)]
+    limits = []
+
+    async def list_memories(session_id=None, username=None, limit=1000, after=None, columns=None):
+        limits.append(limit)
+        return [r for r in rows if after is None or r["created_at"] > after][:limit]
+
+    monkeypatch.setattr(memory_compaction.db, "list_memories", list_memories)
+    asyncio.run(memory_compaction.compact_partition("room", "ann", 0.99, dry_run=True, page_size=2))
+    assert limits == [2, 2, 2]
@@ -0,0 +1,196 @@
+import asyncio
+import time
+
+from ReplyChallenge.memory_index import BM25Index, MemoryStore, is_trivial, rrf_fuse, tokenize
+
+DAY = 86400.0
+
+
+def test_tokenize_keeps_identifiers_and_their_parts():
+    tokens = tokenize("Is ENG-4821 fixed in parse_config?")
+    assert "eng-4821" in tokens and "4821" in tokens
+    assert "parse_config" in tokens and "config" in tokens
+    assert "is" not in tokens
+
+
+def test_bm25_ranks_exact_identifier_first_and_supports_removal():
+    index = BM25Index()
+    index.add(1, "deploy notes for ENG-4821 rollout")
+    index.add(2, "deploy notes for ENG-4822 rollout")
+    index.add(3, "lunch plans")
+    assert index.search("status of ENG-4822")[0][0] == 2
+
+    index.remove(2)
+    assert 2 not in index
+    assert all(doc_id != 2 for doc_id, _ in index.search("ENG-4822"))
+
+
+def test_rrf_rewards_agreement_between_rankings():
+    fused = rrf_fuse([["a", "b", "c"], ["b", "d"]])
+    assert fused[0][0] == "b"
+    assert {doc_id for doc_id, _ in fused} == {"a", "b", "c", "d"}
+
+
+def test_search_fuses_vector_and_keyword_hits():
+    store = MemoryStore()
+    store.add("m1", "my order SKU00042 never arrived", [0.0, 1.0], "room", "ann")
+    store.add("m2", "I love hiking", [1.0, 0.0], "room", "ann")
+    results = store.search("where is SKU00042", [1.0, 0.1], "room", "ann", k=5)
+    by_id = {r["id"]: r for r in results}
+    assert set(by_id) == {"m1", "m2"}
+    assert by_id["m2"]["similarity"] > by_id["m1"]["similarity"]
+    assert results[0]["id"] == "m1"  # ranked by both vector and keyword search
+
+
+def test_search_is_limited_to_the_askers_partition():
+    store = MemoryStore()
+    store.add("ann-1", "ann's secret project ENG-1", [1.0, 0.0], "room", "ann")
+    store.add("bob-1", "bob's secret project ENG-1", [1.0, 0.0], "room", "bob")
+    store.add("ann-2", "ann in another room ENG-1", [1.0, 0.0], "other", "ann")
+    assert [r["id"] for r in store.search("ENG-1", [1.0, 0.0], "room", "ann")] == ["ann-1"]
+    assert store.search("ENG-1", [1.0, 0.0], "room", "carol") == []
+
+
+def test_partition_cap_evicts_oldest_and_lru_partitions():
+    store = MemoryStore(partition_cap=2, max_partitions=2)
+    for i in range(3):
+        store.add(i, f"note {i}", [1.0, float(i)], "room", "ann")
+    part = store.partition("room", "ann", create=False)
+    assert 0 not in part and 1 in part and 2 in part and store.evicted == 1
+    assert {r["id"] for r in store.search("note", [0.0, 1.0], "room", "ann")} == {1, 2}
+
+    store.add("b", "bob", [1.0, 0.0], "room", "bob")
+    store.partition("room", "ann")  # touch: bob's is now least recently used
+    store.add("c", "carol", [1.0, 0.0], "room", "carol")
+    assert set(store.partitions) == {("room", "ann"), ("room", "carol")}
+
+
+def test_near_duplicate_only_checks_recent_window():
+    store = MemoryStore()
+    store.add("old", "I live in Berlin", [1.0, 0.0], "room", "ann")
+    store.add("new", "my cat is called Tom", [0.0, 1.0], "room", "ann")
+    part = store.partition("room", "ann")
+    assert part.near_duplicate([0.99, 0.05], threshold=0.95, window=5)[0] == "old"
+    assert part.near_duplicate([0.99, 0.05], threshold=0.95, window=1) is None
+    assert part.near_duplicate([0.7, 0.7], threshold=0.95, window=5) is None
+    assert part.hit("old") == 2
+
+
+def test_trivial_chatter_is_not_remembered():
+    assert is_trivial("ok") and is_trivial("Thanks!") and is_trivial("ping")
+    assert not is_trivial("I moved to Berlin last week")
+    assert not is_trivial("ENG-4821 is broken")
+    for short in ("I'm vegan", "call me Bob", "use port 8080"):
+        assert not is_trivial(short)
+    assert is_trivial("I'm vegan", min_chars=12)
+
+
+def test_cap_evicts_the_coldest_not_the_oldest():
+    store = MemoryStore(partition_cap=20)
+    now = time.time()
+    for i in range(20):
+        # the oldest ones were recalled often; the others were last seen 60-41 days ago
+        store.add(i, f"note {i}", [1.0, float(i)], "room", "ann", hits=20 if i < 2 else 1, seen=now - (60 - i) * DAY)
+    store.add("new", "fresh note", [0.0, 1.0], "room", "ann")
+    part = store.partition("room", "ann")
+    assert 0 in part and 1 in part and 2 not in part and "new" in part
+    assert part.cold and store.evicted == 1
+
+
+def test_search_weights_relevance_by_recency_and_use():
+    store = MemoryStore()
+    now = time.time()
+    store.add("stale", "standup is at 9:30", [1.0, 0.0], "room", "ann", seen=now - 365 * DAY)
+    store.add("fresh", "standup is at 9:30", [1.0, 0.0], "room", "ann")
+    store.add("used", "standup moved to 10:00", [0.9, 0.1], "room", "ann", hits=30, seen=now - 365 * DAY)
+    ranked = store.search("standup", [1.0, 0.0], "room", "ann", k=3)
+    # a heavily used memory outranks a fresh one of similar relevance; an unused stale one comes last
+    assert [r["id"] for r in ranked] == ["used", "fresh", "stale"] and {r["tier"] for r in ranked} == {"hot"}
+    # recalled memories become fresh again
+    assert store.touch("room", "ann", ["stale", "elsewhere"]) == ["stale"]
+    assert store.partition("room", "ann").hits["stale"] == 2
+
+
+def test_byte_budget_demotes_coldest_memories_across_partitions():
+    now = time.time()
+    store = MemoryStore(max_bytes=10_000)
+    for i in range(40):
+        user = "ann" if i % 2 else "bob"
+        store.add(f"{user}-{i}", "x" * 100, [1.0] * 64, "room", user, seen=now - (40 - i) * DAY)
+    assert store.nbytes() <= 10_000 and store.demoted > 0
+    kept = [memory_id for part in store.partitions.values() for memory_id in part.contents]
+    # the newest memories of both users are the ones kept
+    assert "ann-39" in kept and "bob-38" in kept and "bob-0" not in kept
+    assert all(part.cold for part in store.partitions.values())
+
+
+def test_cold_rows_are_fused_with_the_hot_partition():
+    store = MemoryStore()
+    store.add("hot", "project kickoff notes", [1.0, 0.0], "room", "ann")
+    cold_rows = [
+        {"id": "archived", "content": "kickoff budget was 40k", "similarity": 0.8, "hit_count": 3, "created_at": "2023-01-01T00:00:00+00:00"},
+        {"id": "hot", "content": "project kickoff notes", "similarity": 0.7},
+    ]
+    found = store.search("kickoff", [0.8, 0.6], "room", "ann", k=5, cold_rows=cold_rows)
+    assert {(r["id"], r["tier"]) for r in found} == {("hot", "hot"), ("archived", "cold")}
+    assert [r["id"] for r in store.search("kickoff", [1.0, 0.0], "room", "carol", cold_rows=cold_rows[:1])] == ["archived"]
+
+
+def test_recall_searches_the_cold_tier_only_when_hot_matches_are_weak(monkeypatch):
+    from ReplyChallenge import main
+
+    calls, touched = [], []
+
+    async def find_similar_memories(embedding, match_count, threshold, session_id=None, username=None):
+        calls.append(username)
+        return [{"id": "archived", "content": "the budget was 40k", "similarity": 0.6, "hit_count": 1}]
+
+    monkeypatch.setattr(main.db, "find_similar_memories", find_similar_memories)
+    monkeypatch.setattr(main.jobs, "submit", lambda job_type, **payload: touched.append((job_type, payload)))
+    part = main.memory_store.partition("tier-room", "ann")
+    main.memory_store.add("hot", "weekly budget review", [1.0, 0.0], "tier-room", "ann")
+
+    found = asyncio.run(main.recall_memories("budget", [1.0, 0.0], "tier-room", "ann"))
+    assert calls == [] and [r["id"] for r in found] == ["hot"] and part.hits["hot"] == 2
+
+    part.cold = True
+    found = asyncio.run(main.recall_memories("budget", [0.0, 1.0], "tier-room", "ann"))
+    assert calls == ["ann"] and {r["id"] for r in found} == {"hot", "archived"}
+    assert touched[-1] == ("memory.touch", {"memory_ids": [r["id"] for r in found]})
+
+
+def test_slow_partition_load_is_paged_inside_the_breaker_timeout(fake_db, monkeypatch):
+    from types import SimpleNamespace
+
+    from ReplyChallenge import main
+    from ReplyChallenge.circuit_breaker import CircuitBreaker
+
+    rows = [{"id": f"m{i}", "content": f"memory {i}", "embedding": [1.0] + [0.0] * 7, "hit_count": 1,
+             "created_at": "2024-05-01T10:00:00+00:00"} for i in range(120)]
+    breaker = CircuitBreaker("supabase-test", min_calls=1, call_timeout=0.1)
+    limits = []
+
+    async def fetch(query):
+        limit, offset = int(query.params["limit"]), int(query.params.get("offset", 0))
+        limits.append(limit)
+        await asyncio.sleep(0.002 * limit)  # the transfer grows with the rows read
+        return SimpleNamespace(data=rows[offset:offset + limit])
+
+    fake_db(lambda query: breaker.call(fetch, query))
+    monkeypatch.setattr(main, "memory_snapshot", None)
+    monkeypatch.setattr(main, "memory_store", MemoryStore(partition_cap=500))
+    monkeypatch.setattr(main, "MEMORY_LOAD_PAGE_SIZE", 25)
+
+    asyncio.run(main.ensure_memory_partition("room", "ann"))
+    part = main.memory_store.partition("room", "ann", create=False)
+    assert part.complete and len(part) == 120 and not part.cold
+    assert limits == [25] * 5 and breaker.state == "closed" and breaker.failure_rate() == 0
+
+    # read in one go, the same load times out and counts against the breaker
+    monkeypatch.setattr(main, "memory_store", MemoryStore(partition_cap=500))
+    monkeypatch.setattr(main, "MEMORY_LOAD_PAGE_SIZE", 500)
+    try:
+        asyncio.run(main.ensure_memory_partition("room", "ann"))
+    except asyncio.TimeoutError:
+        pass
+    assert limits[-1] == 500 and breaker.failure_rate() > 0
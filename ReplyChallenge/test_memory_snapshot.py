@@ -0,0 +1,63 @@
+import asyncio
+
+import numpy as np
+
+from ReplyChallenge import memory_snapshot
+from ReplyChallenge.memory_index import MemoryStore
+from ReplyChallenge.memory_snapshot import Snapshot, SnapshotWriter
+
+
+def rows(prefix, vectors):
+    return [{"id": f"{prefix}-{i}", "content": f"{prefix} memory {i} ✓", "embedding": v, "hit_count": i + 1,
+             "created_at": f"2024-01-0{i + 1}T00:00:00+00:00"}
+            for i, v in enumerate(vectors)]
+
+
+def test_snapshot_round_trip_maps_partitions(tmp_path):
+    writer = SnapshotWriter(str(tmp_path))
+    writer.add_partition("room", "ann", rows("ann", [[3.0, 4.0], [1.0, 0.0], [0.0, 2.0]]))
+    writer.add_partition("room", "bob", rows("bob", [[0.0, 1.0]]))
+    writer.close("2024-01-01T00:00:00")
+
+    snapshot = Snapshot.open(str(tmp_path))
+    assert len(snapshot) == 4 and snapshot.watermark == "2024-01-01T00:00:00"
+    ids, contents, vectors, hits, seen = snapshot.partition("room", "ann", limit=2)
+    assert ids == ["ann-1", "ann-2"] and contents[0] == "ann memory 1 ✓" and hits == [2, 3]
+    assert seen == [1704153600.0, 1704240000.0]
+    assert isinstance(vectors, np.memmap) and np.allclose(vectors, [[1.0, 0.0], [0.0, 1.0]])
+    assert snapshot.partition("room", "carol") is None
+    assert Snapshot.open(str(tmp_path / "missing")) is None
+
+
+def test_build_reads_each_partition_one_small_page_at_a_time(tmp_path, monkeypatch):
+    stored = rows("ann", [[1.0, 0.0], [0.0, 1.0], [1.0, 1.0]])
+    limits = []
+
+    async def list_memory_partitions():
+        return [("room", "ann")]
+
+    async def list_memories(session_id=None, username=None, limit=1000, after=None):
+        limits.append(limit)
+        return [r for r in stored if after is None or r["created_at"] > after][:limit]
+
+    monkeypatch.setattr(memory_snapshot.db, "list_memory_partitions", list_memory_partitions)
+    monkeypatch.setattr(memory_snapshot.db, "list_memories", list_memories)
+    result = asyncio.run(memory_snapshot.build_snapshot(str(tmp_path / "snap"), page_size=2))
+    assert limits == [2, 2] and result["rows"] == 3
+
+
+def test_partition_loaded_from_snapshot_is_searchable_and_writable(tmp_path):
+    writer = SnapshotWriter(str(tmp_path))
+    writer.add_partition("room", "ann", rows("ann", [[1.0, 0.0], [0.0, 1.0]]))
+    writer.close("2024-01-01T00:00:00")
+    snapshot = Snapshot.open(str(tmp_path))
+
+    store = MemoryStore(partition_cap=2)
+    part = store.partition("room", "ann")
+    part.load_arrays(*snapshot.partition("room", "ann"))
+    assert store.search("memory 1", [0.0, 1.0], "room", "ann")[0]["id"] == "ann-1"
+
+    # writes go to private pages, never to the snapshot file
+    store.add("new", "fresh memory", [0.6, 0.8], "room", "ann")
+    assert "ann-0" not in part and "new" in part
+    assert np.allclose(Snapshot.open(str(tmp_path)).vectors, [[1.0, 0.0], [0.0, 1.0]])
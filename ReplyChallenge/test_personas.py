@@ -0,0 +1,167 @@
+import asyncio
+import json
+import threading
+from types import SimpleNamespace
+
+from fastapi.testclient import TestClient
+from openai.types.chat import ChatCompletion
+
+
+def completion(text):
+    return ChatCompletion.model_validate({
+        "id": "c1", "object": "chat.completion", "created": 0, "model": "gpt-4o-mini",
+        "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": text}}],
+        "usage": {"prompt_tokens": 5, "completion_tokens": 2, "total_tokens": 7},
+    })
+
+
+def fake_dependencies(monkeypatch, fake_db, main, chat):
+    """Answer OpenAI with `chat` and every query with no rows; returns the
+    background jobs submitted."""
+    async def no_op():
+        return None
+
+    async def embed(text):
+        return [0.5] * 8
+
+    async def execute(query):
+        if query.http_method == "POST" and query.path == "/requests":
+            return SimpleNamespace(data=[{"id": "req-1"}], count=None)
+        return SimpleNamespace(data=[], count=None)
+
+    submitted = []
+    monkeypatch.setattr(main.llm, "get_client", lambda: SimpleNamespace(models=SimpleNamespace(list=no_op)))
+    monkeypatch.setattr(main.llm, "embed", embed)
+    monkeypatch.setattr(main.llm, "chat", chat)
+    fake_db(execute)
+    monkeypatch.setattr(main.jobs, "submit", lambda job_type, **payload: submitted.append((job_type, payload)))
+    return submitted
+
+
+def receive_until(ws, event_type):
+    while (event := ws.receive_json())["type"] != event_type:
+        pass
+    return event
+
+
+def blocking_chat():
+    started, cancelled = threading.Event(), threading.Event()
+
+    async def chat(model, messages, temperature=0.7, max_tokens=None):
+        started.set()
+        try:
+            await asyncio.Event().wait()
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+
+    return chat, started, cancelled
+
+
+def test_cancel_frame_aborts_the_completion_and_marks_the_request(fake_db, monkeypatch):
+    from ReplyChallenge import main
+
+    chat, started, cancelled = blocking_chat()
+    submitted = fake_dependencies(monkeypatch, fake_db, main, chat)
+
+    with TestClient(main.app) as client, client.websocket_connect("/ws") as ws:
+        ws.send_text(json.dumps({"text": "@Athena rewrite this whole module", "username": "ann"}))
+        accepted = receive_until(ws, "request.accepted")
+        assert accepted == {"type": "request.accepted", "request_id": "req-1", "personas": ["Athena"]}
+        assert started.wait(5)
+
+        ws.send_text(json.dumps({"type": "cancel", "request_id": "req-1"}))
+        notice = receive_until(ws, "system")
+        assert notice["text"] == "Request cancelled" and notice["request_id"] == "req-1"
+        assert cancelled.is_set() and "req-1" not in main.inflight
+
+        ws.send_text(json.dumps({"type": "cancel", "request_id": "req-1"}))
+        assert receive_until(ws, "system")["text"] == "Nothing to cancel"
+
+    updates = [payload for job_type, payload in submitted if job_type == "request.update"]
+    assert updates == [{"request_id": "req-1", "ai_response": None, "tokens": None, "metadata": {"status": "cancelled", "personas": ["Athena"]}}]
+
+
+def test_disconnect_cancels_the_requesters_completions(fake_db, monkeypatch):
+    from ReplyChallenge import main
+
+    chat, started, cancelled = blocking_chat()
+    submitted = fake_dependencies(monkeypatch, fake_db, main, chat)
+
+    with TestClient(main.app) as client:
+        with client.websocket_connect("/ws") as ws:
+            ws.send_text(json.dumps({"text": "@Zeus @Hermes plan our launch", "username": "ann"}))
+            receive_until(ws, "request.accepted")
+            assert started.wait(5)
+        assert cancelled.wait(5)
+        for _ in range(100):
+            if not main.inflight:
+                break
+            threading.Event().wait(0.01)
+        assert not main.inflight
+
+    assert ("request.update", {"request_id": "req-1", "ai_response": None, "tokens": None, "metadata": {"status": "cancelled", "personas": ["Zeus", "Hermes"]}}) in submitted
+    assert not any(job_type == "request.log" for job_type, _ in submitted)
+
+
+def test_resolve_target_personas():
+    from ReplyChallenge.main import resolve_target_personas
+
+    assert resolve_target_personas(None, "@Zeus @Hermes plan our launch") == (["Zeus", "Hermes"], "plan our launch")
+    assert resolve_target_personas(None, "@zeus, @HERMES,plan it") == (["Zeus", "Hermes"], "plan it")
+    assert resolve_target_personas(None, "@Zeus") == (["Zeus"], "")
+    assert resolve_target_personas(None, "@bob @Athena look at this") == (["Athena"], "look at this")
+    assert resolve_target_personas(None, "@Nobody hi") == (["Nobody"], "hi")
+    assert resolve_target_personas(None, "hello @Zeus") == ([], "hello @Zeus")
+    # a structured list wins over mentions, which are still stripped from the prompt
+    assert resolve_target_personas({"targetPersonas": ["hermes", "Zeus"], "targetPersona": "Hermes"}, "@Zeus @Hermes") == (["Hermes", "Zeus"], "")
+    assert resolve_target_personas({"targetPersona": "Athena"}, "fix the build") == (["Athena"], "fix the build")
+
+
+def test_mentions_fan_out_over_one_context_and_reply_as_they_arrive(fake_db, monkeypatch):
+    from ReplyChallenge import main
+
+    delays = {"Zeus": 0.2, "Hermes": 0.0}
+    prompts = {}
+
+    async def chat(model, messages, temperature=0.7, max_tokens=None):
+        persona = next(p for p in delays if messages[0]["content"].startswith(main.PERSONA_INSTRUCTIONS[p]))
+        prompts[persona] = messages[-1]["content"]
+        await asyncio.sleep(delays[persona])
+        return completion(f"{persona} says hi")
+
+    submitted = fake_dependencies(monkeypatch, fake_db, main, chat)
+    embeds = []
+    embed = main.llm.embed
+
+    async def counting_embed(text):
+        embeds.append(text)
+        return await embed(text)
+
+    monkeypatch.setattr(main.llm, "embed", counting_embed)
+
+    with TestClient(main.app) as client, client.websocket_connect("/ws") as ws:
+        ws.send_text(json.dumps({"text": "plan our launch", "username": "ann", "targetPersonas": ["Zeus", "Hermes"]}))
+        replies = [receive_until(ws, "ai") for _ in range(2)]
+
+    # the faster persona is broadcast first, without waiting for the other
+    assert [(r["username"], r["text"], r["request_id"]) for r in replies] == [("Hermes", "Hermes says hi", "req-1"), ("Zeus", "Zeus says hi", "req-1")]
+    assert prompts == {"Zeus": "plan our launch", "Hermes": "plan our launch"}
+    assert embeds == ["plan our launch"]
+    stored = [(job_type, payload) for job_type, payload in submitted if job_type in ("request.update", "request.log")]
+    assert [(job_type, payload["ai_response"]) for job_type, payload in stored] == [("request.update", "Hermes says hi"), ("request.log", "Zeus says hi")]
+    assert stored[0][1]["request_id"] == "req-1" and stored[1][1]["metadata"]["parent_request_id"] == "req-1"
+
+
+def test_mention_only_message_gets_the_persona_greeting(fake_db, monkeypatch):
+    from ReplyChallenge import main
+
+    async def chat(*args, **kwargs):
+        raise AssertionError("a ping must not call OpenAI")
+
+    fake_dependencies(monkeypatch, fake_db, main, chat)
+    with TestClient(main.app) as client, client.websocket_connect("/ws") as ws:
+        # what the web client sends for "@Zeus"
+        ws.send_text(json.dumps({"text": "@Zeus", "username": "ann", "targetPersonas": ["Zeus"]}))
+        reply = receive_until(ws, "ai")
+    assert reply["username"] == "Zeus" and reply["text"] == main.persona_ping_response("Zeus")
@@ -0,0 +1,63 @@
+import asyncio
+
+from ReplyChallenge.prefetch import ContextPrefetcher
+
+
+def test_get_waits_for_inflight_load_and_bounds_concurrency():
+    async def scenario():
+        prefetcher = ContextPrefetcher(max_concurrency=1)
+        release = asyncio.Event()
+
+        async def load():
+            await release.wait()
+            return ["fact"]
+
+        assert prefetcher.schedule(("facts", "ann"), load)
+        assert not prefetcher.schedule(("facts", "bob"), load)  # slot busy: skipped
+        asyncio.get_running_loop().call_later(0.01, release.set)
+        assert await prefetcher.get(("facts", "ann")) == ["fact"]
+        assert await prefetcher.get(("facts", "bob")) is None
+        return prefetcher.metrics()
+
+    stats = asyncio.run(scenario())
+    assert stats["hits"] == 1 and stats["misses"] == 1 and stats["skipped"] == 1
+
+
+def test_entries_expire_and_are_evicted_lru():
+    async def value(v):
+        return v
+
+    async def scenario():
+        prefetcher = ContextPrefetcher(ttl=0.05, max_entries=2)
+        for name in ("a", "b", "c"):
+            prefetcher.schedule(("facts", name), lambda n=name: value(n))
+            await asyncio.sleep(0)
+        await asyncio.sleep(0.01)
+        assert await prefetcher.get(("facts", "a")) is None
+        assert await prefetcher.get(("facts", "c")) == "c"
+        await asyncio.sleep(0.06)
+        assert await prefetcher.get(("facts", "c")) is None
+
+    asyncio.run(scenario())
+
+
+def test_invalidate_drops_cached_and_inflight_entries():
+    async def scenario():
+        prefetcher = ContextPrefetcher()
+
+        async def slow():
+            await asyncio.sleep(1)
+            return "stale"
+
+        async def fast():
+            return "rows"
+
+        prefetcher.schedule(("history", "room", "ann"), fast)
+        prefetcher.schedule(("history", "room", "bob"), slow)
+        await asyncio.sleep(0.01)
+        prefetcher.invalidate("history", where=lambda key: key[2] != "ann")
+        assert await prefetcher.get(("history", "room", "bob")) is None
+        assert await prefetcher.get(("history", "room", "ann"), pop=True) == "rows"
+        assert await prefetcher.get(("history", "room", "ann")) is None
+
+    asyncio.run(scenario())
@@ -0,0 +1,53 @@
+import asyncio
+import time
+
+from fastapi.testclient import TestClient
+
+from ReplyChallenge.profiler import SamplingProfiler, set_stage
+
+
+def crunch(seconds):
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        pass
+
+
+def test_samples_are_tagged_with_the_running_tasks_stage():
+    async def scenario():
+        profiler = SamplingProfiler.for_running_loop(interval=0.002)
+        profiler.start()
+
+        async def persona():
+            set_stage("persona.completion")
+            crunch(0.1)
+
+        set_stage("ws.parse")
+        crunch(0.1)
+        await asyncio.create_task(persona())
+        await asyncio.sleep(0.05)
+        profiler.stop()
+        return profiler
+
+    profiler = asyncio.run(scenario())
+    stages = profiler.by_stage()
+    assert stages["[ws.parse]"] > 10 and stages["[persona.completion]"] > 10
+    lines = profiler.collapsed().splitlines()
+    assert any(line.startswith("[persona.completion];") and "crunch (ReplyChallenge/test_profiler.py)" in line for line in lines)
+    assert all(line.rsplit(" ", 1)[1].isdigit() for line in lines)
+
+
+def test_profile_endpoint_requires_admin_token(monkeypatch):
+    from ReplyChallenge.main import app
+
+    client = TestClient(app)
+    monkeypatch.delenv("ADMIN_TOKEN", raising=False)
+    assert client.get("/admin/profile?seconds=0.05").status_code == 404
+
+    monkeypatch.setenv("ADMIN_TOKEN", "s3cret")
+    assert client.get("/admin/profile?seconds=0.05").status_code == 401
+    assert client.get("/admin/profile?seconds=0.05", headers={"Authorization": "Bearer nope"}).status_code == 401
+
+    response = client.get("/admin/profile?seconds=0.1&interval_ms=2&format=json", headers={"Authorization": "Bearer s3cret"})
+    assert response.status_code == 200
+    body = response.json()
+    assert body["samples"] > 0 and sum(body["stages"].values()) == body["samples"]
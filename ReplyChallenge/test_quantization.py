@@ -0,0 +1,50 @@
+import numpy as np
+
+from ReplyChallenge.memory_index import MemoryStore
+from ReplyChallenge.quantization import Float16Codec, Int8Codec, ProductQuantizer
+
+
+def unit_rows(n, dim, seed=0):
+    x = np.random.default_rng(seed).normal(size=(n, dim)).astype(np.float32)
+    return x / np.linalg.norm(x, axis=1, keepdims=True)
+
+
+def test_scalar_codecs_approximate_dot_products():
+    rows = unit_rows(200, 64)
+    query = rows[0]
+    exact = rows @ query
+    for codec, tolerance in ((Float16Codec(), 1e-3), (Int8Codec(), 2e-2)):
+        codes, scales = codec.encode(rows)
+        assert np.abs(codec.scores(codes, scales, query) - exact).max() < tolerance
+        assert int(np.argmax(codec.scores(codes, scales, query))) == 0
+
+
+def test_product_quantizer_keeps_nearest_neighbour_in_candidates():
+    rows = unit_rows(600, 32, seed=1)
+    pq = ProductQuantizer(m=8, iterations=5).train(rows)
+    codes, _ = pq.encode(rows)
+    assert codes.shape == (600, 8) and codes.dtype == np.uint8
+    query = rows[42]
+    candidates = np.argsort(-pq.scores(codes, None, query))[:20]
+    assert 42 in candidates
+
+
+def test_int8_store_reranks_on_full_precision():
+    rows = unit_rows(50, 16, seed=2)
+    store = MemoryStore(precision="int8", rerank=True)
+    for i, v in enumerate(rows):
+        store.add(i, f"memory {i}", v, "room", "ann")
+    top = store.partition("room", "ann").vector_search(rows[7], 3)
+    assert top[0][0] == 7 and abs(top[0][1] - 1.0) < 1e-5
+    assert store.metrics()["precision"] == "int8"
+
+
+def test_lossy_precision_keeps_only_the_codes_by_default():
+    rows = unit_rows(50, 16, seed=3)
+    compact, plain = MemoryStore(precision="int8"), MemoryStore(precision="float32")
+    for store in (compact, plain):
+        for i, v in enumerate(rows):
+            store.add(i, f"memory {i}", v, "room", "ann")
+    part = compact.partition("room", "ann")
+    assert part._full is None and part.vector_search(rows[7], 1)[0][0] == 7
+    assert compact.nbytes() < plain.nbytes()
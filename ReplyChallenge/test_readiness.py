@@ -0,0 +1,86 @@
+import asyncio
+import os
+import subprocess
+import sys
+from pathlib import Path
+from types import SimpleNamespace
+
+from fastapi.testclient import TestClient
+
+from ReplyChallenge.database import async_service
+from ReplyChallenge.readiness import Readiness
+
+
+def test_importing_the_app_builds_no_clients():
+    code = (
+        "import ReplyChallenge.main, ReplyChallenge.llm as llm, ReplyChallenge.database.client as db;"
+        "assert llm._client is None and db._client is None and db._async_client is None"
+    )
+    env = {**os.environ, "OPENAI_API_KEY": "sk-test", "SUPABASE_URL": "http://db.invalid", "SUPABASE_KEY": "k"}
+    result = subprocess.run([sys.executable, "-c", code], cwd=Path(__file__).parent.parent, env=env, capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr
+
+
+def test_warm_up_reports_failures_and_readiness_needs_every_check():
+    calls = []
+
+    async def ok():
+        calls.append("ok")
+        return True
+
+    async def broken():
+        raise RuntimeError("connection refused")
+
+    async def hangs():
+        await asyncio.sleep(1)
+
+    async def scenario():
+        readiness = Readiness(check_timeout=0.05)
+        readiness.add_warmup("cache", ok)
+        readiness.add_warmup("openai", broken)
+        readiness.add_check("database", ok)
+        await readiness.check()
+        assert not readiness.is_ready()  # not warmed up yet
+        await readiness.warm_up()
+        assert readiness.warmed and calls == ["ok", "ok"]
+        assert readiness.is_ready()
+
+        readiness.add_check("openai", broken)
+        readiness.add_check("slow", hangs)
+        assert await readiness.check() == {"database": "ok", "openai": "error: connection refused", "slow": "timeout"}
+        assert not readiness.is_ready()
+
+    asyncio.run(scenario())
+
+
+def test_ready_and_health_report_the_real_database_check(fake_db, monkeypatch):
+    from ReplyChallenge import main
+
+    up = True
+    queries = []
+
+    async def execute(query):
+        queries.append(query)
+        if not up:
+            raise ConnectionError("database unreachable")
+        return SimpleNamespace(data=[{"id": "r1"}])
+
+    fake_db(execute)
+    readiness = Readiness()
+    readiness.add_check("database", async_service.verify_database_connection)
+    monkeypatch.setattr(main, "readiness", readiness)
+    client = TestClient(main.app)
+
+    # checks pass, but warm-up hasn't run
+    assert client.get("/ready").status_code == 503
+    asyncio.run(readiness.warm_up())
+    response = client.get("/ready")
+    assert response.status_code == 200 and response.json()["checks"] == {"database": "ok"}
+    assert (queries[-1].http_method, queries[-1].path, queries[-1].params["select"]) == ("GET", "/requests", "id")
+    assert client.get("/health").json()["database"] == "connected"
+
+    up = False
+    response = client.get("/ready")
+    assert response.status_code == 503 and response.json()["checks"] == {"database": "unavailable"}
+    health = client.get("/health")
+    assert health.status_code == 200 and health.json()["database"] == "unavailable"
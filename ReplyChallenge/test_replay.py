@@ -0,0 +1,88 @@
+import asyncio
+import json
+from types import SimpleNamespace
+
+from fastapi.testclient import TestClient
+from openai.types.chat import ChatCompletion
+
+from ReplyChallenge.replay import RecordedResponses, Replay, compare
+from ReplyChallenge.traffic import TrafficRecorder, read_capture
+
+
+def completion(text):
+    return ChatCompletion.model_validate({
+        "id": "c1", "object": "chat.completion", "created": 0, "model": "gpt-4o-mini",
+        "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": text}}],
+        "usage": {"prompt_tokens": 5, "completion_tokens": 2, "total_tokens": 7},
+    })
+
+
+def test_capture_then_replay_reports_stage_latencies(fake_db, monkeypatch, tmp_path):
+    from ReplyChallenge import main
+
+    async def no_op():
+        return None
+
+    async def embed(text):
+        await asyncio.sleep(0.01)
+        return [0.5] * 8
+
+    async def chat(model, messages, temperature=0.7, max_tokens=None):
+        await asyncio.sleep(0.03)
+        return completion("#LaunchDay")
+
+    async def execute(query):
+        await asyncio.sleep(0.005)
+        if query.http_method == "POST" and query.path == "/requests":
+            return SimpleNamespace(data=[{"id": "req-1", "created_at": "2024-05-01T10:00:00+00:00"}], count=None)
+        return SimpleNamespace(data=[], count=None)
+
+    monkeypatch.setattr(main.llm, "get_client", lambda: SimpleNamespace(models=SimpleNamespace(list=no_op)))
+    monkeypatch.setattr(main.llm, "embed", embed)
+    monkeypatch.setattr(main.llm, "chat", chat)
+    fake_db(execute)
+    capture = str(tmp_path / "capture.ndjson.gz")
+    monkeypatch.setattr(main, "recorder", TrafficRecorder(capture))
+
+    with TestClient(main.app) as client:
+        with client.websocket_connect("/ws") as ws:
+            ws.send_text(json.dumps({"type": "join", "username": "ann"}))
+            ws.send_text(json.dumps({"text": "@Hermes give me a hashtag for the launch", "username": "ann"}))
+            while (event := ws.receive_json())["type"] != "ai":
+                pass
+            assert event["text"] == "#LaunchDay" and event["request_id"] == "req-1"
+
+    records = list(read_capture(capture))
+    kinds = [r["kind"] for r in records]
+    assert kinds[0] == "header" and kinds.count("frame") == 2 and "connect" in kinds and "disconnect" in kinds
+    deps = {r["dep"] for r in records if r["kind"] == "call"}
+    assert {"openai.embed", "openai.chat", "db POST /requests"} <= deps
+    chat_call = next(r for r in records if r.get("dep") == "openai.chat")
+    assert chat_call["ms"] >= 30 and chat_call["result"]["choices"][0]["message"]["content"] == "#LaunchDay"
+
+    report = asyncio.run(Replay(capture, speed=5).run())
+    assert report["frames"] == 2 and report["connections"] == 1
+    assert {"ws.parse", "ws.request_entry", "persona.context", "persona.completion"} <= set(report["stages"])
+    assert report["stages"]["persona.completion"]["p50_ms"] >= 30  # recorded latency is replayed
+    assert report["end_to_end"]["first_reply"]["count"] == 1 and report["end_to_end"]["first_reply"]["p50_ms"] >= 40
+    assert report["responses"]["openai.chat"] == {"exact": 1, "fallback": 0, "missing": 0}
+    assert report["responses"]["openai.embed"]["missing"] == 0
+
+
+def test_recorded_responses_fall_back_to_the_same_endpoint_in_order():
+    calls = [
+        {"dep": "openai.chat", "key": "a", "ms": 1, "result": 1},
+        {"dep": "openai.chat", "key": "b", "ms": 1, "result": 2},
+        {"dep": "openai.chat", "key": "c", "ms": 1, "result": 3},
+    ]
+    responses = RecordedResponses(calls)
+    assert [responses.take("openai.chat", key)["result"] for key in ("b", "changed", "changed")] == [2, 1, 3]
+    assert dict(responses.stats["openai.chat"]) == {"exact": 1, "fallback": 2, "missing": 0}
+
+
+def test_compare_flags_p95_regressions():
+    before = {"stages": {"ws.parse": {"p50_ms": 1.0, "p95_ms": 2.0}, "persona.completion": {"p50_ms": 800.0, "p95_ms": 1000.0}}}
+    after = {"stages": {"ws.parse": {"p50_ms": 1.0, "p95_ms": 3.0}, "persona.completion": {"p50_ms": 790.0, "p95_ms": 1020.0}}}
+    rows = {row["name"]: row for row in compare(before, after, fail_above=10)}
+    assert rows["ws.parse"]["p95_change"] == 50.0 and rows["ws.parse"]["regressed"]
+    assert rows["persona.completion"]["p95_change"] == 2.0 and not rows["persona.completion"]["regressed"]
@@ -0,0 +1,66 @@
+import asyncio
+from types import SimpleNamespace
+
+from ReplyChallenge.routing import ModelRouter, detect_intent
+
+MODELS = {"fast": "small-model", "full": "big-model"}
+
+
+def test_detect_intent():
+    assert detect_intent("give me a hashtag for the launch") == "quick"
+    assert detect_intent("why does this raise an exception?\n```py\nx()\n```") == "code"
+    assert detect_intent("compare our pricing strategy with Acme") == "analysis"
+    assert detect_intent("write a tweet about the beta") == "copy"
+    assert detect_intent("how was your weekend") == "chat"
+
+
+def test_route_by_persona_prompt_intent_and_queue_depth():
+    router = ModelRouter.from_env(slots=8)
+    router.models = MODELS
+
+    hashtag = router.route("Hermes", "give me a hashtag")
+    assert (hashtag["tier"], hashtag["model"], hashtag["reasons"]) == ("fast", "small-model", ["intent:quick"])
+
+    question = "what do you think about how we should handle the quarterly review with the sales team this year?"
+    assert router.route("Zeus", question)["reasons"] == ["persona_default"]
+    assert router.route("Zeus", question)["tier"] == "full"
+    assert router.route("Zeus", "thoughts?")["reasons"] == ["short_prompt"]
+
+    # saturated completion slots push what doesn't need the full model to the fast tier...
+    busy = router.route("Zeus", question, queue_depth=8)
+    assert busy["tier"] == "fast" and busy["reasons"] == ["persona_default", "busy"] and busy["queue_depth"] == 8
+    # ...but never code for Athena
+    code = router.route("Athena", "debug this", queue_depth=50)
+    assert code["tier"] == "full" and code["reasons"] == ["intent:code"]
+    assert router.route("Hermes", "x " * 800)["reasons"] == ["long_prompt"]
+
+
+def test_persona_routes_env_overrides_the_table(monkeypatch):
+    monkeypatch.setenv("PERSONA_ROUTES", '{"Zeus": {"tier": "fast", "fast_max_chars": 0}}')
+    monkeypatch.setenv("MODEL_TIER_FAST", "tiny")
+    router = ModelRouter.from_env(slots=8)
+    route = router.route("Zeus", "what do you think about the next offsite location options?")
+    assert route["model"] == "tiny" and route["reasons"] == ["persona_default"]
+    assert router.routes["Zeus"]["full_intents"] == ["analysis"]
+
+
+def test_completion_records_route_in_metadata(monkeypatch):
+    from ReplyChallenge import main
+
+    calls = []
+
+    async def fake_chat(model, messages, temperature=0.7, max_tokens=None):
+        calls.append(model)
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content="#LaunchDay"))],
+            usage=SimpleNamespace(total_tokens=42),
+            model_dump=lambda: {"model": model},
+        )
+
+    monkeypatch.setattr(main.llm, "chat", fake_chat)
+    context = {"summary": "", "fact_context": "", "memory_context": "", "history": []}
+    reply = asyncio.run(main.complete_for_persona("Hermes", "give me a hashtag", context))
+
+    route = reply["metadata"]["route"]
+    assert calls == [main.router.models["fast"]] and route["tier"] == "fast" and route["latency_ms"] >= 0
+    assert main.router.metrics()["fast"]["tokens"] >= 42
@@ -0,0 +1,117 @@
+import asyncio
+from types import SimpleNamespace
+
+from ReplyChallenge import summaries
+from ReplyChallenge.summaries import SessionSummarizer, history_messages
+
+
+def row(i, response="reply"):
+    return {"id": str(i), "prompt": f"msg {i}", "response": response, "username": "ann",
+            "metadata": {"persona": "Zeus"}, "created_at": f"2024-01-01T00:00:{i:02d}"}
+
+
+def test_refresh_is_due_every_k_messages():
+    summarizer = SessionSummarizer(every=3)
+    due = [summarizer.note_message("room") for _ in range(7)]
+    assert due == [False, False, True, False, False, True, False]
+
+
+def test_history_messages_skip_missing_replies():
+    assert history_messages([row(1), row(2, response=None)]) == [
+        {"role": "user", "content": "msg 1"},
+        {"role": "assistant", "content": "reply"},
+        {"role": "user", "content": "msg 2"},
+    ]
+
+
+def test_refresh_folds_rows_after_watermark_and_keeps_recent_turns(monkeypatch):
+    rows = [row(i) for i in range(1, 6)]
+    saved, prompts, reads = [], [], []
+
+    async def get_session_summary(session_id):
+        return {"summary": "earlier", "covered_until": "2024-01-01T00:00:00", "message_count": 4}
+
+    async def get_session_history(session_id, limit=None, after=None):
+        reads.append(after)
+        return [r for r in rows if r["created_at"] > after][:limit]
+
+    async def save_session_summary(session_id, summary, covered_until, message_count):
+        saved.append((summary, covered_until, message_count))
+
+    async def chat(model, messages, temperature=0.7, max_tokens=None):
+        prompts.append(messages[-1]["content"])
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=" updated "))])
+
+    monkeypatch.setattr(summaries.db, "get_session_summary", get_session_summary)
+    monkeypatch.setattr(summaries.db, "get_session_history", get_session_history)
+    monkeypatch.setattr(summaries.db, "save_session_summary", save_session_summary)
+    monkeypatch.setattr(summaries.llm, "chat", chat)
+
+    async def scenario():
+        summarizer = SessionSummarizer(recent_turns=2)
+        assert await summarizer.refresh("room") == "updated"
+        assert await summarizer.get("room") == "updated"
+        # nothing new beyond the recent turns: no second summarization
+        await summarizer.refresh("room")
+
+    asyncio.run(scenario())
+    assert saved == [("updated", "2024-01-01T00:00:03", 7)]
+    assert "earlier" in prompts[0] and "ann: msg 3" in prompts[0] and "msg 4" not in prompts[0]
+    assert reads == ["2024-01-01T00:00:00", "2024-01-01T00:00:03"]
+
+
+def test_refresh_stops_before_rows_still_waiting_for_a_reply(monkeypatch):
+    rows = [row(1), row(2), row(3, response=None), row(4, response=None), row(5), row(6)]
+    saved = []
+
+    async def get_session_summary(session_id):
+        return {"summary": "", "covered_until": None, "message_count": 0}
+
+    async def get_session_history(session_id, limit=None, after=None):
+        return [r for r in rows if after is None or r["created_at"] > after][:limit]
+
+    async def save_session_summary(session_id, summary, covered_until, message_count):
+        saved.append((covered_until, message_count))
+
+    async def chat(model, messages, temperature=0.7, max_tokens=None):
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content="updated"))])
+
+    monkeypatch.setattr(summaries.db, "get_session_summary", get_session_summary)
+    monkeypatch.setattr(summaries.db, "get_session_history", get_session_history)
+    monkeypatch.setattr(summaries.db, "save_session_summary", save_session_summary)
+    monkeypatch.setattr(summaries.llm, "chat", chat)
+
+    async def scenario():
+        summarizer = SessionSummarizer(recent_turns=2)
+        await summarizer.refresh("room")
+        # the replies arrive; the next refresh picks those rows up with them
+        rows[2]["response"] = rows[3]["response"] = "reply"
+        rows.extend([row(7), row(8)])
+        await summarizer.refresh("room")
+
+    asyncio.run(scenario())
+    assert saved == [("2024-01-01T00:00:02", 2), ("2024-01-01T00:00:06", 6)]
+
+
+def test_context_keeps_turns_between_the_watermark_and_the_recent_ones(monkeypatch):
+    rows = [row(i) for i in range(1, 10)]
+    reads = []
+
+    async def get_session_summary(session_id):
+        return {"summary": "earlier", "covered_until": "2024-01-01T00:00:03", "message_count": 3}
+
+    async def get_session_history(session_id, limit=None, after=None):
+        reads.append((limit, after))
+        return rows[-limit:]
+
+    monkeypatch.setattr(summaries.db, "get_session_summary", get_session_summary)
+    monkeypatch.setattr(summaries.db, "get_session_history", get_session_history)
+
+    # 6 messages since the last refresh: more than recent_turns, fewer than `every`
+    summary, tail = asyncio.run(SessionSummarizer(every=10, recent_turns=2).context("room"))
+    assert summary == "earlier" and [r["id"] for r in tail] == ["4", "5", "6", "7", "8", "9"]
+    assert reads == [(13, None)]
+
+    # while refreshes fail the tail is capped to the newest rows
+    summary, tail = asyncio.run(SessionSummarizer(max_tail=3).context("room"))
+    assert [r["id"] for r in tail] == ["6", "7", "8", "9"]
@@ -0,0 +1,169 @@
+"""
+Opt-in traffic capture for deterministic replay (see `replay.py`).
+
+With TRAFFIC_CAPTURE=<path> set, the server records what it receives on
+/ws and what its dependencies answer to a gzip-compressed NDJSON file:
+
+    {"kind": "header", "version": 1, "started_at": "..."}
+    {"kind": "connect", "t": 0.51, "conn": 1}
+    {"kind": "frame", "t": 0.53, "conn": 1, "data": "<raw text frame>"}
+    {"kind": "call", "t": 0.53, "dep": "db POST /requests", "key": "", "ms": 41.2, "result": {...}}
+    {"kind": "disconnect", "t": 9.1, "conn": 1}
+
+`t` is seconds since the capture started. Calls are the OpenAI requests
+(embeddings, chat completions) and every Supabase query, with how long
+they took and what they returned (or the error they raised). `dep` names
+the endpoint (OpenAI method, or HTTP method and table for Supabase) and
+`key` the exact request (query string, or a hash of the input), so a
+replay can answer the same request with the same response. Embeddings are
+stored as base64 float32.
+
+Captures hold user messages and model replies: keep them as private as
+the database.
+"""
+
+import base64
+import gzip
+import hashlib
+import itertools
+import json
+import os
+import time
+from datetime import datetime
+from typing import Optional
+
+import numpy as np
+
+from ReplyChallenge import llm
+from ReplyChallenge.database import async_service
+from ReplyChallenge.logs import get_logger
+
+log = get_logger("traffic")
+
+VERSION = 1
+
+
+def text_key(value) -> str:
+    return hashlib.sha1(json.dumps(value, sort_keys=True, default=str).encode("utf-8")).hexdigest()[:16]
+
+
+def chat_key(model: str, messages: list, temperature: float = 0.7, max_tokens: Optional[int] = None) -> str:
+    return text_key([model, messages, temperature, max_tokens])
+
+
+def db_route(query) -> str:
+    return f"db {query.http_method} {query.path}"
+
+
+def db_key(query) -> str:
+    # bodies are left out: inserts carry fresh timestamps
+    return str(query.params)
+
+
+def encode_vectors(vectors) -> dict:
+    array = np.asarray(vectors, dtype="<f4")
+    return {"f32": base64.b64encode(array.tobytes()).decode("ascii"), "shape": list(array.shape)}
+
+
+def decode_vectors(encoded: dict) -> list:
+    raw = np.frombuffer(base64.b64decode(encoded["f32"]), dtype="<f4")
+    return raw.reshape(encoded["shape"]).tolist()
+
+
+def encode_db_result(result) -> dict:
+    return {"data": getattr(result, "data", None), "count": getattr(result, "count", None)}
+
+
+def encode_completion(completion) -> dict:
+    return completion.model_dump()
+
+
+class TrafficRecorder:
+    """Writes a capture while `start()`ed: call `connect`, `frame` and
+    `disconnect` from the websocket endpoint; dependency calls are recorded
+    by wrapping `llm` and the database query executor."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.records = 0
+        self._file = None
+        self._start = 0.0
+        self._conns = itertools.count(1)
+        self._originals = {}
+
+    @classmethod
+    def from_env(cls) -> Optional["TrafficRecorder"]:
+        path = os.getenv("TRAFFIC_CAPTURE")
+        return cls(path) if path else None
+
+    def start(self):
+        self._file = gzip.open(self.path, "wt", encoding="utf-8")
+        self._start = time.perf_counter()
+        self._write({"kind": "header", "version": VERSION, "started_at": datetime.utcnow().isoformat()})
+        embed, embed_many, chat = llm.embed, llm.embed_many, llm.chat
+        execute = async_service._execute
+        self._patch(llm, "embed", lambda text: self._call("openai.embed", text_key(text), embed(text), encode_vectors))
+        self._patch(llm, "embed_many", lambda texts: self._call("openai.embed_many", text_key(texts), embed_many(texts), encode_vectors))
+        self._patch(llm, "chat", lambda model, messages, temperature=0.7, max_tokens=None: self._call(
+            "openai.chat", chat_key(model, messages, temperature, max_tokens), chat(model, messages, temperature, max_tokens), encode_completion))
+        self._patch(async_service, "_execute", lambda query: self._call(db_route(query), db_key(query), execute(query), encode_db_result))
+        log.info("capturing traffic", extra={"path": self.path})
+
+    def stop(self):
+        for (owner, name), original in self._originals.items():
+            setattr(owner, name, original)
+        self._originals.clear()
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+            log.info("traffic capture closed", extra={"path": self.path, "records": self.records})
+
+    def _patch(self, owner, name: str, wrapper):
+        self._originals[(owner, name)] = getattr(owner, name)
+        setattr(owner, name, wrapper)
+
+    def _now(self) -> float:
+        return round(time.perf_counter() - self._start, 6)
+
+    def _write(self, record: dict):
+        if self._file is None:
+            return
+        self._file.write(json.dumps(record, separators=(",", ":"), ensure_ascii=False, default=str) + "\n")
+        self.records += 1
+
+    def connect(self) -> int:
+        conn = next(self._conns)
+        self._write({"kind": "connect", "t": self._now(), "conn": conn})
+        return conn
+
+    def frame(self, conn: int, data: str):
+        self._write({"kind": "frame", "t": self._now(), "conn": conn, "data": data})
+
+    def disconnect(self, conn: int):
+        self._write({"kind": "disconnect", "t": self._now(), "conn": conn})
+
+    async def _call(self, dep: str, key: str, call, encode):
+        record = {"kind": "call", "t": self._now(), "dep": dep, "key": key}
+        started = time.perf_counter()
+        try:
+            result = await call
+        except Exception as e:
+            record.update(ms=round((time.perf_counter() - started) * 1000, 3), error=str(e), error_type=type(e).__name__)
+            self._write(record)
+            raise
+        record["ms"] = round((time.perf_counter() - started) * 1000, 3)
+        try:
+            record["result"] = encode(result)
+        except Exception as e:
+            log.warning("could not record %s response: %s", dep, e)
+            return result
+        self._write(record)
+        return result
+
+
+def read_capture(path: str):
+    """Yield the records of a capture file."""
+    with gzip.open(path, "rt", encoding="utf-8") as fh:
+        for line in fh:
+            if line.strip():
+                yield json.loads(line)
@@ -61,6 +61,7 @@ export function Background() {
     connectedUsers,
     sendMessage,
     sendTypingIndicator,
+    cancelRequest,
   } = useWebSocket(
     shouldConnect ? currentUsername : "",
     currentPersona,
@@ -163,6 +164,7 @@ export function Background() {
             messages={messages}
             messagesContainerRef={messagesContainerRef}
             typingUsers={typingUsers}
+            onCancel={cancelRequest}
           />
 
           <ChatInput
@@ -42,6 +42,25 @@ export default function FactsPanel({ username }: { username: string }) {
     }
   };
 
+  // Clear everything with one bulk request instead of one DELETE per fact
+  const clearAll = async () => {
+    if (facts.length === 0) return;
+    try {
+      const backend = (import.meta.env && import.meta.env.VITE_API_URL) || "http://localhost:8000";
+      const params = new URLSearchParams();
+      facts.forEach((f) => params.append("ids", f.id));
+      const res = await fetch(`${backend}/api/facts?${params.toString()}`, { method: "DELETE" });
+      const j = await res.json();
+      if (j.ok) {
+        setFacts([]);
+      } else {
+        setError(j.error || "Delete failed");
+      }
+    } catch (e: any) {
+      setError(String(e));
+    }
+  };
+
   const renderFact = (f: any) => (
     <div key={f.id} className="flex items-start justify-between gap-3 p-3 border rounded-lg mb-2 bg-white/80">
       <div className="flex-1">
@@ -72,6 +91,17 @@ export default function FactsPanel({ username }: { username: string }) {
 
       {facts.length === 0 && !loading && <div className="text-sm text-gray-500">No saved facts found.</div>}
 
+      {facts.length > 1 && (
+        <div className="flex justify-end">
+          <button
+            className="px-2 py-1 text-xs bg-red-500 hover:bg-red-600 text-white rounded-full"
+            onClick={clearAll}
+          >
+            Clear all
+          </button>
+        </div>
+      )}
+
       <div className="mt-2">
         {facts.map((f) => renderFact(f))}
       </div>
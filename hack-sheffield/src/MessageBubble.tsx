@@ -4,6 +4,7 @@ const md = new MarkdownIt({ html: false, linkify: true, typographer: true });
 
 export function MessageBubble({
   message,
+  onCancel,
 }: {
   message: {
     sender: string;
@@ -11,7 +12,9 @@ export function MessageBubble({
     text?: string;
     username?: string;
     targetPersona?: string;
+    request_id?: string;
   };
+  onCancel?: (requestId: string) => void;
 }) {
   const isMe = message.sender === "me";
   
@@ -72,7 +75,18 @@ export function MessageBubble({
         }`}
       >
         {message.loading ? (
-          "..."
+          <span className="inline-flex items-center gap-3">
+            ...
+            {message.request_id && onCancel ? (
+              <button
+                type="button"
+                onClick={() => onCancel(message.request_id!)}
+                className="text-xs font-semibold text-gray-500 hover:text-red-600 underline"
+              >
+                Cancel
+              </button>
+            ) : null}
+          </span>
         ) : message.sender === "server" || message.sender === "ai" ? (
           <div
             className="text-left whitespace-pre-wrap"
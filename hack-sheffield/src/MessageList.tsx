@@ -5,6 +5,7 @@ export function MessageList({
   messages,
   messagesContainerRef,
   typingUsers = new Set(),
+  onCancel,
 }: any) {
   const bottomRef = useRef<HTMLDivElement | null>(null);
 
@@ -38,7 +39,7 @@ export function MessageList({
       className="bg-blue-500 flex-1 overflow-y-auto p-4 space-y-4"
     >
       {messages.map((msg: any) => (
-        <MessageBubble key={msg.id} message={msg} />
+        <MessageBubble key={msg.id} message={msg} onCancel={onCancel} />
       ))}
       {/* bottom sentinel used for auto-scrolling */}
       <div ref={bottomRef} />
@@ -12,13 +12,19 @@ export function useWebSocket(
   const wsRef = useRef<WebSocket | null>(null);
   const nextId = useRef(1);
   const reconnectAttempts = useRef(0);
+  // Highest room sequence number seen; sent back as `since` on reconnect
+  const lastSeq = useRef(0);
 
   const connect = () => {
     if (wsRef.current?.readyState === WebSocket.OPEN) return;
 
     const rawUrl = "wss://unperishable-autogenous-jaycob.ngrok-free.dev/ws";
+    // catch up on anything broadcast while we were away; the server queues
+    // the missed events before any newer room event
+    const url =
+      lastSeq.current > 0 ? `${rawUrl}?since=${lastSeq.current}` : rawUrl;
 
-    const ws = new WebSocket(rawUrl);
+    const ws = new WebSocket(url);
 
     // Set a timeout to fail fast if server doesn't respond
     const connectionTimeout = setTimeout(() => {
@@ -91,6 +97,43 @@ export function useWebSocket(
         parsedMsg = null;
       }
 
+      // `session` and `resync` carry the room position rather than an event
+      // number, and may be at or below lastSeq after a server restart
+      if (
+        parsedMsg &&
+        typeof parsedMsg.seq === "number" &&
+        parsedMsg.type !== "session" &&
+        parsedMsg.type !== "resync"
+      ) {
+        if (parsedMsg.seq <= lastSeq.current) {
+          // already applied (replayed after a resume)
+          return;
+        }
+        lastSeq.current = parsedMsg.seq;
+      }
+
+      if (parsedMsg && parsedMsg.type === "session") {
+        // fresh connection: start tracking from the room's current position
+        if (lastSeq.current === 0) lastSeq.current = parsedMsg.seq;
+        return;
+      }
+
+      if (parsedMsg && parsedMsg.type === "resync") {
+        // gap too old to replay: accept whatever the server still retains
+        lastSeq.current = Math.max(0, (parsedMsg.oldest || 1) - 1);
+        return;
+      }
+
+      // Answer server heartbeats so the connection isn't reaped as idle
+      if (parsedMsg && parsedMsg.type === "ping") {
+        try {
+          ws.send(JSON.stringify({ type: "pong", ts: parsedMsg.ts }));
+        } catch (err) {
+          console.error("Failed to answer heartbeat", err);
+        }
+        return;
+      }
+
       // Handle user join/leave events
       if (parsedMsg && parsedMsg.type === "user.joined") {
         const username = parsedMsg.username;
@@ -125,6 +168,48 @@ export function useWebSocket(
         return;
       }
 
+      // The server started our persona request: remember its id on the
+      // loading bubbles so they can be cancelled and matched to replies
+      if (parsedMsg && parsedMsg.type === "request.accepted") {
+        const requestId = parsedMsg.request_id;
+        let pending = Array.isArray(parsedMsg.personas)
+          ? parsedMsg.personas.length
+          : 1;
+        setMessages((prev) => {
+          const copy = prev.slice();
+          for (let i = copy.length - 1; i >= 0 && pending > 0; --i) {
+            if (copy[i]?.loading && !copy[i].request_id) {
+              copy[i] = { ...copy[i], request_id: requestId };
+              pending--;
+            }
+          }
+          return copy;
+        });
+        return;
+      }
+
+      // A cancelled request settles all of its loading bubbles at once
+      if (
+        parsedMsg &&
+        parsedMsg.type === "system" &&
+        parsedMsg.request_id &&
+        String(parsedMsg.text || "") === "Request cancelled"
+      ) {
+        const requestId = parsedMsg.request_id;
+        setMessages((prev) => {
+          const first = prev.findIndex(
+            (m) => m?.loading && m.request_id === requestId
+          );
+          if (first < 0) return prev;
+          return prev
+            .map((m, i) =>
+              i === first ? { ...m, text: "Request cancelled", loading: false } : m
+            )
+            .filter((m) => !(m?.loading && m.request_id === requestId));
+        });
+        return;
+      }
+
       // Determine message payload fields
       let messageText = "";
       let messageSender: string | null = null;
@@ -170,9 +255,12 @@ export function useWebSocket(
 
       // Prefer to replace the most recent loading indicator instead of appending
       setMessages((prev) => {
-        // find last index of a loading message
-        let idx = -1;
-        for (let i = prev.length - 1; i >= 0; --i) {
+        // find the loading message for this request, else the last one
+        const requestId = parsedMsg?.request_id;
+        let idx = requestId
+          ? prev.findIndex((m) => m?.loading && m.request_id === requestId)
+          : -1;
+        for (let i = prev.length - 1; idx < 0 && i >= 0; --i) {
           if (prev[i] && prev[i].loading) {
             idx = i;
             break;
@@ -207,30 +295,46 @@ export function useWebSocket(
     const text = String(rawText || "").trim();
     if (!text) return;
 
-    const mentionMatch = text.match(/^@([A-Za-z0-9_-]+)\s+(.+)$/);
+    // one or more leading mentions, e.g. "@Zeus @Hermes plan our launch";
+    // each handle must end at a separator so a bare "@Zeus" isn't split
+    // into "@Zeu" + "s"
+    const mentionMatch = text.match(
+      /^((?:@[A-Za-z0-9_-]+(?=[\s,]|$)[\s,]*)+)([\s\S]*)$/
+    );
 
     if (mentionMatch) {
-      const targetPersona = mentionMatch[1];
-      const content = mentionMatch[2] || "";
+      const targetPersonas = Array.from(
+        mentionMatch[1].matchAll(/@([A-Za-z0-9_-]+)/g),
+        (m) => m[1]
+      );
+      const targetPersona = targetPersonas[0];
+      const content = (mentionMatch[2] || "").trim();
 
-      // local echo with target info
+      // local echo with target info, plus one loading bubble per persona
       setMessages((prev) => [
         ...prev,
         {
           id: nextId.current++,
-          text: content || `(calling ${targetPersona})`,
+          text: content || `(calling ${targetPersonas.join(", ")})`,
           sender: "me",
           username: currentUser,
           targetPersona,
         },
-        { id: nextId.current++, text: "...", sender: "server", loading: true },
+        ...targetPersonas.map(() => ({
+          id: nextId.current++,
+          text: "...",
+          sender: "server",
+          loading: true,
+        })),
       ]);
 
       const payload = {
-        text: content || "",
+        // mentions alone: send them as typed, the server strips them and
+        // treats the empty prompt as a ping
+        text: content || text,
         username: currentUser,
         persona,
-        targetPersona,
+        targetPersonas,
       };
 
       if (!wsRef.current || wsRef.current.readyState !== WebSocket.OPEN) {
@@ -272,6 +376,18 @@ export function useWebSocket(
     return () => wsRef.current?.close();
   }, [currentUser]);
 
+  const cancelRequest = (requestId: string) => {
+    // Ask the server to abort an in-flight persona request we started
+    try {
+      if (!wsRef.current || wsRef.current.readyState !== WebSocket.OPEN) return;
+      wsRef.current.send(
+        JSON.stringify({ type: "cancel", request_id: requestId })
+      );
+    } catch (err) {
+      console.error("Failed to send cancel:", err);
+    }
+  };
+
   const sendTypingIndicator = (isTyping: boolean) => {
     // Send typing presence to the backend so other connected clients can
     // be notified. The backend will rebroadcast to other clients and will
@@ -293,5 +409,6 @@ export function useWebSocket(
     connectedUsers,
     sendMessage,
     sendTypingIndicator,
+    cancelRequest,
   };
 }
@@ -61,3 +61,126 @@ CREATE TABLE IF NOT EXISTS facts (
 CREATE INDEX IF NOT EXISTS idx_facts_user_id ON facts(user_id);
 CREATE INDEX IF NOT EXISTS idx_facts_username ON facts(username);
 CREATE INDEX IF NOT EXISTS idx_facts_fact_type ON facts(fact_type);
+
+-- Rolling conversation summaries (one row per session, refreshed in the
+-- background every few messages; `covered_until` is the created_at of the
+-- last requests row folded into the summary)
+CREATE TABLE IF NOT EXISTS session_summaries (
+  session_id TEXT PRIMARY KEY,
+  summary TEXT NOT NULL,
+  covered_until TIMESTAMP WITH TIME ZONE,
+  message_count INTEGER DEFAULT 0,
+  updated_at TIMESTAMP WITH TIME ZONE DEFAULT TIMEZONE('utc'::TEXT, NOW()) NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_requests_session_created ON requests(session_id, created_at);
+
+-- Vector memory (pgvector). One row per remembered message; embeddings
+-- are OpenAI text-embedding-3-small vectors
+CREATE EXTENSION IF NOT EXISTS vector;
+
+CREATE TABLE IF NOT EXISTS memory (
+  id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+  user_id UUID REFERENCES auth.users ON DELETE SET NULL,
+  session_id TEXT,
+  username TEXT,
+  content TEXT NOT NULL,
+  embedding vector(1536),
+  hit_count INTEGER DEFAULT 1,
+  last_seen_at TIMESTAMP WITH TIME ZONE,
+  created_at TIMESTAMP WITH TIME ZONE DEFAULT TIMEZONE('utc'::TEXT, NOW()) NOT NULL
+);
+
+-- Memories are partitioned by room (session) and user; searches only look
+-- at the asker's partition
+ALTER TABLE IF EXISTS memory ADD COLUMN IF NOT EXISTS session_id TEXT;
+ALTER TABLE IF EXISTS memory ADD COLUMN IF NOT EXISTS username TEXT;
+CREATE INDEX IF NOT EXISTS idx_memory_partition ON memory(session_id, username, created_at DESC);
+
+-- Near-duplicate memories are merged into one row that counts how often
+-- it was seen (write-time dedup gate and memory_compaction.py)
+ALTER TABLE IF EXISTS memory ADD COLUMN IF NOT EXISTS hit_count INTEGER DEFAULT 1;
+ALTER TABLE IF EXISTS memory ADD COLUMN IF NOT EXISTS last_seen_at TIMESTAMP WITH TIME ZONE;
+
+-- Approximate nearest-neighbour index for unfiltered searches (cosine
+-- distance, the <=> operator). HNSW needs pgvector >= 0.5; on older
+-- versions use IVFFlat instead, built once the table has data:
+--   CREATE INDEX idx_memory_embedding ON memory USING ivfflat (embedding vector_cosine_ops) WITH (lists = 100);
+CREATE INDEX IF NOT EXISTS idx_memory_embedding ON memory USING hnsw (embedding vector_cosine_ops) WITH (m = 16, ef_construction = 64);
+
+-- Memories most similar to `query_embedding`, at least `match_threshold`
+-- cosine similarity, optionally restricted to one room and/or user.
+-- Filtered searches score the rows of the partition exactly (found through
+-- idx_memory_partition): an HNSW scan only returns the nearest ef_search
+-- rows of the whole table, and filtering those afterwards would drop most
+-- of a small partition's matches. Unfiltered searches use the HNSW index.
+-- The older two-argument version is dropped so PostgREST sees one overload.
+DROP FUNCTION IF EXISTS match_memory(vector, INTEGER);
+CREATE OR REPLACE FUNCTION match_memory(
+  query_embedding vector(1536),
+  match_count INTEGER DEFAULT 5,
+  match_threshold FLOAT DEFAULT 0,
+  filter_session_id TEXT DEFAULT NULL,
+  filter_username TEXT DEFAULT NULL
+)
+RETURNS TABLE (
+  id UUID,
+  user_id UUID,
+  session_id TEXT,
+  username TEXT,
+  content TEXT,
+  hit_count INTEGER,
+  created_at TIMESTAMP WITH TIME ZONE,
+  similarity FLOAT
+)
+LANGUAGE plpgsql STABLE
+AS $$
+BEGIN
+  IF filter_session_id IS NULL AND filter_username IS NULL THEN
+    RETURN QUERY
+      SELECT m.id, m.user_id, m.session_id, m.username, m.content, m.hit_count, m.created_at,
+             1 - (m.embedding <=> query_embedding) AS similarity
+      FROM memory m
+      WHERE m.embedding IS NOT NULL
+        AND 1 - (m.embedding <=> query_embedding) >= match_threshold
+      ORDER BY m.embedding <=> query_embedding
+      LIMIT match_count;
+  ELSE
+    RETURN QUERY
+      SELECT m.id, m.user_id, m.session_id, m.username, m.content, m.hit_count, m.created_at,
+             1 - (m.embedding <=> query_embedding) AS similarity
+      FROM memory m
+      WHERE (filter_session_id IS NULL OR m.session_id = filter_session_id)
+        AND (filter_username IS NULL OR m.username = filter_username)
+        AND m.embedding IS NOT NULL
+        AND 1 - (m.embedding <=> query_embedding) >= match_threshold
+      -- ordering by similarity (column 8) rather than by distance keeps the
+      -- planner off the HNSW index
+      ORDER BY 8 DESC
+      LIMIT match_count;
+  END IF;
+END;
+$$;
+
+-- Keyset pagination for /admin/export: pages continue after the last
+-- (created_at, id) seen
+CREATE INDEX IF NOT EXISTS idx_requests_created_id ON requests(created_at, id);
+CREATE INDEX IF NOT EXISTS idx_facts_created_id ON facts(created_at, id);
+
+-- Memory tiering: a recalled memory counts as used. One statement bumps
+-- every memory recalled for a prompt.
+CREATE OR REPLACE FUNCTION touch_memories(memory_ids UUID[])
+RETURNS VOID
+LANGUAGE sql
+AS $$
+  UPDATE memory
+  SET hit_count = COALESCE(hit_count, 1) + 1,
+      last_seen_at = TIMEZONE('utc'::TEXT, NOW())
+  WHERE id = ANY(memory_ids);
+$$;
+
+-- One row per (room, user) memory partition, for the snapshot and
+-- compaction jobs; the DISTINCT is answered from idx_memory_partition
+-- instead of shipping every memory row to the client
+CREATE OR REPLACE VIEW memory_partitions AS
+  SELECT DISTINCT session_id, username FROM memory;